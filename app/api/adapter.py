@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from typing import Optional, Tuple
+
+import httpx
+import orjson
+from fastapi import HTTPException
+
+from app.api import transport
+from app.api.cluster import cluster
+from app.api.metrics import record_stage, stage, upstream_requests, upstream_seconds
+from app.api.ratelimit import Priority, RateLimitGovernor
+from app.api.resilience import FAILURE_STATUS_CODES, backoff, get_breaker, upstream_retries
+from app.settings import UPSTREAM_RETRIES
+
+
+class HmacSigner:
+    def __init__(self, secret):
+        # HMAC state keyed once with the secret, copied for every message instead of re-keying
+        self._hmac = hmac.new(bytes(secret or "", 'utf8'), digestmod=hashlib.sha256)
+
+    def hexdigest(self, *parts: bytes) -> str:
+        mac = self._hmac.copy()
+        for part in parts:
+            if part:
+                mac.update(part)
+        return mac.hexdigest()
+
+
+class ExchangeAdapter:
+    # Venue label used in metrics
+    name = "exchange"
+
+    # Status codes an exchange uses to reject a call for exceeding its rate limit
+    rate_limit_status_codes = (429,)
+
+    # Credentials the adapter signs with, venues with several accounts set one per adapter
+    account = "default"
+
+    # Parameters naming the orders a DELETE cancels, such cancels are safe to send twice
+    order_id_fields: Tuple[str, ...] = ()
+
+    def __init__(self, base_url: str, api_key: str, governor: RateLimitGovernor, timeout: float, retries: int = 0,
+                 pool: Optional[str] = None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.governor = governor
+        self.timeout = timeout
+        self.retries = retries
+        # Connection pool in the transport, None for the shared one
+        self.pool = pool
+        self.breaker = get_breaker(self.name)
+
+    def sign(self, verb: str, url: str, params: Optional[dict], data: str) -> Tuple[str, dict, Optional[dict]]:
+        # Returns the URL, headers and query parameters to send for an authenticated call
+        raise NotImplementedError
+
+    def update_rate_limit(self, response: httpx.Response):
+        if response.status_code in self.rate_limit_status_codes:
+            retry_after = response.headers.get("retry-after")
+            self.governor.update(rejected=True, retry_after=float(retry_after) if retry_after else None)
+
+    async def request(self, verb: str, path: str, priority: Priority = Priority.READ,
+                      params: Optional[dict] = None, data: str = "") -> httpx.Response:
+        # Cluster workers leave rate budget, signing and the connection to the leader
+        if cluster.is_worker():
+            return await cluster.forward(self, "request", data, verb=verb, path=path, priority=priority, params=params)
+
+        # Only calls with the same effect when sent twice are retried after an upstream failure
+        retries = UPSTREAM_RETRIES if self.is_idempotent(verb, params, data) else 0
+        limited = failed = 0
+        while True:
+            # Fast fail while the venue is overloaded, cancels still get through
+            if priority != Priority.CANCEL:
+                self.breaker.check()
+
+            # Wait for rate budget first, the signature must not expire while the call is queued
+            with stage("queue"):
+                await self.governor.acquire(priority)
+
+            with stage("sign"):
+                url, headers, query = self.sign(verb, self.base_url + path, params, data)
+
+            try:
+                response = await self.send(verb, url, headers, query, data)
+            except HTTPException as e:
+                # Timeouts and connection failures
+                if e.status_code not in FAILURE_STATUS_CODES:
+                    raise
+                self.breaker.failure()
+                if failed >= retries:
+                    raise
+                status = e.status_code
+            else:
+                self.update_rate_limit(response)
+
+                # Calls rejected for rate limit go back into the queue instead of failing
+                if response.status_code in self.rate_limit_status_codes:
+                    if limited >= self.retries:
+                        return response
+                    limited += 1
+                    continue
+
+                if response.status_code not in FAILURE_STATUS_CODES:
+                    self.breaker.success()
+                    return response
+                self.breaker.failure()
+                if failed >= retries:
+                    return response
+                status = response.status_code
+
+            upstream_retries.inc(self.name, status)
+            await asyncio.sleep(backoff(failed))
+            failed += 1
+
+    def is_idempotent(self, verb: str, params: Optional[dict], data: str) -> bool:
+        # Reads, and cancels of orders named by ID, leave the exchange in the same state however often they are sent
+        if verb == "GET":
+            return True
+        if verb != "DELETE" or not self.order_id_fields:
+            return False
+        fields = dict(params or {})
+        if data:
+            fields.update(orjson.loads(data))
+        return any(fields.get(field) for field in self.order_id_fields)
+
+    async def send(self, verb: str, url: str, headers: dict, query: Optional[dict], data: str) -> httpx.Response:
+        # One signed call to the exchange, timed as the upstream stage
+        if cluster.is_worker():
+            return await cluster.forward(self, "send", data, verb=verb, url=url, headers=headers, query=query)
+
+        if data:
+            headers["content-type"] = "application/json"
+
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await transport.request(
+                verb, url, headers=headers, params=query, content=data or None, timeout=self.timeout, pool=self.pool
+            )
+            status = response.status_code
+        except HTTPException as e:
+            status = e.status_code
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            record_stage("upstream", elapsed)
+            upstream_seconds.observe(elapsed, self.name, verb, status)
+            upstream_requests.inc(self.name, verb, status)
+        return response
+
+    @staticmethod
+    def parse(response: httpx.Response):
+        # Upstream errors are surfaced with the exchange's status code and error body
+        try:
+            content = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            content = response.text
+
+        if response.status_code == 200:
+            return content
+        raise HTTPException(status_code=response.status_code, detail=content)
+
+    @staticmethod
+    def body(response: httpx.Response) -> bytes:
+        # Successful bodies stay undecoded so they can be forwarded as they are
+        if response.status_code == 200:
+            return response.content
+        # Raises with the decoded error body
+        return ExchangeAdapter.parse(response)
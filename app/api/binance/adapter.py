@@ -0,0 +1,71 @@
+import time
+import urllib
+from decimal import Decimal
+from typing import Optional
+
+import httpx
+
+from app.api.adapter import ExchangeAdapter, HmacSigner
+from app.api.ratelimit import RateLimitGovernor
+from app.settings import (
+    BINANCE_API_KEY,
+    BINANCE_BASE_URL,
+    BINANCE_RATE_LIMIT,
+    BINANCE_RATE_LIMIT_BURST,
+    BINANCE_RATE_LIMIT_RETRIES,
+    BINANCE_RECV_WINDOW,
+    BINANCE_SECRET_KEY,
+    BINANCE_TIMEOUT,
+)
+
+
+def format_value(value):
+    # Binance rejects exponent notation, e.g. str(0.00001) == '1e-05'
+    if isinstance(value, float):
+        return format(Decimal(repr(value)), 'f')
+    if isinstance(value, bool):
+        return str(value).lower()
+    return value
+
+
+class BinanceAdapter(ExchangeAdapter):
+    name = "binance"
+
+    # 418 is sent instead of 429 once an IP keeps going after being rate limited
+    rate_limit_status_codes = (418, 429)
+
+    order_id_fields = ("orderId", "origClientOrderId")
+
+    def __init__(self, base_url=None, api_key=None, secret=None, governor=None):
+        super().__init__(
+            base_url=base_url or BINANCE_BASE_URL,
+            api_key=api_key or BINANCE_API_KEY,
+            governor=governor or RateLimitGovernor(BINANCE_RATE_LIMIT, BINANCE_RATE_LIMIT_BURST),
+            timeout=BINANCE_TIMEOUT,
+            retries=BINANCE_RATE_LIMIT_RETRIES,
+        )
+        self.limit = BINANCE_RATE_LIMIT
+        self.signer = HmacSigner(secret or BINANCE_SECRET_KEY)
+
+    def sign(self, verb: str, url: str, params: Optional[dict], data: str):
+        # Binance signs the query string, which must carry a millisecond timestamp and the signature last
+        params = {key: format_value(value) for key, value in (params or {}).items() if value is not None}
+        params["recvWindow"] = BINANCE_RECV_WINDOW
+        params["timestamp"] = int(time.time() * 1000)
+
+        query = urllib.parse.urlencode(params, doseq=True)
+        signature = self.signer.hexdigest(query.encode('utf8'))
+
+        headers = {"X-MBX-APIKEY": self.api_key}
+        return f"{url}?{query}&signature={signature}", headers, None
+
+    def update_rate_limit(self, response: httpx.Response):
+        # Binance reports the request weight used in the current minute
+        used = response.headers.get("x-mbx-used-weight-1m")
+        if used is not None:
+            reset_at = (int(time.time()) // 60 + 1) * 60
+            self.governor.update(remaining=self.limit - float(used), reset_at=reset_at)
+        super().update_rate_limit(response)
+
+
+adapter = BinanceAdapter()
@@ -1,11 +1,91 @@
-import os
+from typing import Optional, Union
 
-from dotenv import load_dotenv
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, HTTPException
+
+from app.api.metrics import instrument
+from app.api.ratelimit import Priority
+from app.api.responses import JSONResponse, RawJSONResponse
+from .adapter import adapter
+from .schemas import AmendRequest, CancelAllRequest, CancelRequest, OrderRequest
 
 router = APIRouter(
     prefix="/binance",
     tags=["Binance"]
 )
 
-load_dotenv()
+
+@router.get("/orders")
+@instrument
+async def get_orders(
+        symbol: str = Query(..., description="Trading pair symbol (e.g., 'BTCUSDT')."),
+        order_id: Optional[int] = Query(None, description="Order ID to look up."),
+        client_order_id: Optional[str] = Query(None, description="Client order ID to look up."),
+        start_time: Optional[int] = Query(None, description="Start time for date range filter (ms since epoch)."),
+        end_time: Optional[int] = Query(None, description="End time for date range filter (ms since epoch)."),
+        active: Optional[bool] = Query(False, description="Whether to return only open orders."),
+):
+    # A single order by ID
+    if order_id is not None or client_order_id is not None:
+        params = {"symbol": symbol, "orderId": order_id, "origClientOrderId": client_order_id}
+        content = adapter.body(await adapter.request("GET", "/api/v3/order", Priority.READ, params=params))
+        return RawJSONResponse(status_code=200, content=content)
+
+    # Open orders only
+    if active:
+        params = {"symbol": symbol}
+        content = adapter.body(await adapter.request("GET", "/api/v3/openOrders", Priority.READ, params=params))
+        return RawJSONResponse(status_code=200, content=content)
+
+    # Order history, optionally within a date range
+    params = {"symbol": symbol, "startTime": start_time, "endTime": end_time}
+    content = adapter.body(await adapter.request("GET", "/api/v3/allOrders", Priority.READ, params=params))
+    return RawJSONResponse(status_code=200, content=content)
+
+
+async def submit_order(order: OrderRequest):
+    params = order.model_dump(exclude_none=True)
+    return adapter.parse(await adapter.request("POST", "/api/v3/order", Priority.NEW, params=params))
+
+
+@router.post("/orders")
+@instrument
+async def place_order(request: OrderRequest):
+    return JSONResponse(status_code=200, content=await submit_order(request))
+
+
+@router.put("/orders")
+@instrument
+async def amend_order(request: AmendRequest):
+    # Binance amends by atomically cancelling the order and placing its replacement
+    if request.cancelOrderId is None and not request.cancelOrigClientOrderId:
+        raise HTTPException(status_code=400, detail="Either cancelOrderId or cancelOrigClientOrderId must be provided.")
+
+    params = request.model_dump(exclude_none=True)
+    content = adapter.body(await adapter.request("POST", "/api/v3/order/cancelReplace", Priority.AMEND, params=params))
+    return RawJSONResponse(status_code=200, content=content)
+
+
+@router.delete("/orders")
+@instrument
+async def delete_orders(
+        request: Union[CancelRequest, CancelAllRequest]
+):
+    # The request is for canceling all open orders of a symbol (CancelAllRequest)
+    if isinstance(request, CancelAllRequest):
+        params = {"symbol": request.symbol}
+        content = adapter.body(await adapter.request("DELETE", "/api/v3/openOrders", Priority.CANCEL, params=params))
+        return RawJSONResponse(status_code=200, content=content)
+
+    # The request is for canceling a specific order (CancelRequest)
+    if request.orderId is None and not request.origClientOrderId:
+        raise HTTPException(status_code=400, detail="Either orderId or origClientOrderId must be provided.")
+
+    params = request.model_dump(exclude_none=True)
+    content = adapter.body(await adapter.request("DELETE", "/api/v3/order", Priority.CANCEL, params=params))
+    return RawJSONResponse(status_code=200, content=content)
+
+
+@router.get("/ratelimit")
+async def get_rate_limit():
+    # Local view of the exchange budget, queue depth per priority and time spent waiting
+    return adapter.governor.stats()
@@ -0,0 +1,68 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
+
+class OrderRequest(BaseModel):
+    symbol: str = Field(..., description="Trading pair symbol (e.g., 'BTCUSDT').")
+    side: Literal["BUY", "SELL"] = Field(..., description="Order side. Valid options: BUY, SELL.")
+    type: Literal[
+        "LIMIT",
+        "MARKET",
+        "STOP_LOSS",
+        "STOP_LOSS_LIMIT",
+        "TAKE_PROFIT",
+        "TAKE_PROFIT_LIMIT",
+        "LIMIT_MAKER",
+    ] = Field(
+        "LIMIT",
+        description=(
+            "Order type. Valid options: LIMIT, MARKET, STOP_LOSS, STOP_LOSS_LIMIT, TAKE_PROFIT, TAKE_PROFIT_LIMIT, "
+            "LIMIT_MAKER."
+        ),
+    )
+    timeInForce: Optional[Literal["GTC", "IOC", "FOK"]] = Field(
+        None, description="Time in force. Valid options: GTC, IOC, FOK. Required for limit orders."
+    )
+    quantity: Optional[float] = Field(None, description="Order quantity in units of the base asset.")
+    quoteOrderQty: Optional[float] = Field(
+        None, description="Optional quantity in units of the quote asset for 'MARKET' orders."
+    )
+    price: Optional[float] = Field(None, description="Limit price, required for limit order types.")
+    newClientOrderId: Optional[str] = Field(
+        None, description="Optional unique client order ID. Automatically generated by the exchange if not sent."
+    )
+    stopPrice: Optional[float] = Field(
+        None, description="Trigger price for 'STOP_LOSS', 'STOP_LOSS_LIMIT', 'TAKE_PROFIT' and 'TAKE_PROFIT_LIMIT' orders."
+    )
+    icebergQty: Optional[float] = Field(
+        None, description="Optional visible quantity for 'LIMIT', 'STOP_LOSS_LIMIT' and 'TAKE_PROFIT_LIMIT' orders."
+    )
+    newOrderRespType: Optional[Literal["ACK", "RESULT", "FULL"]] = Field(
+        None, description="Response detail. Valid options: ACK, RESULT, FULL."
+    )
+
+
+class AmendRequest(BaseModel):
+    symbol: str = Field(..., description="Trading pair symbol (e.g., 'BTCUSDT').")
+    side: Literal["BUY", "SELL"] = Field(..., description="Side of the replacement order.")
+    type: Literal["LIMIT", "MARKET", "LIMIT_MAKER"] = Field("LIMIT", description="Type of the replacement order.")
+    cancelReplaceMode: Literal["STOP_ON_FAILURE", "ALLOW_FAILURE"] = Field(
+        "STOP_ON_FAILURE",
+        description="STOP_ON_FAILURE places the new order only if the cancel succeeds, ALLOW_FAILURE places it anyway.",
+    )
+    cancelOrderId: Optional[int] = Field(None, description="Order ID of the order to replace.")
+    cancelOrigClientOrderId: Optional[str] = Field(None, description="Client order ID of the order to replace.")
+    timeInForce: Optional[Literal["GTC", "IOC", "FOK"]] = Field(None, description="Time in force of the replacement order.")
+    quantity: Optional[float] = Field(None, description="Quantity of the replacement order.")
+    price: Optional[float] = Field(None, description="Limit price of the replacement order.")
+    newClientOrderId: Optional[str] = Field(None, description="Optional client order ID of the replacement order.")
+
+
+class CancelRequest(BaseModel):
+    symbol: str = Field(..., description="Trading pair symbol (e.g., 'BTCUSDT').")
+    orderId: Optional[int] = Field(None, description="Order ID.")
+    origClientOrderId: Optional[str] = Field(None, description="Client order ID.")
+
+
+class CancelAllRequest(BaseModel):
+    symbol: str = Field(..., description="Cancel all open orders of this trading pair symbol.")
+    all: Literal[True] = Field(..., description="Must be true to cancel all open orders of the symbol.")
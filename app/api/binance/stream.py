@@ -0,0 +1,72 @@
+import asyncio
+import json
+import logging
+from typing import Callable, List, Optional
+
+from websockets.asyncio.client import connect
+
+from app.settings import BINANCE_WS_URL
+
+logger = logging.getLogger(__name__)
+
+
+class BinanceStream:
+    def __init__(self, url=None):
+        self.url = url or BINANCE_WS_URL
+        self.streams: List[str] = []
+        self.listeners: List[Callable[[dict], None]] = []
+        # Raw messages as received, e.g. relayed to cluster workers
+        self.relays: List[Callable[[dict], None]] = []
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+
+    def add_streams(self, *streams: str):
+        # Stream names are lowercase on Binance, e.g. 'btcusdt@bookTicker'
+        for name in streams:
+            if name not in self.streams:
+                self.streams.append(name)
+
+    def start(self):
+        if self.streams and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                # Combined stream endpoint, every message is wrapped as {"stream": ..., "data": ...}
+                async with connect(f"{self.url}/stream?streams={'/'.join(self.streams)}") as websocket:
+                    self.connected = True
+                    delay = 1
+                    async for message in websocket:
+                        self.handle_message(json.loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Binance stream disconnected: %s", e)
+            finally:
+                self.connected = False
+
+            # Reconnect with exponential backoff
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def handle_message(self, message: dict):
+        for relay in self.relays:
+            relay(message)
+
+        data = message.get("data", message)
+        for listener in self.listeners:
+            listener(data)
+
+
+stream = BinanceStream()
@@ -0,0 +1,56 @@
+from typing import Dict, Optional
+
+from fastapi import Header, HTTPException, Request
+
+from app.api.ratelimit import Priority
+from app.settings import BITMEX_ACCOUNTS
+from .adapter import DEFAULT_ACCOUNT, BitmexAdapter, adapter, create_adapter
+
+
+class AccountRegistry:
+    def __init__(self, default: BitmexAdapter, accounts: Dict[str, dict]):
+        self.default = default
+        self.adapters: Dict[str, BitmexAdapter] = {DEFAULT_ACCOUNT: default}
+
+        # Each account signs with its own key and gets its own rate budget and connection pool. Entries without
+        # credentials, or named like the default account, are left out here and reported by validate() on startup.
+        for name, credentials in accounts.items():
+            if name == DEFAULT_ACCOUNT or not isinstance(credentials, dict):
+                continue
+            if not credentials.get("api_key") or not credentials.get("secret_key"):
+                continue
+            self.adapters[name] = create_adapter(
+                api_key=credentials["api_key"], secret=credentials["secret_key"], account=name
+            )
+
+    def get(self, name: Optional[str] = None) -> BitmexAdapter:
+        if not name:
+            return self.default
+
+        adapter = self.adapters.get(name)
+        if adapter is None:
+            raise HTTPException(status_code=404, detail=f"Unknown account '{name}'.")
+        return adapter
+
+    def is_default(self, adapter: BitmexAdapter) -> bool:
+        # Only the default account is mirrored by the order stream and the order store
+        return adapter is self.default
+
+    def stats(self) -> dict:
+        return {name: adapter.governor.stats() for name, adapter in self.adapters.items()}
+
+
+accounts = AccountRegistry(adapter, BITMEX_ACCOUNTS)
+
+
+def select_account(
+        request: Request,
+        x_account: Optional[str] = Header(None, description="Account to act on, the default one when omitted."),
+) -> BitmexAdapter:
+    # An account in the path (/bitmex/accounts/{account}/...) takes precedence over the header
+    return accounts.get(request.path_params.get("account") or x_account)
+
+
+async def reconcile_orders(params: dict):
+    # Used by the order store to pull deltas of the default account in the background
+    return adapter.parse(await adapter.request("GET", "/order", Priority.READ, params=params))
@@ -0,0 +1,93 @@
+import time
+from typing import Optional
+
+import httpx
+import orjson
+from fastapi import HTTPException
+
+from app.api.adapter import ExchangeAdapter
+from app.api.cluster import cluster
+from app.api.journal import Journal
+from app.api.ratelimit import RateLimitGovernor
+from app.settings import (
+    BITMEX_API_KEY,
+    BITMEX_BACKEND,
+    BITMEX_BASE_URL,
+    BITMEX_RATE_LIMIT,
+    BITMEX_RATE_LIMIT_BURST,
+    BITMEX_RATE_LIMIT_RETRIES,
+    BITMEX_SECRET_KEY,
+    BITMEX_TIMEOUT,
+)
+from .auth import get_signer
+
+# Name of the account configured by BITMEX_API_KEY / BITMEX_SECRET_KEY
+DEFAULT_ACCOUNT = "default"
+
+# Every call sent to BitMEX with its answer, for every account
+journal = Journal("bitmex")
+
+
+class BitmexAdapter(ExchangeAdapter):
+    name = "bitmex"
+    order_id_fields = ("orderID", "clOrdID")
+
+    def __init__(self, base_url=None, api_key=None, secret=None, governor=None, account=None):
+        super().__init__(
+            base_url=base_url or BITMEX_BASE_URL,
+            api_key=api_key or BITMEX_API_KEY,
+            governor=governor or RateLimitGovernor(BITMEX_RATE_LIMIT, BITMEX_RATE_LIMIT_BURST),
+            timeout=BITMEX_TIMEOUT,
+            retries=BITMEX_RATE_LIMIT_RETRIES,
+            # Additional accounts get connections of their own, the default one uses the shared pool
+            pool=f"bitmex:{account}" if account else None,
+        )
+        self.account = account or DEFAULT_ACCOUNT
+        self.signer = get_signer(secret or BITMEX_SECRET_KEY)
+
+    def sign(self, verb: str, url: str, params: Optional[dict], data: str):
+        # Setting the expiry time for the API request signature (5 seconds from the current time)
+        expires = int(round(time.time()) + 5)
+
+        # Headers for the API request including the expiry time, API key, and signature
+        headers = {
+            "api-expires": str(expires),
+            "api-key": self.api_key,
+            "api-signature": self.signer.sign(verb, url, expires, query_params=params, data=data)
+        }
+        return url, headers, params
+
+    async def send(self, verb: str, url: str, headers: dict, query: Optional[dict], data: str) -> httpx.Response:
+        try:
+            response = await super().send(verb, url, headers, query, data)
+        except HTTPException as e:
+            # Timeouts and transport errors are journaled too, they leave the outcome of the call unknown
+            self.journal_call(verb, url, query, data, e.status_code, orjson.dumps(e.detail))
+            raise
+        self.journal_call(verb, url, query, data, response.status_code, response.content)
+        return response
+
+    def journal_call(self, verb: str, url: str, query: Optional[dict], data: str, status: int, content: bytes):
+        # Calls of cluster workers are journaled by the leader that makes them
+        if not cluster.is_worker():
+            journal.record({"account": self.account, "verb": verb, "url": url, "query": query},
+                           data.encode() if data else b"", status, content)
+
+    def update_rate_limit(self, response: httpx.Response):
+        # BitMEX reports the remaining budget and the unix time it resets at
+        remaining = response.headers.get("x-ratelimit-remaining")
+        reset = response.headers.get("x-ratelimit-reset")
+        if remaining is not None:
+            self.governor.update(remaining=float(remaining), reset_at=float(reset) if reset else None)
+        super().update_rate_limit(response)
+
+
+def create_adapter(**kwargs) -> BitmexAdapter:
+    # The paper backend plugs in behind the same adapter interface as the exchange
+    if BITMEX_BACKEND == "paper":
+        from .paper import PaperAdapter
+        return PaperAdapter(**kwargs)
+    return BitmexAdapter(**kwargs)
+
+
+adapter = create_adapter()
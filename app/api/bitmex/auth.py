@@ -1,43 +1,59 @@
-import hashlib
-import hmac
 import json
 import urllib
+from functools import lru_cache
 from urllib.parse import urlparse
 
 from pydantic import BaseModel
 
+from app.api.adapter import HmacSigner
 
-def generate_signature(secret, verb, url, nonce, query_params=None, data=""):
+
+class Signer:
     # https://github.com/BitMEX/api-connectors/blob/master/official-http/python-swaggerpy/BitMEXAPIKeyAuthenticator.py
 
-    # Parse the URL to extract the path
-    parsedURL = urlparse(url)
-    path = parsedURL.path
+    def __init__(self, secret):
+        self._hmac = HmacSigner(secret)
+        self._paths = {}
+
+    def path(self, url):
+        # The URL path is the same for every call to an endpoint, parse it only once
+        path = self._paths.get(url)
+        if path is None:
+            path = self._paths[url] = urlparse(url).path
+        return path
+
+    def sign(self, verb, url, nonce, query_params=None, data=""):
+        path = self.path(url)
+
+        # Append query parameters to the path if they exist
+        if query_params:
+            path = path + '?' + urllib.parse.urlencode(query_params, doseq=True)
 
-    # Append query parameters to the path if they exist
-    if query_params:
-        path = path + '?' + urllib.parse.urlencode(query_params, doseq=True)
+        # Create the message to be signed: verb + path + nonce + data
+        message = (verb + path + str(nonce)).encode('utf8')
+        if isinstance(data, str):
+            data = data.encode('utf8')
 
-    # If the data is in bytes or bytearray, decode it to a string
-    if isinstance(data, (bytes, bytearray)):
-        data = data.decode('utf8')
+        return self._hmac.hexdigest(message, data)
 
-    # Create the message to be signed: verb + path + nonce + data
-    message = verb + path + str(nonce) + data
 
+@lru_cache(maxsize=32)
+def get_signer(secret):
+    return Signer(secret)
+
+
+def generate_signature(secret, verb, url, nonce, query_params=None, data=""):
     # Generate the HMAC signature using SHA-256 and return it
-    signature = hmac.new(bytes(secret, 'utf8'), bytes(message, 'utf8'), digestmod=hashlib.sha256).hexdigest()
-    return signature
+    return get_signer(secret).sign(verb, url, nonce, query_params=query_params, data=data)
 
 
 def to_valid_json(data):
-    # If the data is a Pydantic BaseModel, convert it to a dictionary and exclude None values
+    # If the data is a Pydantic BaseModel, serialize it in one pass (compact, without None values)
     if isinstance(data, BaseModel):
-        data = data.model_dump(exclude_none=True)
+        return data.model_dump_json(exclude_none=True)
 
     # If the data is a dictionary, convert it to a JSON string (no extra spaces or newlines), excluding None values
     if isinstance(data, dict):
         data = json.dumps({key: value for key, value in data.items() if value is not None}, separators=(',', ':'))
 
     return data
-
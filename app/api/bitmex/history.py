@@ -0,0 +1,191 @@
+import asyncio
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.api.ratelimit import Priority
+from app.settings import BITMEX_HISTORY_PAGE_SIZE, HISTORY_DIR
+from .adapter import BitmexAdapter, adapter
+
+# Columns stored per kind of history, timestamps are unix milliseconds
+KINDS: Dict[str, Tuple[Tuple[str, type], ...]] = {
+    "trade": (("ts", np.int64), ("price", np.float64), ("size", np.float64)),
+    "bucket": (("ts", np.int64), ("open", np.float64), ("high", np.float64), ("low", np.float64),
+               ("close", np.float64), ("volume", np.float64)),
+}
+
+# Size of the BitMEX buckets downloaded, in milliseconds
+BUCKET_SIZE = 60 * 1000
+
+# BitMEX symbols, indices included (e.g. XBTUSD, .BXBT), anything else could name a path outside HISTORY_DIR
+SYMBOL = re.compile(r"[A-Z0-9_.]+")
+
+INTERVAL_UNITS = {"s": 1000, "m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000}
+
+
+def parse_interval(interval: str) -> int:
+    # '1m', '15m', '4h', '1d' ... in milliseconds
+    match = re.fullmatch(r"(\d+)([smhd])", interval)
+    if not match or int(match.group(1)) <= 0:
+        raise HTTPException(status_code=400, detail=f"Invalid interval '{interval}', use e.g. 30s, 5m, 4h or 1d.")
+    return int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+
+
+def to_millis(timestamps: List[str]) -> np.ndarray:
+    # ISO timestamps as BitMEX sends them ('2024-01-01T00:00:00.000Z'), converted in one pass
+    return np.array([timestamp.rstrip("Z") for timestamp in timestamps], dtype="datetime64[ms]").astype(np.int64)
+
+
+class ColumnStore:
+    def __init__(self, symbol: str, kind: str, root: str = None):
+        if not SYMBOL.fullmatch(symbol) or not symbol.strip("."):
+            raise HTTPException(status_code=400, detail=f"Invalid symbol '{symbol}'.")
+        self.kind = kind
+        self.columns = KINDS[kind]
+        self.path = os.path.join(root or HISTORY_DIR, symbol, kind)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def __len__(self) -> int:
+        # Columns are appended one after the other, the shortest one holds the complete rows
+        lengths = []
+        for name, dtype in self.columns:
+            try:
+                lengths.append(os.path.getsize(self._file(name)) // np.dtype(dtype).itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(lengths)
+
+    def repair(self):
+        # An append cut short leaves some columns longer than others, the extra values go before anything is added
+        rows = len(self)
+        for name, dtype in self.columns:
+            size = rows * np.dtype(dtype).itemsize
+            try:
+                if os.path.getsize(self._file(name)) > size:
+                    os.truncate(self._file(name), size)
+            except FileNotFoundError:
+                pass
+
+    def append(self, columns: Dict[str, np.ndarray]):
+        os.makedirs(self.path, exist_ok=True)
+        self.repair()
+        # Timestamps go last so a reader never sees a row before all of its values are written
+        for name, dtype in self.columns[1:] + self.columns[:1]:
+            with open(self._file(name), "ab") as file:
+                file.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+    def read(self) -> Dict[str, np.ndarray]:
+        # Memory-mapped read-only views, pages are only loaded for the rows actually touched
+        rows = len(self)
+        if rows == 0:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in self.columns}
+        return {name: np.memmap(self._file(name), dtype=dtype, mode="r", shape=(rows,)) for name, dtype in self.columns}
+
+    def range(self, start: Optional[int] = None, end: Optional[int] = None) -> Dict[str, np.ndarray]:
+        # Rows with start <= ts < end, found by binary search on the sorted timestamps
+        columns = self.read()
+        ts = columns["ts"]
+        low = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        high = len(ts) if end is None else int(np.searchsorted(ts, end, side="left"))
+        return {name: column[low:high] for name, column in columns.items()}
+
+    def last(self) -> Tuple[Optional[int], int]:
+        # Newest timestamp and how many rows share it, used to resume a download without duplicates
+        ts = self.read()["ts"]
+        if len(ts) == 0:
+            return None, 0
+        newest = int(ts[-1])
+        return newest, len(ts) - int(np.searchsorted(ts, newest, side="left"))
+
+
+def resample(columns: Dict[str, np.ndarray], kind: str, interval: int) -> Dict[str, np.ndarray]:
+    columns = {name: np.asarray(column) for name, column in columns.items()}
+    if kind == "bucket":
+        # Buckets without trades carry no prices
+        traded = ~np.isnan(columns["close"])
+        columns = {name: column[traded] for name, column in columns.items()}
+
+    ts = columns["ts"]
+    if len(ts) == 0:
+        return {name: [] for name in ("ts", "open", "high", "low", "close", "volume")}
+
+    # Rows are sorted, so each candle is a contiguous run sharing the same bucket start
+    buckets = ts - ts % interval
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(ts)])) - 1
+
+    if kind == "trade":
+        price = columns["price"]
+        opens, highs, lows, closes = price, price, price, price
+        volume = columns["size"]
+    else:
+        opens, highs, lows, closes = (columns[name] for name in ("open", "high", "low", "close"))
+        volume = columns["volume"]
+
+    candles = {
+        "ts": buckets[starts],
+        "open": opens[starts],
+        "high": np.maximum.reduceat(highs, starts),
+        "low": np.minimum.reduceat(lows, starts),
+        "close": closes[ends],
+        "volume": np.add.reduceat(volume, starts),
+    }
+    if kind == "trade":
+        candles["trades"] = np.diff(np.concatenate((starts, [len(ts)])))
+    return candles
+
+
+# One download at a time per store
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def download(symbol: str, kind: str, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                   adapter: BitmexAdapter = adapter, root: str = None) -> int:
+    # Appends everything newer than what is stored, one page at a time, and returns the rows added
+    store = ColumnStore(symbol, kind, root)
+    async with _locks.setdefault(store.path, asyncio.Lock()):
+        # Only the downloader writes, so it is the one to realign columns a crash left behind
+        store.repair()
+        path, params = ("/trade", {}) if kind == "trade" else ("/trade/bucketed", {"binSize": "1m"})
+        params.update({"symbol": symbol, "count": BITMEX_HISTORY_PAGE_SIZE})
+        if start_time:
+            params["startTime"] = start_time
+        if end_time:
+            params["endTime"] = end_time
+
+        added = 0
+        while True:
+            # Resume at the newest stored timestamp, skipping the rows already stored for it
+            newest, seen = store.last()
+            if newest is not None:
+                params["startTime"] = str(np.datetime64(newest + (BUCKET_SIZE if kind == "bucket" else 0), "ms")) + "Z"
+                params["start"] = seen
+
+            rows = adapter.parse(await adapter.request("GET", path, Priority.READ, params=params))
+            if rows:
+                store.append(_columns(kind, rows))
+                added += len(rows)
+            if len(rows) < BITMEX_HISTORY_PAGE_SIZE:
+                return added
+
+
+def _columns(kind: str, rows: List[dict]) -> Dict[str, np.ndarray]:
+    ts = to_millis([row["timestamp"] for row in rows])
+    if kind == "trade":
+        return {
+            "ts": ts,
+            "price": np.array([row["price"] for row in rows], dtype=np.float64),
+            "size": np.array([row["size"] for row in rows], dtype=np.float64),
+        }
+    # BitMEX labels a bucket with its end time, stored by start time like the resampled candles.
+    # Empty buckets come back with null prices, stored as NaN.
+    return {
+        "ts": ts - BUCKET_SIZE,
+        **{name: np.array([row[name] for row in rows], dtype=np.float64)
+           for name in ("open", "high", "low", "close", "volume")},
+    }
@@ -0,0 +1,109 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+
+from app.api.metrics import registry
+from app.settings import BITMEX_IDEMPOTENCY_MAX_SIZE, BITMEX_IDEMPOTENCY_TTL
+from .risk import RiskRejection
+
+idempotency_requests = registry.counter(
+    "gateway_idempotency_total", "Order submissions by clOrdID dedup outcome.", ("result",)
+)
+
+
+def new_clordid() -> str:
+    # BitMEX accepts up to 36 characters, exactly the length of a UUID
+    return str(uuid.uuid4())
+
+
+def is_ambiguous(error: BaseException) -> bool:
+    # Timeouts and upstream 5xx leave it unknown whether the order reached the exchange
+    return isinstance(error, HTTPException) and error.status_code >= 500
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Throttled or stopped by the risk checks: the order was not placed, the next attempt goes out as new
+    return isinstance(error, RiskRejection) or (isinstance(error, HTTPException) and error.status_code == 429)
+
+
+class IdempotencyCache:
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self.max_size = max_size or BITMEX_IDEMPOTENCY_MAX_SIZE
+        self.ttl = BITMEX_IDEMPOTENCY_TTL if ttl is None else ttl
+
+        # clOrdID -> (expiry, future resolving to the exchange response), least recently used first
+        self.entries: OrderedDict = OrderedDict()
+
+        # clOrdID -> expiry of ambiguous last attempts, the next attempt must look the order up first. Bounded and
+        # expired like the entries, a retry long after the timeout is not expected.
+        self.unresolved: OrderedDict = OrderedDict()
+
+    def _get(self, key: str) -> Optional[asyncio.Future]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, future = entry
+        if expires_at < time.monotonic() and future.done():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return future
+
+    def _put(self, key: str, future: asyncio.Future):
+        self.entries[key] = (time.monotonic() + self.ttl, future)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def _is_unresolved(self, key: str) -> bool:
+        expires_at = self.unresolved.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self.unresolved[key]
+            return False
+        return True
+
+    def _mark_unresolved(self, key: str):
+        self.unresolved[key] = time.monotonic() + self.ttl
+        self.unresolved.move_to_end(key)
+        while len(self.unresolved) > self.max_size:
+            self.unresolved.popitem(last=False)
+
+    async def run(self, key: str, submit: Callable[[bool], Awaitable[dict]]) -> dict:
+        future = self._get(key)
+        if future is not None:
+            # Duplicate of a request that is still in flight or already answered
+            idempotency_requests.inc("join" if not future.done() else "hit")
+            return await asyncio.shield(future)
+
+        recovering = self._is_unresolved(key)
+        idempotency_requests.inc("recover" if recovering else "miss")
+
+        future = asyncio.get_running_loop().create_future()
+        self._put(key, future)
+        try:
+            result = await submit(recovering)
+        except BaseException as e:
+            if is_ambiguous(e) or isinstance(e, asyncio.CancelledError):
+                # Not cached, a retry looks the order up before placing it again
+                self.entries.pop(key, None)
+                self._mark_unresolved(key)
+            elif is_retryable(e):
+                # Not cached either, only final answers of the exchange are
+                self.entries.pop(key, None)
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody else awaits is not reported as unhandled
+            future.exception()
+            raise
+
+        self.unresolved.pop(key, None)
+        future.set_result(result)
+        return result
+
+
+idempotency = IdempotencyCache()
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from app.api.metrics import registry
+from app.api.ratelimit import Priority
+from app.settings import (
+    BITMEX_DEADMAN_INTERVAL,
+    BITMEX_DEADMAN_TIMEOUT,
+    BITMEX_KILL_SIGNATURE_MARGIN,
+    BITMEX_KILL_SIGNATURE_TTL,
+)
+from .adapter import BitmexAdapter
+from .auth import to_valid_json
+
+logger = logging.getLogger(__name__)
+
+kill_seconds = registry.histogram(
+    "gateway_kill_seconds", "Time from an emergency cancel-all to the exchange's answer.", ("account", "status")
+)
+deadman_heartbeats = registry.counter(
+    "gateway_deadman_heartbeats_total", "cancelAllAfter heartbeats by response status.", ("account", "status")
+)
+deadman_seconds = registry.histogram(
+    "gateway_deadman_heartbeat_seconds", "Round trip time of cancelAllAfter heartbeats.", ("account",)
+)
+
+
+class KillSwitch:
+    def __init__(self, adapter: BitmexAdapter):
+        self.adapter = adapter
+        self.url = adapter.base_url + "/order/all"
+
+        # (expires, headers) of the pre-signed cancel-all, refreshed before it expires
+        self._signed: Optional[Tuple[int, dict]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def presign(self) -> dict:
+        # A bodyless DELETE /order/all only varies with its expiry, so one signature serves until it nears expiry
+        now = time.time()
+        if self._signed is None or self._signed[0] - now < BITMEX_KILL_SIGNATURE_MARGIN:
+            expires = int(now + BITMEX_KILL_SIGNATURE_TTL)
+            headers = {
+                "api-expires": str(expires),
+                "api-key": self.adapter.api_key,
+                "api-signature": self.adapter.signer.sign("DELETE", self.url, expires),
+            }
+            self._signed = (expires, headers)
+        return self._signed[1]
+
+    async def kill(self) -> httpx.Response:
+        # Skips the rate governor queue and signing, nothing should stand between a kill and the exchange
+        headers = dict(self.presign())
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.adapter.send("DELETE", self.url, headers, None, "")
+            status = response.status_code
+        except HTTPException as e:
+            status = e.status_code
+            raise
+        finally:
+            kill_seconds.observe(time.perf_counter() - started, self.adapter.account, status)
+
+        # The call still counts against the account's budget
+        self.adapter.update_rate_limit(response)
+        return response
+
+    async def heartbeat(self, timeout: float = None):
+        # Re-arms the exchange's cancelAllAfter timer, it cancels every order if no heartbeat arrives in time
+        timeout = BITMEX_DEADMAN_TIMEOUT if timeout is None else timeout
+        data = to_valid_json({"timeout": int(timeout * 1000)})
+
+        started = time.perf_counter()
+        response = await self.adapter.request("POST", "/order/cancelAllAfter", Priority.CANCEL, data=data)
+        deadman_seconds.observe(time.perf_counter() - started, self.adapter.account)
+        deadman_heartbeats.inc(self.adapter.account, response.status_code)
+        return self.adapter.parse(response)
+
+    def start(self, interval: float = None):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(interval or BITMEX_DEADMAN_INTERVAL))
+
+    async def stop(self):
+        # The timer is left armed, orders are cancelled unless a restarted gateway picks up the heartbeat
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, interval: float):
+        while True:
+            try:
+                await self.heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Dead man's switch heartbeat failed for account %s: %s", self.adapter.account, e)
+            # Keeps the kill path's signature fresh between kills as well
+            self.presign()
+            await asyncio.sleep(interval)
+
+
+kill_switches: Dict[str, KillSwitch] = {}
+
+
+def get_kill_switch(adapter: BitmexAdapter) -> KillSwitch:
+    kill_switch = kill_switches.get(adapter.account)
+    if kill_switch is None or kill_switch.adapter is not adapter:
+        kill_switch = kill_switches[adapter.account] = KillSwitch(adapter)
+    return kill_switch
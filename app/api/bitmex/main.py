@@ -1,177 +1,500 @@
-import time
-from doctest import run_docstring_examples
-from typing import List, Union
-
-import requests
-from fastapi import APIRouter, Query, HTTPException
-from starlette.responses import JSONResponse
-
-from app.settings import *
-from .auth import *
+import asyncio
+import json
+from typing import AsyncIterator, Callable, Dict, List, Literal, Optional, Union
+
+import orjson
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.api.cluster import cluster
+from app.api.metrics import instrument, stage
+from app.api.ratelimit import Priority
+from app.api.resilience import hedged
+from app.api.responses import JSONResponse, RawJSONResponse
+from app.api.singleflight import SingleFlight
+from app.settings import BITMEX_BULK_ORDER_LIMIT, BITMEX_HEDGE_AFTER, BITMEX_PAGE_SIZE
+from .accounts import accounts, select_account
+from .adapter import BitmexAdapter, adapter
+from .auth import to_valid_json
 from .enums import OrderState
-from .schemas import *
+from .idempotency import idempotency, new_clordid
+from .killswitch import get_kill_switch
+from .orderbook import order_books
+from .pagination import walk_pages
+from .positions import positions
+from .risk import risk
+from .schemas import AmendRequest, CancelAllRequest, CancelRequest, OrderRequest
+from .store import order_store
+from .stream import CONSUMER_TABLES, stream
+
+# Coalesces concurrent identical GET /bitmex/orders queries
+order_queries = SingleFlight("bitmex_orders")
 
 router = APIRouter(
     prefix="/bitmex",
     tags=["Bitmex"]
 )
 
+# Routes acting on an account, mounted both as /bitmex/... and /bitmex/accounts/{account}/...
+account_router = APIRouter()
+
+
+async def fetch_orders(params: dict, adapter: BitmexAdapter = adapter):
+    # A query stuck behind a slow exchange node is sent again after BITMEX_HEDGE_AFTER, the first answer is used
+    return await hedged(lambda: adapter.request("GET", "/order", Priority.READ, params=params), BITMEX_HEDGE_AFTER,
+                        adapter.name)
 
-@router.get("/orders")
+
+async def _query_orders(params: dict, store: bool = True, adapter: BitmexAdapter = adapter):
+    content = adapter.parse(await fetch_orders(params, adapter))
+    if store:
+        order_store.upsert(content)
+    return content
+
+
+@account_router.get("/orders")
+@instrument
 async def get_orders(
         order_ids: Optional[List[str]] = Query(None, description="Order IDs to filter by."),
+        symbol: Optional[str] = Query(None, description="Instrument symbol to filter by (e.g., 'XBTUSD')."),
         start_time: Optional[str] = Query(None, description="Start time for date range filter (ISO 8601)."),
         end_time: Optional[str] = Query(None, description="End time for date range filter (ISO 8601)."),
         state: Optional[List[OrderState]] = Query(None,
                                                   description="Order state (e.g., NEW, PARTIALLY FILLED, FILLED, CANCELED)."),
         active: Optional[bool] = Query(False, description="Whether to filter only active orders."),
+        fresh: bool = Query(False, description="Bypass the local order cache and query the exchange."),
+        count: Optional[int] = Query(None, ge=1, le=BITMEX_PAGE_SIZE,
+                                     description="Number of orders to return, or the page size when paginating."),
+        start: Optional[int] = Query(None, ge=0, description="Offset of the first order to return."),
+        reverse: bool = Query(False, description="Return the newest orders first."),
+        columns: Optional[List[str]] = Query(None, description="Order fields to return."),
+        paginate: bool = Query(False, description="Walk every page of the range and stream the orders as NDJSON."),
+        adapter: BitmexAdapter = Depends(select_account),
 ):
-    # Setting the expiry time for the API request signature (5 seconds from the current time)
-    expires = int(round(time.time()) + 5)
-
-    url = BITMEX_BASE_URL + "/order"
-
-    # Dictionary to store filters for the API request
+    # Answer from the local order store when it is fresh enough and holds every matching order
+    tracked = accounts.is_default(adapter)
+    paged = count is not None or start is not None or reverse or columns or paginate
+    if tracked and not fresh and not paged and not start_time and not end_time and \
+            order_store.can_serve(order_ids=order_ids, active=active):
+        orders = order_store.query(order_ids=order_ids, symbol=symbol, state=state, active=active)
+        return JSONResponse(status_code=200, content=orders)
+
+    # Dictionary to store filters for the API request, normalized so equivalent queries look the same
     filters = {}
     if order_ids:
-        filters["orderID"] = order_ids
+        filters["orderID"] = sorted(set(order_ids))
     if state:
-        filters["ordStatus"] = state
+        filters["ordStatus"] = sorted(set(state))
     if active:
         filters["workingIndicator"] = True
 
     # Parameters for the API request
     params = {}
+    if symbol:
+        params["symbol"] = symbol
     if filters:
         params["filter"] = json.dumps(filters)
     if start_time:
         params["startTime"] = start_time
     if end_time:
         params["endTime"] = end_time
-
-    # Headers for the API request including the expiry time, API key, and signature
-    headers = {
-        "api-expires": str(expires),
-        "api-key": BITMEX_API_KEY,
-        "api-signature": generate_signature(BITMEX_SECRET_KEY, url=url, query_params=params, verb='GET', nonce=expires)
-    }
-
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        return JSONResponse(status_code=response.status_code, content=response.json())
-    else:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-
-
-@router.post("/orders")
-async def place_order(request: OrderRequest):
-    # Setting the expiry time for the API request signature (5 seconds from the current time)
-    expires = int(round(time.time()) + 5)
-
-    url = BITMEX_BASE_URL + "/order"
+    if reverse:
+        params["reverse"] = True
+    if columns:
+        params["columns"] = json.dumps(columns)
+
+    # Rows trimmed to a few columns would overwrite full orders in the store
+    store = tracked and not columns
+
+    if paginate:
+        pages = walk_pages(lambda page: _query_orders(page, store, adapter), params, page_size=count, start=start or 0)
+        # Pull the first page before answering so upstream errors still map to a status code
+        first = await anext(pages)
+        return StreamingResponse(_ndjson(first, pages), media_type="application/x-ndjson")
+
+    if count is not None:
+        params["count"] = count
+    if start is not None:
+        params["start"] = start
+
+    # Identical queries in flight at the same time share one upstream request and its body
+    key = (adapter.account, json.dumps(params, sort_keys=True))
+    content = await order_queries.do(key, lambda: _query_orders_body(params, store, adapter))
+    return RawJSONResponse(status_code=200, content=content)
+
+
+async def _query_orders_body(params: dict, store: bool, adapter: BitmexAdapter):
+    response = await fetch_orders(params, adapter)
+    # Rows are only decoded for the order store, the body is forwarded as received
+    if store:
+        order_store.upsert(adapter.parse(response))
+    return adapter.body(response)
+
+
+async def _ndjson(first: List[dict], pages: AsyncIterator[List[dict]]):
+    # One line per order, one chunk per page, so memory is bounded by the pages in flight
+    yield b"".join(orjson.dumps(row) + b"\n" for row in first)
+    async for rows in pages:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+async def find_order_by_clordid(clordid: str, adapter: BitmexAdapter = adapter):
+    tracked = accounts.is_default(adapter)
+    if tracked:
+        order = order_store.get_by_clordid(clordid)
+        if order is not None:
+            return order
+
+    params = {"filter": json.dumps({"clOrdID": clordid}), "reverse": "true", "count": 1}
+    content = adapter.parse(await fetch_orders(params, adapter))
+    if tracked:
+        order_store.upsert(content)
+    return content[0] if content else None
+
+
+async def _place(order: OrderRequest, recovering: bool, adapter: BitmexAdapter):
+    # A previous attempt with this clOrdID may have reached the exchange before timing out
+    if recovering:
+        existing = await find_order_by_clordid(order.clOrdID, adapter)
+        if existing is not None:
+            return existing
+
+    # Orders breaching a limit are rejected here, without spending upstream latency or rate budget
+    with stage("risk"):
+        risk.check(order, adapter.account)
 
     # JSON format used for the request should match the one used for generating the signature
-    request = to_valid_json(request)
-
-    # Headers for the API request including the expiry time, API key, and signature
-    headers = {
-        "api-expires": str(expires),
-        "api-key": BITMEX_API_KEY,
-        "api-signature": generate_signature(BITMEX_SECRET_KEY, url=url, verb='POST', nonce=expires, data=request)
-    }
-
-    response = requests.post(url, data=request, headers=headers)
-    if response.status_code == 200:
-        return JSONResponse(status_code=response.status_code, content=response.json())
-    else:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
+    with stage("serialize"):
+        request = to_valid_json(order)
+
+    content = adapter.parse(await adapter.request("POST", "/order", Priority.NEW, data=request))
+    if accounts.is_default(adapter):
+        order_store.upsert(content)
+    # Marketable orders come back (partially) filled, the execution stream reports the same fills later
+    positions.apply_orders(adapter.account, content)
+    return content
+
+
+async def submit_order(order: OrderRequest, adapter: BitmexAdapter = adapter):
+    # Every order gets a clOrdID so that duplicates of it can be recognized
+    if not order.clOrdID:
+        order = order.model_copy(update={"clOrdID": new_clordid()})
+
+    # Workers keep no clOrdID cache of their own, the leader's sees the duplicates sent to any process
+    if cluster.is_worker():
+        content = adapter.parse(await cluster.forward(adapter, "submit", to_valid_json(order)))
+        if accounts.is_default(adapter):
+            order_store.upsert(content)
+        positions.apply_orders(adapter.account, content)
+        return content
+
+    # Duplicate submissions get the cached response or join the one in flight, clOrdIDs are unique per account
+    key = order.clOrdID if accounts.is_default(adapter) else f"{adapter.account}:{order.clOrdID}"
+    return await idempotency.run(key, lambda recovering: _place(order, recovering, adapter))
+
+
+@account_router.post("/orders")
+@instrument
+async def place_order(
+        request: OrderRequest,
+        idempotency_key: Optional[str] = Header(None, description="Used as clOrdID when the order has none."),
+        adapter: BitmexAdapter = Depends(select_account),
+):
+    if idempotency_key and not request.clOrdID:
+        request = request.model_copy(update={"clOrdID": idempotency_key})
+    return JSONResponse(status_code=200, content=await submit_order(request, adapter))
 
-@router.put("/orders")
+
+@account_router.put("/orders")
+@instrument
 async def amend_order(
-        request: AmendRequest
+        request: AmendRequest,
+        adapter: BitmexAdapter = Depends(select_account),
 ):
     # Ensure the request body contains at least one valid parameter
     if not request:
         raise HTTPException(status_code=400, detail="At least one parameter (quantity, price, or others) must be provided.")
 
-    # Setting the expiry time for the API request signature (5 seconds from the current time)
-    expires = int(round(time.time()) + 5)
-
-    url = BITMEX_BASE_URL + "/order"
+    with stage("risk"):
+        risk.check_amend(request, adapter.account)
 
     # JSON format used for the request should match the one used for generating the signature
-    request = to_valid_json(request)
-
-    # Headers for the API request including the expiry time, API key, and signature
-    headers = {
-        "api-expires": str(expires),
-        "api-key": BITMEX_API_KEY,
-        "api-signature": generate_signature(BITMEX_SECRET_KEY, url=url, verb='PUT', nonce=expires, data=request)
-    }
-
-    response = requests.put(url, data=request, headers=headers)
-    if response.status_code == 200:
-        return JSONResponse(status_code=response.status_code, content=response.json())
-    else:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
+    with stage("serialize"):
+        request = to_valid_json(request)
 
-@router.delete("/orders")
+    response = await adapter.request("PUT", "/order", Priority.AMEND, data=request)
+    if accounts.is_default(adapter):
+        order_store.upsert(adapter.parse(response))
+    return RawJSONResponse(status_code=200, content=adapter.body(response))
+
+@account_router.delete("/orders")
+@instrument
 async def delete_orders(
-        request: Union[CancelRequest, CancelAllRequest]
+        request: Union[CancelRequest, CancelAllRequest],
+        adapter: BitmexAdapter = Depends(select_account),
 ):
     # The request is for canceling a specific order (CancelRequest)
     if isinstance(request, CancelRequest):
-        # Setting the expiry time for the API request signature (5 seconds from the current time)
-        expires = int(round(time.time()) + 5)
-
-        url = BITMEX_BASE_URL + "/order"
-
         # JSON format used for the request should match the one used for generating the signature
-        request = to_valid_json(request)
-
-        # Headers for the API request including the expiry time, API key, and signature
-        headers = {
-            "api-expires": str(expires),
-            "api-key": BITMEX_API_KEY,
-            "api-signature": generate_signature(BITMEX_SECRET_KEY, url=url, verb='DELETE', nonce=expires, data=request)
-        }
+        with stage("serialize"):
+            request = to_valid_json(request)
 
-        response = requests.delete(url, data=request, headers=headers)
-        if response.status_code == 200:
-            return JSONResponse(status_code=response.status_code, content=response.json())
-        else:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
+        response = await adapter.request("DELETE", "/order", Priority.CANCEL, data=request)
+        if accounts.is_default(adapter):
+            order_store.upsert(adapter.parse(response))
+        return RawJSONResponse(status_code=200, content=adapter.body(response))
 
     # The request is for canceling all orders (CancelAllRequest)
     elif isinstance(request, CancelAllRequest):
-        # Setting the expiry time for the API request signature (5 seconds from the current time)
-        expires = int(round(time.time()) + 5)
-
-        url = BITMEX_BASE_URL + "/order/all"
-
-        # If 'all' is set to True, prepare an empty request body
+        # If 'all' is set to True, cancel everything through the emergency path
         if request.all:
-            request = ""
+            return await _kill(adapter)
+
         # If 'all' is set to False (Default), Ensure that at least one filter parameter is provided
-        else:
-            if not request.targetAccountIds and not request.filter and not request.symbol:
-                raise HTTPException(
-                    status_code=400,
-                    detail="""At least one parameter (targetAccountIds, filter, or symbol) must be provided.
+        if not request.targetAccountIds and not request.filter and not request.symbol:
+            raise HTTPException(
+                status_code=400,
+                detail="""At least one parameter (targetAccountIds, filter, or symbol) must be provided.
                     If you want to cancel all orders without a filter, please set the parameter ‘all’ to ‘true’."""
-                )
-            # JSON format used for the request should match the one used for generating the signature
+            )
+        # JSON format used for the request should match the one used for generating the signature
+        with stage("serialize"):
             request = to_valid_json(request)
 
-        # Headers for the API request including the expiry time, API key, and signature
-        headers = {
-            "api-expires": str(expires),
-            "api-key": BITMEX_API_KEY,
-            "api-signature": generate_signature(BITMEX_SECRET_KEY, url=url, verb='DELETE', nonce=expires, data=request)
-        }
-
-        response = requests.delete(url, data=request, headers=headers)
-        if response.status_code == 200:
-            return JSONResponse(status_code=response.status_code, content=response.json())
-        else:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
\ No newline at end of file
+        response = await adapter.request("DELETE", "/order/all", Priority.CANCEL, data=request)
+        if accounts.is_default(adapter):
+            order_store.upsert(adapter.parse(response))
+        return RawJSONResponse(status_code=200, content=adapter.body(response))
+
+
+async def _kill(adapter: BitmexAdapter):
+    response = await get_kill_switch(adapter).kill()
+    if accounts.is_default(adapter):
+        order_store.upsert(adapter.parse(response))
+    return RawJSONResponse(status_code=200, content=adapter.body(response))
+
+
+@account_router.post("/kill")
+@instrument
+async def kill(adapter: BitmexAdapter = Depends(select_account)):
+    # Emergency cancel of every order of the account, pre-signed and ahead of any queued call
+    return await _kill(adapter)
+
+
+async def _send_bulk_chunk(verb: str, priority: Priority, orders: List[BaseModel], adapter: BitmexAdapter):
+    # BitMEX bulk form wraps the individual orders in an 'orders' array
+    with stage("serialize"):
+        request = to_valid_json({"orders": [order.model_dump(exclude_none=True) for order in orders]})
+
+    # A failed chunk is reported against each of its orders instead of failing the whole batch
+    try:
+        response = await adapter.request(verb, "/order/bulk", priority, data=request)
+    except HTTPException as e:
+        return e.status_code, e.detail
+
+    try:
+        content = response.json()
+    except ValueError:
+        content = response.text
+    return response.status_code, content
+
+
+async def _send_bulk(verb: str, priority: Priority, orders: List[BaseModel], adapter: BitmexAdapter,
+                     check: Optional[Callable[[BaseModel, str], None]] = None):
+    if not orders:
+        raise HTTPException(status_code=400, detail="At least one order must be provided.")
+
+    # Orders failing the risk checks are reported as such and never sent
+    rejected = {}
+    if check is not None:
+        with stage("risk"):
+            for index, order in enumerate(orders):
+                try:
+                    check(order, adapter.account)
+                except HTTPException as e:
+                    rejected[index] = e
+
+    # BitMEX rejects a bulk request mixing symbols, so orders are grouped by symbol (amends carry none) and each group
+    # is split over the upstream per-request limit, the chunks are dispatched concurrently
+    groups: Dict[Optional[str], List[int]] = {}
+    for index, order in enumerate(orders):
+        if index not in rejected:
+            groups.setdefault(getattr(order, "symbol", None), []).append(index)
+    size = BITMEX_BULK_ORDER_LIMIT
+    chunks = [group[i:i + size] for group in groups.values() for i in range(0, len(group), size)]
+    responses = await asyncio.gather(*(
+        _send_bulk_chunk(verb, priority, [orders[index] for index in chunk], adapter) for chunk in chunks
+    ))
+
+    # Chunk responses mapped back to the orders they carried, rejected orders in their place
+    outcomes = {index: {"status_code": e.status_code, "error": e.detail} for index, e in rejected.items()}
+    for chunk, (status_code, content) in zip(chunks, responses):
+        succeeded = status_code == 200 and isinstance(content, list) and len(content) == len(chunk)
+        if succeeded and accounts.is_default(adapter):
+            order_store.upsert(content)
+        if succeeded:
+            positions.apply_orders(adapter.account, content)
+        for position, index in enumerate(chunk):
+            if succeeded:
+                outcomes[index] = {"status_code": status_code, "order": content[position]}
+            else:
+                outcomes[index] = {"status_code": status_code, "error": content}
+    results = [{"index": index, **outcomes[index]} for index in range(len(orders))]
+
+    # 207 Multi-Status signals a partial failure, the per-order entries say which ones
+    failed = sum(1 for result in results if "error" in result)
+    if failed == len(results):
+        status_code = results[0]["status_code"] if results[0]["status_code"] != 200 else 502
+    elif failed:
+        status_code = 207
+    else:
+        status_code = 200
+    return JSONResponse(status_code=status_code, content={"results": results, "failed": failed})
+
+
+@account_router.post("/orders/bulk")
+@instrument
+async def place_orders_bulk(request: List[OrderRequest], adapter: BitmexAdapter = Depends(select_account)):
+    return await _send_bulk("POST", Priority.NEW, request, adapter, risk.check)
+
+
+@account_router.put("/orders/bulk")
+@instrument
+async def amend_orders_bulk(request: List[AmendRequest], adapter: BitmexAdapter = Depends(select_account)):
+    return await _send_bulk("PUT", Priority.AMEND, request, adapter, risk.check_amend)
+
+
+@account_router.get("/ratelimit")
+async def get_rate_limit(adapter: BitmexAdapter = Depends(select_account)):
+    # Local view of the exchange budget, queue depth per priority and time spent waiting
+    return adapter.governor.stats()
+
+
+@account_router.get("/positions")
+async def get_positions(
+        symbol: Optional[str] = Query(None, description="Instrument symbol to filter by (e.g., 'XBTUSD')."),
+        adapter: BitmexAdapter = Depends(select_account),
+):
+    # Kept locally from the account's fills, no upstream call
+    return JSONResponse(status_code=200, content=positions.query(adapter.account, symbol))
+
+
+@router.get("/accounts")
+async def get_accounts():
+    # Rate budget of every configured account, keyed by account name
+    return accounts.stats()
+
+
+@router.get("/circuit")
+async def get_circuit():
+    # Whether calls to BitMEX currently fail fast after repeated 503s and timeouts
+    return adapter.breaker.stats()
+
+
+@router.get("/orders/coalescing")
+async def get_coalescing():
+    # How many order queries led an upstream request and how many joined one in flight
+    return order_queries.stats()
+
+
+@router.post("/history/{symbol}")
+async def download_history(
+        symbol: str,
+        kind: Literal["trade", "bucket"] = Query("trade", description="Individual trades or 1m trade buckets."),
+        start_time: Optional[str] = Query(None, description="Where to start when nothing is stored yet (ISO 8601)."),
+        end_time: Optional[str] = Query(None, description="Where to stop (ISO 8601)."),
+):
+    # numpy comes in with the history module, on the first history call rather than at startup
+    from .history import ColumnStore, download
+
+    # Appends what the exchange has beyond the newest stored row
+    added = await download(symbol, kind, start_time, end_time)
+    return {"symbol": symbol, "kind": kind, "added": added, "rows": len(ColumnStore(symbol, kind))}
+
+
+@router.get("/history/{symbol}/candles")
+def get_candles(
+        symbol: str,
+        interval: str = Query("1m", description="Candle size, e.g. 30s, 5m, 4h or 1d."),
+        kind: Literal["trade", "bucket"] = Query("trade", description="History to build the candles from."),
+        start_time: Optional[str] = Query(None, description="First candle time (ISO 8601)."),
+        end_time: Optional[str] = Query(None, description="End of the range, exclusive (ISO 8601)."),
+):
+    # A plain def runs in the threadpool, scanning months of columns must not block the event loop
+    from .history import BUCKET_SIZE, ColumnStore, parse_interval, resample, to_millis
+
+    milliseconds = parse_interval(interval)
+    if kind == "bucket" and milliseconds % BUCKET_SIZE:
+        raise HTTPException(status_code=400, detail="Candles from buckets must be a multiple of 1m.")
+
+    try:
+        start, end = (int(to_millis([value])[0]) if value else None for value in (start_time, end_time))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_time and end_time must be ISO 8601 timestamps.")
+    candles = resample(ColumnStore(symbol, kind).range(start, end), kind, milliseconds)
+    return JSONResponse(status_code=200, content=candles)
+
+
+@router.websocket("/stream")
+async def stream_orders(
+        websocket: WebSocket,
+        tables: Optional[List[str]] = Query(None, description="Tables to receive (e.g., order, execution)."),
+):
+    await websocket.accept()
+
+    # Topics may carry a symbol (e.g. order:XBTUSD), events only carry the table name
+    names = [table.split(":")[0] for table in tables] if tables else list(CONSUMER_TABLES)
+
+    # Subscribe before sending the snapshot so no update falls in between
+    queue = stream.subscribe(names)
+    try:
+        # Send the current tables first so consumers start from a consistent state
+        for table in dict.fromkeys(names):
+            await websocket.send_json({"table": table, "action": "partial", "data": stream.snapshot(table)})
+
+        # Fan out the updates of the single upstream connection to this consumer
+        while True:
+            await websocket.send_json(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream.unsubscribe(queue)
+
+
+@router.get("/orderbook/{symbol}")
+async def get_orderbook(
+        symbol: str,
+        depth: Optional[int] = Query(None, ge=1, description="Number of price levels per side (all if omitted)."),
+):
+    # Served from the local L2 mirror, never from the exchange
+    book = order_books.get(symbol)
+    if book is None:
+        raise HTTPException(status_code=404, detail=f"No order book is maintained for '{symbol}'.")
+    if not book.synced:
+        raise HTTPException(status_code=503, detail=f"Order book for '{symbol}' is resynchronizing.")
+    return book.snapshot(depth)
+
+
+@router.websocket("/orderbook/{symbol}/stream")
+async def stream_orderbook(websocket: WebSocket, symbol: str):
+    await websocket.accept()
+
+    # Subscribe before sending the snapshot so no diff falls in between
+    queue = order_books.subscribe(symbol)
+    try:
+        book = order_books.get(symbol)
+        if book is not None and book.synced:
+            await websocket.send_json({"type": "snapshot", **book.snapshot()})
+
+        # Diffs carry the book sequence, a consumer applies those newer than its snapshot
+        while True:
+            await websocket.send_json(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        order_books.unsubscribe(symbol, queue)
+
+
+router.include_router(account_router)
+router.include_router(account_router, prefix="/accounts/{account}")
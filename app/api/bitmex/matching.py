@@ -0,0 +1,684 @@
+import bisect
+import functools
+import itertools
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.settings import BITMEX_PAPER_MAX_CLOSED_ORDERS
+
+# Order types executed without a limit once active, and those resting at their price
+MARKET_TYPES = ("Market", "Stop", "MarketIfTouched")
+TRIGGERED_TYPES = ("Stop", "StopLimit", "MarketIfTouched", "LimitIfTouched")
+CLOSED_STATUSES = ("Filled", "Canceled", "Rejected")
+
+
+class EngineError(Exception):
+    # A request the exchange would refuse, with the status code it would answer
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@functools.lru_cache(maxsize=1024)
+def iso(timestamp: float) -> str:
+    # Cached, every order touched by one request shares the same timestamp
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def parse_time(value: str) -> float:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def normalize_status(status: str) -> str:
+    # Matches 'PARTIALLY FILLED' from OrderState against 'PartiallyFilled'
+    return status.replace(" ", "").lower()
+
+
+class Order:
+    __slots__ = (
+        "orderID", "clOrdID", "clOrdLinkID", "account", "symbol", "side", "orderQty", "price", "displayQty", "stopPx",
+        "pegOffsetValue", "pegPriceType", "ordType", "timeInForce", "execInst", "contingencyType", "text",
+        "ordStatus", "triggered", "workingIndicator", "leavesQty", "cumQty", "notional", "transactTime", "timestamp",
+        "instructions", "held",
+    )
+
+    def to_dict(self, account_id: int) -> dict:
+        return {
+            "orderID": self.orderID,
+            "clOrdID": self.clOrdID,
+            "clOrdLinkID": self.clOrdLinkID,
+            "account": account_id,
+            "symbol": self.symbol,
+            "side": self.side,
+            "orderQty": self.orderQty,
+            "price": self.price,
+            "displayQty": self.displayQty,
+            "stopPx": self.stopPx,
+            "pegOffsetValue": self.pegOffsetValue,
+            "pegPriceType": self.pegPriceType,
+            "ordType": self.ordType,
+            "timeInForce": self.timeInForce,
+            "execInst": self.execInst,
+            "contingencyType": self.contingencyType,
+            "ordStatus": self.ordStatus,
+            "triggered": self.triggered,
+            "workingIndicator": self.workingIndicator,
+            "leavesQty": self.leavesQty,
+            "cumQty": self.cumQty,
+            "avgPx": self.notional / self.cumQty if self.cumQty else None,
+            "text": self.text,
+            "transactTime": iso(self.transactTime),
+            "timestamp": iso(self.timestamp),
+        }
+
+
+class BookSide:
+    def __init__(self, descending: bool):
+        # FIFO queue of orders per price plus the prices kept sorted ascending
+        self.levels: Dict[float, List[Order]] = {}
+        self.prices: List[float] = []
+        self.descending = descending
+
+    def add(self, order: Order):
+        level = self.levels.get(order.price)
+        if level is None:
+            self.levels[order.price] = [order]
+            bisect.insort(self.prices, order.price)
+        else:
+            level.append(order)
+
+    def remove(self, order: Order):
+        level = self.levels[order.price]
+        level.remove(order)
+        if not level:
+            self.drop(order.price)
+
+    def drop(self, price: float):
+        del self.levels[price]
+        del self.prices[bisect.bisect_left(self.prices, price)]
+
+    def best(self) -> Optional[float]:
+        if not self.prices:
+            return None
+        return self.prices[-1] if self.descending else self.prices[0]
+
+    def price_at(self, rank: int) -> float:
+        # Price of the rank-th best level
+        return self.prices[-1 - rank] if self.descending else self.prices[rank]
+
+    def depth(self, depth: Optional[int] = None) -> List[List[float]]:
+        levels = []
+        for rank in range(len(self.prices) if depth is None else min(depth, len(self.prices))):
+            price = self.price_at(rank)
+            # Hidden and iceberg orders only show their display quantity
+            size = sum(order.leavesQty if order.displayQty is None else min(order.displayQty, order.leavesQty)
+                       for order in self.levels[price])
+            levels.append([price, size])
+        return levels
+
+
+class Book:
+    def __init__(self):
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+
+    def side(self, side: str) -> BookSide:
+        return self.bids if side == "Buy" else self.asks
+
+    def opposite(self, side: str) -> BookSide:
+        return self.asks if side == "Buy" else self.bids
+
+
+class MatchingEngine:
+    def __init__(self, max_closed: int = None):
+        self.max_closed = max_closed or BITMEX_PAPER_MAX_CLOSED_ORDERS
+
+        self.books: Dict[str, Book] = {}
+        self.orders: Dict[str, Order] = {}
+        self.by_clordid: Dict[Tuple[str, str], Order] = {}
+        # Closed orders in the order they closed, the oldest are forgotten beyond max_closed
+        self.closed: "OrderedDict[str, None]" = OrderedDict()
+        # Untriggered stop and if-touched orders by symbol
+        self.stops: Dict[str, List[Order]] = {}
+        # Orders sharing a clOrdLinkID, by (account, clOrdLinkID)
+        self.links: Dict[Tuple[str, str], List[Order]] = {}
+
+        self.positions: Dict[Tuple[str, str], float] = {}
+        self.last_price: Dict[str, float] = {}
+        self.mark_price: Dict[str, float] = {}
+        self.index_price: Dict[str, float] = {}
+
+        # cancelAllAfter deadlines by account, as unix time
+        self.deadlines: Dict[str, float] = {}
+        self.account_ids: Dict[str, int] = {}
+        self.account_names: Dict[int, str] = {}
+
+        # Called with every execution, e.g. to feed positions or a journal
+        self.listeners: List[Callable[[dict], None]] = []
+
+        self._ids = itertools.count(1)
+        self._prefix = str(uuid.uuid4())[:24]
+        self._pending: List[Order] = []
+        self.now = time.time()
+
+    # Requests
+
+    def submit(self, account: str, request: dict) -> Order:
+        self._begin()
+        order = self._new_order(account, request)
+        self.orders[order.orderID] = order
+        if order.clOrdID:
+            self.by_clordid[(account, order.clOrdID)] = order
+
+        # Secondaries of a OneTriggersTheOther primary wait for the primary to fill
+        if order.clOrdLinkID:
+            link = self.links.setdefault((account, order.clOrdLinkID), [])
+            primary = next((o for o in link if o.contingencyType == "OneTriggersTheOther"), None)
+            link.append(order)
+            if primary is not None and order.contingencyType != "OneTriggersTheOther" and primary.ordStatus != "Filled":
+                order.held = True
+                order.workingIndicator = False
+                order.triggered = "NotTriggered"
+                if primary.ordStatus in CLOSED_STATUSES:
+                    self._cancel(order, "Canceled: Primary order was canceled")
+                return order
+
+        self._enter(order)
+        self._settle(order.symbol)
+        return order
+
+    def amend(self, account: str, request: dict) -> Order:
+        self._begin()
+        order = self._lookup(account, request.get("orderID"), request.get("origClOrdID"))
+        if order.ordStatus in CLOSED_STATUSES:
+            raise EngineError(f"Invalid ordStatus: {order.ordStatus}")
+
+        price = request.get("price", order.price)
+        leaves = order.leavesQty
+        if request.get("orderQty") is not None:
+            leaves = request["orderQty"] - order.cumQty
+        if request.get("leavesQty") is not None:
+            leaves = request["leavesQty"]
+
+        resting = self._is_resting(order)
+        book = self._book(order.symbol)
+        # A lower quantity keeps the queue position, a new price or a higher quantity goes to the back
+        keeps_priority = price == order.price and leaves <= order.leavesQty
+        if resting and not keeps_priority:
+            book.side(order.side).remove(order)
+
+        if request.get("clOrdID"):
+            self.by_clordid.pop((account, order.clOrdID), None)
+            order.clOrdID = request["clOrdID"]
+            self.by_clordid[(account, order.clOrdID)] = order
+        if request.get("stopPx") is not None:
+            order.stopPx = request["stopPx"]
+        if request.get("pegOffsetValue") is not None:
+            order.pegOffsetValue = request["pegOffsetValue"]
+        if request.get("text") is not None:
+            order.text = request["text"]
+        order.price = price
+        order.leavesQty = max(leaves, 0)
+        order.orderQty = order.cumQty + order.leavesQty
+        order.timestamp = self.now
+
+        if order.leavesQty <= 0:
+            if resting and keeps_priority:
+                book.side(order.side).remove(order)
+            self._cancel(order, order.text, resting=False)
+        elif resting and not keeps_priority:
+            self._enter(order)
+        self._settle(order.symbol)
+        return order
+
+    def cancel(self, account: str, order_ids: Iterable[str] = (), clordids: Iterable[str] = (),
+               text: Optional[str] = None) -> List[dict]:
+        self._begin()
+        account_id = self.account_id(account)
+        results = []
+        for order_id, clordid in [(order_id, None) for order_id in order_ids] + [(None, c) for c in clordids]:
+            try:
+                order = self._lookup(account, order_id, clordid)
+            except EngineError:
+                results.append({"orderID": order_id, "clOrdID": clordid, "error": "Not Found"})
+                continue
+            if order.ordStatus in CLOSED_STATUSES:
+                row = order.to_dict(account_id)
+                row["error"] = f"Unable to cancel order due to existing state: {order.ordStatus}"
+                results.append(row)
+                continue
+            self._cancel(order, text or "Canceled via API.")
+            results.append(order.to_dict(account_id))
+        return results
+
+    def cancel_all(self, account: str, symbol: Optional[str] = None, filter: Optional[dict] = None,
+                   text: Optional[str] = None) -> List[Order]:
+        self._begin()
+        return self._cancel_all(account, symbol, filter, text or "Canceled via API.")
+
+    def cancel_all_after(self, account: str, timeout: float) -> dict:
+        # Timeout in milliseconds, 0 disarms the timer
+        self._begin()
+        if timeout <= 0:
+            self.deadlines.pop(account, None)
+            return {"now": iso(self.now), "cancelTime": None}
+        self.deadlines[account] = self.now + timeout / 1000
+        return {"now": iso(self.now), "cancelTime": iso(self.deadlines[account])}
+
+    def query(self, account: str, symbol: Optional[str] = None, filter: Optional[dict] = None,
+              start_time: Optional[str] = None, end_time: Optional[str] = None,
+              count: int = 100, start: int = 0, reverse: bool = False) -> List[Order]:
+        self._begin()
+        return self._select(account, symbol, filter, start_time, end_time, count, start, reverse)
+
+    def _select(self, account: str, symbol: Optional[str], filter: Optional[dict], start_time: Optional[str],
+                end_time: Optional[str], count: int, start: int, reverse: bool) -> List[Order]:
+        checks = []
+        for key, value in (filter or {}).items():
+            if key == "open":
+                checks.append(lambda order, value=value: (order.ordStatus not in CLOSED_STATUSES) == value)
+            elif key == "ordStatus":
+                wanted = {normalize_status(v) for v in (value if isinstance(value, list) else [value])}
+                checks.append(lambda order, wanted=wanted: normalize_status(order.ordStatus) in wanted)
+            else:
+                wanted = value if isinstance(value, list) else [value]
+                checks.append(lambda order, key=key, wanted=wanted: getattr(order, key, None) in wanted)
+        low = parse_time(start_time) if start_time else None
+        high = parse_time(end_time) if end_time else None
+
+        orders = reversed(self.orders.values()) if reverse else iter(self.orders.values())
+        rows = []
+        skipped = 0
+        for order in orders:
+            if order.account != account or (symbol and order.symbol != symbol):
+                continue
+            if (low is not None and order.timestamp < low) or (high is not None and order.timestamp > high):
+                continue
+            if not all(check(order) for check in checks):
+                continue
+            if skipped < start:
+                skipped += 1
+                continue
+            rows.append(order)
+            if len(rows) >= count:
+                break
+        return rows
+
+    def set_price(self, symbol: str, last: Optional[float] = None, mark: Optional[float] = None,
+                  index: Optional[float] = None):
+        # Reference prices from outside (e.g. a replayed feed), stops and trailing pegs follow them
+        self._begin()
+        if last is not None:
+            self.last_price[symbol] = last
+        if mark is not None:
+            self.mark_price[symbol] = mark
+        if index is not None:
+            self.index_price[symbol] = index
+        self._settle(symbol)
+
+    # State
+
+    def account_id(self, account: str) -> int:
+        account_id = self.account_ids.get(account)
+        if account_id is None:
+            account_id = self.account_ids[account] = len(self.account_ids) + 1
+            self.account_names[account_id] = account
+        return account_id
+
+    def position(self, account: str, symbol: str) -> float:
+        return self.positions.get((account, symbol), 0)
+
+    def depth(self, symbol: str, depth: Optional[int] = None) -> dict:
+        book = self._book(symbol)
+        return {"bids": book.bids.depth(depth), "asks": book.asks.depth(depth)}
+
+    # Internals
+
+    def _begin(self):
+        self.now = time.time()
+        # Timers of cancelAllAfter are checked lazily, whenever the engine is used
+        if self.deadlines:
+            for account, deadline in list(self.deadlines.items()):
+                if deadline <= self.now:
+                    del self.deadlines[account]
+                    self._cancel_all(account, None, None, "Canceled: Cancel all after timeout")
+
+    def _book(self, symbol: str) -> Book:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = Book()
+        return book
+
+    def _new_order(self, account: str, request: dict) -> Order:
+        symbol = request.get("symbol")
+        if not symbol:
+            raise EngineError("symbol is required")
+
+        order = Order()
+        order.orderID = f"{self._prefix}{next(self._ids):012x}"
+        order.clOrdID = request.get("clOrdID") or ""
+        if order.clOrdID and (account, order.clOrdID) in self.by_clordid:
+            raise EngineError("Duplicate clOrdID")
+        order.clOrdLinkID = request.get("clOrdLinkID") or ""
+        order.account = account
+        order.symbol = symbol
+        order.side = request.get("side") or "Buy"
+        order.orderQty = request.get("orderQty")
+        order.price = request.get("price")
+        order.displayQty = request.get("displayQty")
+        order.stopPx = request.get("stopPx")
+        order.pegOffsetValue = request.get("pegOffsetValue")
+        order.pegPriceType = request.get("pegPriceType") or ""
+        order.ordType = request.get("ordType") or "Limit"
+        order.timeInForce = request.get("timeInForce") or ("ImmediateOrCancel" if order.ordType in MARKET_TYPES
+                                                           else "GoodTillCancel")
+        order.execInst = request.get("execInst") or ""
+        order.instructions = frozenset(order.execInst.split(",")) if order.execInst else frozenset()
+        order.contingencyType = request.get("contingencyType") or ""
+        order.text = request.get("text") or ""
+        order.ordStatus = "New"
+        order.triggered = ""
+        order.workingIndicator = order.ordType not in TRIGGERED_TYPES
+        order.cumQty = 0
+        order.notional = 0.0
+        order.held = False
+        order.transactTime = order.timestamp = self.now
+
+        # A negative quantity means a sell
+        if order.orderQty is not None and order.orderQty < 0:
+            order.side = "Sell"
+            order.orderQty = -order.orderQty
+        if order.orderQty is None and "Close" not in order.instructions:
+            raise EngineError("orderQty is required")
+        if order.orderQty is not None and order.orderQty <= 0:
+            raise EngineError("Invalid orderQty")
+        if order.ordType in ("Limit", "StopLimit", "LimitIfTouched") and order.price is None:
+            raise EngineError(f"Invalid price, {order.ordType} orders require a price")
+        if order.ordType in TRIGGERED_TYPES and order.stopPx is None and order.pegPriceType != "TrailingStopPeg":
+            raise EngineError(f"Invalid stopPx, {order.ordType} orders require a stopPx")
+        if "AllOrNone" in order.instructions and order.displayQty not in (None, 0):
+            raise EngineError("Invalid displayQty, AllOrNone orders must be hidden")
+        order.leavesQty = order.orderQty or 0
+        return order
+
+    def _enter(self, order: Order):
+        # Untriggered stops wait for their reference price, the rest goes to the book right away
+        if order.ordType in TRIGGERED_TYPES and order.triggered != "StopOrderTriggered":
+            self._trail(order)
+            if not self._triggers(order):
+                self.stops.setdefault(order.symbol, []).append(order)
+                return
+            order.triggered = "StopOrderTriggered"
+            order.workingIndicator = True
+        self._execute(order)
+
+    def _execute(self, order: Order):
+        book = self._book(order.symbol)
+        instructions = order.instructions
+
+        # Reduce-only and close orders can only shrink the position, sized when they become active
+        if "ReduceOnly" in instructions or "Close" in instructions:
+            position = self.position(order.account, order.symbol)
+            reducible = max(-position, 0) if order.side == "Buy" else max(position, 0)
+            if reducible <= 0:
+                order.orderQty = order.orderQty or 0
+                return self._cancel(order, "Canceled: Order had execInst of ReduceOnly or Close and would increase position")
+            order.leavesQty = min(order.leavesQty or reducible, reducible)
+            order.orderQty = order.cumQty + order.leavesQty
+
+        if order.ordType == "Pegged":
+            reference = (book.side(order.side) if order.pegPriceType == "PrimaryPeg" else book.opposite(order.side)).best()
+            if reference is None:
+                return self._cancel(order, "Canceled: No reference price for pegged order")
+            order.price = reference + (order.pegOffsetValue or 0)
+
+        limit = None if order.ordType in MARKET_TYPES else order.price
+        opposite = book.opposite(order.side)
+        best = opposite.best()
+        crosses = best is not None and (limit is None or (best <= limit if order.side == "Buy" else best >= limit))
+
+        if crosses and "ParticipateDoNotInitiate" in instructions:
+            return self._cancel(order, "Canceled: Order had execInst of ParticipateDoNotInitiate")
+
+        all_or_none = order.timeInForce == "FillOrKill" or "AllOrNone" in instructions
+        if crosses and all_or_none and self._available(order, limit, opposite) < order.leavesQty:
+            crosses = False
+        if crosses:
+            self._take(order, limit, opposite)
+
+        if order.leavesQty > 0 and order.ordStatus not in CLOSED_STATUSES:
+            if limit is None:
+                self._cancel(order, "Canceled: No liquidity left for market order", resting=False)
+            elif order.timeInForce in ("ImmediateOrCancel", "FillOrKill"):
+                self._cancel(order, f"Canceled: Order had timeInForce of {order.timeInForce}", resting=False)
+            else:
+                # Day orders rest like GoodTillCancel, there is no session end to expire them at
+                book.side(order.side).add(order)
+
+    def _available(self, order: Order, limit: Optional[float], opposite: BookSide) -> float:
+        available = 0
+        for rank in range(len(opposite.prices)):
+            price = opposite.price_at(rank)
+            if limit is not None and (price > limit if order.side == "Buy" else price < limit):
+                break
+            for resting in opposite.levels[price]:
+                if "AllOrNone" in resting.instructions and resting.leavesQty > order.leavesQty - available:
+                    continue
+                available += resting.leavesQty
+                if available >= order.leavesQty:
+                    return available
+        return available
+
+    def _take(self, order: Order, limit: Optional[float], opposite: BookSide):
+        # Walk the opposite side best price first, FIFO within a level
+        emptied = []
+        rank = 0
+        while order.leavesQty > 0 and rank < len(opposite.prices):
+            price = opposite.price_at(rank)
+            if limit is not None and (price > limit if order.side == "Buy" else price < limit):
+                break
+            level = opposite.levels[price]
+            traded = False
+            for resting in level:
+                # A resting all-or-none order only trades in full
+                if "AllOrNone" in resting.instructions and resting.leavesQty > order.leavesQty:
+                    continue
+                quantity = min(order.leavesQty, resting.leavesQty)
+                self._fill(resting, quantity, price, maker=True)
+                self._fill(order, quantity, price, maker=False)
+                traded = True
+                if order.leavesQty <= 0:
+                    break
+            if traded:
+                level[:] = [resting for resting in level if resting.leavesQty > 0]
+                if not level:
+                    emptied.append(price)
+            rank += 1
+
+        for price in emptied:
+            opposite.drop(price)
+
+    def _fill(self, order: Order, quantity: float, price: float, maker: bool):
+        order.leavesQty -= quantity
+        order.cumQty += quantity
+        order.notional += quantity * price
+        order.timestamp = self.now
+        order.ordStatus = "PartiallyFilled" if order.leavesQty > 0 else "Filled"
+
+        key = (order.account, order.symbol)
+        self.positions[key] = self.positions.get(key, 0) + (quantity if order.side == "Buy" else -quantity)
+        self.last_price[order.symbol] = price
+
+        if self.listeners:
+            execution = {
+                "execID": f"{self._prefix}{next(self._ids):012x}",
+                "orderID": order.orderID,
+                "clOrdID": order.clOrdID,
+                "account": self.account_id(order.account),
+                "symbol": order.symbol,
+                "side": order.side,
+                "lastQty": quantity,
+                "lastPx": price,
+                "lastLiquidityInd": "AddedLiquidity" if maker else "RemovedLiquidity",
+                "execType": "Trade",
+                "ordStatus": order.ordStatus,
+                "leavesQty": order.leavesQty,
+                "cumQty": order.cumQty,
+                "avgPx": order.notional / order.cumQty,
+                "timestamp": iso(self.now),
+            }
+            for listener in self.listeners:
+                listener(execution)
+
+        if order.leavesQty <= 0:
+            order.workingIndicator = False
+            self._close(order)
+        if order.clOrdLinkID:
+            self._pending.append(order)
+
+    def _cancel(self, order: Order, text: str, resting: Optional[bool] = None):
+        if resting is None:
+            resting = self._is_resting(order)
+        if resting:
+            self._book(order.symbol).side(order.side).remove(order)
+        elif order.ordType in TRIGGERED_TYPES and order.triggered != "StopOrderTriggered":
+            stops = self.stops.get(order.symbol)
+            if stops and order in stops:
+                stops.remove(order)
+
+        order.ordStatus = "Canceled"
+        order.workingIndicator = False
+        order.text = text or order.text
+        order.timestamp = self.now
+        self._close(order)
+        if order.clOrdLinkID:
+            self._pending.append(order)
+
+    def _cancel_all(self, account: str, symbol: Optional[str], filter: Optional[dict], text: str) -> List[Order]:
+        canceled = []
+        for order in self._select(account, symbol, dict(filter or {}, open=True), None, None, len(self.orders), 0, False):
+            self._cancel(order, text)
+            canceled.append(order)
+        self._contingencies()
+        return canceled
+
+    def _close(self, order: Order):
+        self.closed[order.orderID] = None
+        while len(self.closed) > self.max_closed:
+            order_id, _ = self.closed.popitem(last=False)
+            forgotten = self.orders.pop(order_id, None)
+            if forgotten is not None and forgotten.clOrdID:
+                self.by_clordid.pop((forgotten.account, forgotten.clOrdID), None)
+
+    def _is_resting(self, order: Order) -> bool:
+        if order.ordStatus in CLOSED_STATUSES or order.held:
+            return False
+        if order.ordType in TRIGGERED_TYPES and order.triggered != "StopOrderTriggered":
+            return False
+        level = self._book(order.symbol).side(order.side).levels.get(order.price)
+        return level is not None and order in level
+
+    def _lookup(self, account: str, order_id: Optional[str], clordid: Optional[str]) -> Order:
+        order = self.orders.get(order_id) if order_id else self.by_clordid.get((account, clordid))
+        if order is None or order.account != account:
+            raise EngineError("Not Found", 404)
+        return order
+
+    def _settle(self, symbol: str):
+        # Contingent orders and stops react to what just happened until nothing changes anymore
+        while True:
+            self._contingencies()
+            if not self._trigger_stops(symbol):
+                break
+
+    def _contingencies(self):
+        while self._pending:
+            order = self._pending.pop()
+            link = self.links.get((order.account, order.clOrdLinkID))
+            if not link:
+                continue
+
+            if order.contingencyType == "OneTriggersTheOther":
+                for other in link:
+                    if other.held and order.ordStatus == "Filled":
+                        other.held = False
+                        other.triggered = ""
+                        other.workingIndicator = other.ordType not in TRIGGERED_TYPES
+                        self._enter(other)
+                    elif other.held and order.ordStatus in CLOSED_STATUSES:
+                        other.held = False
+                        self._cancel(other, "Canceled: Primary order was canceled", resting=False)
+            elif order.contingencyType == "OneCancelsTheOther" and order.cumQty > 0:
+                # Any execution of one side cancels the others
+                for other in link:
+                    if other is not order and other.contingencyType == "OneCancelsTheOther" and \
+                            other.ordStatus not in CLOSED_STATUSES and not other.held:
+                        self._cancel(other, "Canceled: Contingent order executed")
+
+            # Forget links whose orders are all done
+            if all(other.ordStatus in CLOSED_STATUSES for other in link):
+                del self.links[(order.account, order.clOrdLinkID)]
+
+    def _reference(self, order: Order) -> Optional[float]:
+        # Stops trigger on the mark price unless told otherwise, falling back to the last trade
+        symbol = order.symbol
+        if "LastPrice" in order.instructions or "LastWithinMark" in order.instructions:
+            return self.last_price.get(symbol)
+        if "IndexPrice" in order.instructions:
+            return self.index_price.get(symbol, self.mark_price.get(symbol, self.last_price.get(symbol)))
+        return self.mark_price.get(symbol, self.last_price.get(symbol))
+
+    def _trail(self, order: Order):
+        # Trailing stops follow the reference price by pegOffsetValue but never move back
+        if order.pegPriceType != "TrailingStopPeg" or order.pegOffsetValue is None:
+            return
+        reference = self._reference(order)
+        if reference is None:
+            return
+        candidate = reference + order.pegOffsetValue
+        if order.stopPx is None:
+            order.stopPx = candidate
+        elif order.side == "Sell":
+            order.stopPx = max(order.stopPx, candidate)
+        else:
+            order.stopPx = min(order.stopPx, candidate)
+
+    def _triggers(self, order: Order) -> bool:
+        reference = self._reference(order)
+        if reference is None or order.stopPx is None:
+            return False
+        # Buy stops and sell if-touched orders trigger on a rise, the others on a fall
+        rises = (order.ordType in ("Stop", "StopLimit")) == (order.side == "Buy")
+        return reference >= order.stopPx if rises else reference <= order.stopPx
+
+    def _trigger_stops(self, symbol: str) -> bool:
+        stops = self.stops.get(symbol)
+        if not stops:
+            return False
+
+        triggered = []
+        for order in stops:
+            self._trail(order)
+            if self._triggers(order):
+                triggered.append(order)
+        if not triggered:
+            return False
+
+        fired = set(map(id, triggered))
+        self.stops[symbol] = [order for order in stops if id(order) not in fired]
+        for order in triggered:
+            order.triggered = "StopOrderTriggered"
+            order.workingIndicator = True
+            order.timestamp = self.now
+            self._execute(order)
+        return True
+
+
+engine = MatchingEngine()
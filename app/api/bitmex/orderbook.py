@@ -0,0 +1,204 @@
+import asyncio
+import bisect
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.settings import BITMEX_ORDERBOOK_QUEUE_SIZE, BITMEX_ORDERBOOK_SYMBOLS
+from .stream import stream
+
+logger = logging.getLogger(__name__)
+
+
+class BookGap(Exception):
+    # Raised when an incremental update does not fit the book, a fresh snapshot is needed
+    pass
+
+
+class PriceLevels:
+    def __init__(self, descending: bool):
+        # Sizes by price plus the prices kept sorted ascending, binary searched on change
+        self.sizes: Dict[float, float] = {}
+        self.prices: List[float] = []
+        self.descending = descending
+
+    def set(self, price: float, size: float):
+        if price not in self.sizes:
+            bisect.insort(self.prices, price)
+        self.sizes[price] = size
+
+    def remove(self, price: float):
+        if self.sizes.pop(price, None) is not None:
+            index = bisect.bisect_left(self.prices, price)
+            del self.prices[index]
+
+    def best(self) -> Optional[float]:
+        if not self.prices:
+            return None
+        return self.prices[-1] if self.descending else self.prices[0]
+
+    def top(self, depth: Optional[int] = None) -> List[List[float]]:
+        prices = reversed(self.prices) if self.descending else iter(self.prices)
+        levels = []
+        for price in prices:
+            if depth is not None and len(levels) >= depth:
+                break
+            levels.append([price, self.sizes[price]])
+        return levels
+
+
+class OrderBook:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = PriceLevels(descending=True)
+        self.asks = PriceLevels(descending=False)
+
+        # BitMEX identifies levels by id, updates and deletes may omit the price
+        self.levels: Dict[int, Tuple[str, float]] = {}
+
+        # Incremented for every applied message, lets readers line snapshots up with diffs
+        self.sequence = 0
+        self.synced = False
+        self.timestamp: Optional[str] = None
+
+    def _side(self, side: str) -> PriceLevels:
+        return self.bids if side == "Buy" else self.asks
+
+    def reset(self, rows: List[dict]) -> List[list]:
+        self.bids = PriceLevels(descending=True)
+        self.asks = PriceLevels(descending=False)
+        self.levels = {}
+        for row in rows:
+            self._set(row)
+        self.synced = True
+        self.sequence += 1
+        return []
+
+    def apply(self, action: str, rows: List[dict]) -> List[list]:
+        if action == "partial":
+            return self.reset(rows)
+        if not self.synced:
+            raise BookGap(f"{self.symbol}: {action} before snapshot")
+
+        # Changed levels as [side, price, size], size 0 meaning the level is gone
+        changes = []
+        for row in rows:
+            if action == "insert":
+                changes.extend(self._set(row))
+            elif action == "update":
+                if row["id"] not in self.levels:
+                    raise BookGap(f"{self.symbol}: update for unknown level {row['id']}")
+                side, price = self.levels[row["id"]]
+                changes.extend(self._set({"side": side, "price": price, **row}))
+            elif action == "delete":
+                level = self.levels.pop(row["id"], None)
+                if level is None:
+                    raise BookGap(f"{self.symbol}: delete for unknown level {row['id']}")
+                side, price = level
+                self._side(side).remove(price)
+                changes.append([side, price, 0])
+            if row.get("timestamp"):
+                self.timestamp = row["timestamp"]
+
+        # A crossed book means updates were missed
+        best_bid, best_ask = self.bids.best(), self.asks.best()
+        if best_bid is not None and best_ask is not None and best_bid >= best_ask:
+            raise BookGap(f"{self.symbol}: crossed book {best_bid} >= {best_ask}")
+
+        self.sequence += 1
+        return changes
+
+    def _set(self, row: dict) -> List[list]:
+        side, price = row["side"], row["price"]
+        changes = []
+        # A level moved to another price is gone from the old one
+        previous = self.levels.get(row["id"])
+        if previous is not None and previous != (side, price):
+            self._side(previous[0]).remove(previous[1])
+            changes.append([previous[0], previous[1], 0])
+        self.levels[row["id"]] = (side, price)
+        self._side(side).set(price, row["size"])
+        if row.get("timestamp"):
+            self.timestamp = row["timestamp"]
+        changes.append([side, price, row["size"]])
+        return changes
+
+    def snapshot(self, depth: Optional[int] = None) -> dict:
+        return {
+            "symbol": self.symbol,
+            "sequence": self.sequence,
+            "timestamp": self.timestamp,
+            "bids": self.bids.top(depth),
+            "asks": self.asks.top(depth),
+        }
+
+
+class OrderBooks:
+    def __init__(self, resnapshot: Optional[Callable[[str], None]] = None, queue_size: int = None):
+        self.books: Dict[str, OrderBook] = {}
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.queue_size = queue_size or BITMEX_ORDERBOOK_QUEUE_SIZE
+
+        # Called with the symbol whose book needs a fresh partial
+        self.resnapshot = resnapshot
+
+    def get(self, symbol: str) -> Optional[OrderBook]:
+        return self.books.get(symbol)
+
+    def subscribe(self, symbol: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(symbol, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, symbol: str, queue: asyncio.Queue):
+        self.subscribers.get(symbol, set()).discard(queue)
+
+    def apply_stream_event(self, event: dict):
+        if event.get("table") != "orderBookL2":
+            return
+
+        # One message may carry rows of several symbols
+        rows_by_symbol: Dict[str, List[dict]] = {}
+        for row in event.get("data", []):
+            rows_by_symbol.setdefault(row["symbol"], []).append(row)
+
+        for symbol, rows in rows_by_symbol.items():
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = OrderBook(symbol)
+            try:
+                changes = book.apply(event["action"], rows)
+            except BookGap as e:
+                logger.warning("Order book out of sync, requesting a snapshot: %s", e)
+                was_synced = book.synced
+                book.synced = False
+                if was_synced and self.resnapshot is not None:
+                    self.resnapshot(symbol)
+                continue
+
+            if event["action"] == "partial":
+                self._publish(symbol, {"type": "snapshot", **book.snapshot()})
+            elif changes:
+                self._publish(symbol, {"type": "diff", "symbol": symbol, "sequence": book.sequence, "changes": changes})
+
+    def _publish(self, symbol: str, event: dict):
+        for queue in self.subscribers.get(symbol, ()):
+            # A consumer that falls behind gets the full book again instead of a broken diff sequence
+            if queue.full():
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "snapshot", **self.books[symbol].snapshot()})
+                continue
+            queue.put_nowait(event)
+
+
+order_books = OrderBooks(resnapshot=lambda symbol: stream.resubscribe("orderBookL2:" + symbol))
+
+
+def subscribe_order_books():
+    # Incremental L2 updates for every configured symbol ride on the shared stream
+    for symbol in BITMEX_ORDERBOOK_SYMBOLS:
+        topic = "orderBookL2:" + symbol
+        if topic not in stream.tables_to_subscribe:
+            stream.tables_to_subscribe.append(topic)
+    if order_books.apply_stream_event not in stream.listeners:
+        stream.listeners.append(order_books.apply_stream_event)
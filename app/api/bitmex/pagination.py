@@ -0,0 +1,30 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from app.settings import BITMEX_PAGE_SIZE, BITMEX_PAGINATION_CONCURRENCY
+
+
+async def walk_pages(
+        fetch: Callable[[dict], Awaitable[List[dict]]],
+        params: dict,
+        page_size: int = None,
+        concurrency: int = None,
+        start: int = 0,
+) -> AsyncIterator[List[dict]]:
+    page_size = page_size or BITMEX_PAGE_SIZE
+    concurrency = concurrency or BITMEX_PAGINATION_CONCURRENCY
+
+    # Start with a single page so short histories cost one call, then widen the window up to the limit
+    window = 1
+    while True:
+        offsets = [start + i * page_size for i in range(window)]
+        pages = await asyncio.gather(*(fetch({**params, "count": page_size, "start": offset}) for offset in offsets))
+
+        # Pages are yielded in offset order, a short one marks the end of the range
+        for rows in pages:
+            yield rows
+            if len(rows) < page_size:
+                return
+
+        start += window * page_size
+        window = min(window * 2, concurrency)
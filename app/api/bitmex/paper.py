@@ -0,0 +1,127 @@
+import time
+from typing import Optional
+
+import httpx
+import orjson
+
+from app.api.cluster import cluster
+from app.api.metrics import record_stage, upstream_requests, upstream_seconds
+from app.api.ratelimit import RateLimitGovernor
+from app.settings import BITMEX_PAGE_SIZE, BITMEX_PAPER_RATE_LIMIT, BITMEX_PAPER_RATE_LIMIT_BURST
+from .adapter import BitmexAdapter
+from .matching import EngineError, MatchingEngine, engine
+
+# Stands in for BITMEX_BASE_URL, requests never leave the process
+PAPER_BASE_URL = "paper://bitmex/api/v1"
+
+
+def _ids(value) -> list:
+    # BitMEX takes a single ID, a comma separated string or a list
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    return value.split(",")
+
+
+def _flag(value) -> bool:
+    return value is True or str(value).lower() == "true"
+
+
+class PaperAdapter(BitmexAdapter):
+    name = "bitmex_paper"
+
+    def __init__(self, matching_engine: MatchingEngine = None, governor=None, account=None, **kwargs):
+        super().__init__(
+            base_url=PAPER_BASE_URL,
+            api_key=kwargs.get("api_key") or "paper",
+            secret=kwargs.get("secret") or "paper",
+            governor=governor or RateLimitGovernor(BITMEX_PAPER_RATE_LIMIT, BITMEX_PAPER_RATE_LIMIT_BURST),
+            account=account,
+        )
+        self.engine = matching_engine or engine
+
+    def sign(self, verb: str, url: str, params: Optional[dict], data: str):
+        # Nothing to authenticate in process
+        return url, {}, params
+
+    async def send(self, verb: str, url: str, headers: dict, query: Optional[dict], data: str) -> httpx.Response:
+        # The engine lives in the cluster leader, workers' direct calls (e.g. the kill switch) go there too
+        if cluster.is_worker():
+            return await cluster.forward(self, "send", data, verb=verb, url=url, headers=headers, query=query)
+
+        started = time.perf_counter()
+        route = ROUTES.get((verb, url[len(self.base_url):]))
+        try:
+            if route is None:
+                raise EngineError("Not Found", 404)
+            content = route(self, query or {}, orjson.loads(data) if data else {})
+            status_code = 200
+        except EngineError as e:
+            content = {"error": {"message": e.message, "name": "HTTPError"}}
+            status_code = e.status_code
+
+        # Timed like a real upstream call so the metrics stay comparable
+        elapsed = time.perf_counter() - started
+        record_stage("upstream", elapsed)
+        upstream_seconds.observe(elapsed, self.name, verb, status_code)
+        upstream_requests.inc(self.name, verb, status_code)
+        content = orjson.dumps(content)
+        self.journal_call(verb, url, query, data, status_code, content)
+        return httpx.Response(status_code, content=content, headers={"content-type": "application/json"})
+
+    def _row(self, order) -> dict:
+        return order.to_dict(self.engine.account_id(self.account))
+
+    def get_orders(self, query: dict, body: dict):
+        orders = self.engine.query(
+            self.account,
+            symbol=query.get("symbol"),
+            filter=orjson.loads(query["filter"]) if query.get("filter") else None,
+            start_time=query.get("startTime"),
+            end_time=query.get("endTime"),
+            count=min(int(query.get("count", 100)), BITMEX_PAGE_SIZE),
+            start=int(query.get("start", 0)),
+            reverse=_flag(query.get("reverse")),
+        )
+        rows = [self._row(order) for order in orders]
+        if query.get("columns"):
+            columns = set(orjson.loads(query["columns"])) | {"orderID"}
+            rows = [{key: value for key, value in row.items() if key in columns} for row in rows]
+        return rows
+
+    def place_order(self, query: dict, body: dict):
+        return self._row(self.engine.submit(self.account, body))
+
+    def amend_order(self, query: dict, body: dict):
+        return self._row(self.engine.amend(self.account, body))
+
+    def cancel_orders(self, query: dict, body: dict):
+        clordids = _ids(body.get("clOrdID")) + _ids(body.get("origClOrdID"))
+        return self.engine.cancel(self.account, _ids(body.get("orderID")), clordids, body.get("text"))
+
+    def cancel_all(self, query: dict, body: dict):
+        orders = self.engine.cancel_all(self.account, body.get("symbol"), body.get("filter"), body.get("text"))
+        return [self._row(order) for order in orders]
+
+    def place_bulk(self, query: dict, body: dict):
+        return [self._row(self.engine.submit(self.account, order)) for order in body.get("orders", [])]
+
+    def amend_bulk(self, query: dict, body: dict):
+        return [self._row(self.engine.amend(self.account, order)) for order in body.get("orders", [])]
+
+    def cancel_all_after(self, query: dict, body: dict):
+        return self.engine.cancel_all_after(self.account, body.get("timeout", 0))
+
+
+# BitMEX REST routes served by the engine
+ROUTES = {
+    ("GET", "/order"): PaperAdapter.get_orders,
+    ("POST", "/order"): PaperAdapter.place_order,
+    ("PUT", "/order"): PaperAdapter.amend_order,
+    ("DELETE", "/order"): PaperAdapter.cancel_orders,
+    ("DELETE", "/order/all"): PaperAdapter.cancel_all,
+    ("POST", "/order/bulk"): PaperAdapter.place_bulk,
+    ("PUT", "/order/bulk"): PaperAdapter.amend_bulk,
+    ("POST", "/order/cancelAllAfter"): PaperAdapter.cancel_all_after,
+}
@@ -0,0 +1,194 @@
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from app.settings import BITMEX_CONTRACTS, BITMEX_POSITION_MAX_ORDERS
+from .adapter import DEFAULT_ACCOUNT
+
+# Below this a quantity is treated as flat, float sums of fills do not always cancel out exactly
+EPSILON = 1e-9
+
+
+class PositionEngine:
+    def __init__(self, contracts: Dict[str, dict] = None, max_orders: int = None):
+        self.contracts = BITMEX_CONTRACTS if contracts is None else contracts
+        self.max_orders = max_orders or BITMEX_POSITION_MAX_ORDERS
+
+        # One slot per (account, symbol) in flat columns, a fill touches a handful of floats
+        self.slots: Dict[Tuple[str, str], int] = {}
+        self.keys: List[Tuple[str, str]] = []
+        self.inverse = array("b")
+        self.multiplier = array("d")
+        self.qty = array("d")
+        # Value of the open quantity at entry: quote currency for linear contracts, coin for inverse ones
+        self.cost = array("d")
+        self.realised = array("d")
+        # Sum of execComm as BitMEX reports it, in the settlement currency's smallest unit (e.g. XBt)
+        self.commission = array("d")
+        self.volume = array("d")
+        self.last_price = array("d")
+
+        # Mark price by symbol, from quotes or the instrument table
+        self.marks: Dict[str, float] = {}
+
+        # orderID -> quantity and notional applied, cumQty up to which commission was charged, oldest first
+        self.applied: OrderedDict = OrderedDict()
+
+    def _slot(self, account: str, symbol: str) -> int:
+        slot = self.slots.get((account, symbol))
+        if slot is None:
+            contract = self.contracts.get(symbol, {})
+            slot = self.slots[(account, symbol)] = len(self.keys)
+            self.keys.append((account, symbol))
+            self.inverse.append(1 if contract.get("inverse") else 0)
+            self.multiplier.append(float(contract.get("multiplier", 1)))
+            for column in (self.qty, self.cost, self.realised, self.commission, self.volume, self.last_price):
+                column.append(0.0)
+        return slot
+
+    def _value(self, slot: int, quantity: float, price: float) -> float:
+        if self.inverse[slot]:
+            return quantity * self.multiplier[slot] / price
+        return quantity * price * self.multiplier[slot]
+
+    def fill(self, account: str, symbol: str, quantity: float, price: float):
+        # quantity is signed, positive for buys
+        if not quantity or not price or price <= 0:
+            return
+        slot = self._slot(account, symbol)
+        position = self.qty[slot]
+        self.volume[slot] += abs(quantity)
+        self.last_price[slot] = price
+
+        if position * quantity < 0:
+            # Close against the average entry, pro rata of the cost
+            closed = -position if abs(quantity) >= abs(position) else quantity
+            basis = self.cost[slot] * (-closed / position)
+            exit_value = self._value(slot, -closed, price)
+            # Longs make money when the price rises, for inverse contracts that means less coin per contract
+            self.realised[slot] += basis - exit_value if self.inverse[slot] else exit_value - basis
+            self.cost[slot] -= basis
+            position += closed
+            quantity -= closed
+
+        if quantity:
+            position += quantity
+            self.cost[slot] += self._value(slot, quantity, price)
+
+        if abs(position) < EPSILON:
+            position = 0.0
+            self.cost[slot] = 0.0
+        self.qty[slot] = position
+
+    def _apply(self, account: str, row: dict, last_qty: Optional[float] = None, last_px: Optional[float] = None,
+               commission: float = 0.0):
+        # Only what the order filled beyond what was already applied counts, whichever source reports it first
+        order_id, cum_qty = row.get("orderID"), row.get("cumQty")
+        if not order_id or not cum_qty or not row.get("symbol") or row.get("side") not in ("Buy", "Sell"):
+            return
+        done_qty, done_notional, charged_qty = self.applied.get(order_id, (0.0, 0.0, 0.0))
+        slot = self._slot(account, row["symbol"])
+
+        # Commission comes with executions only, charged once per execution even if its fill was applied already
+        if commission and cum_qty > charged_qty:
+            self.commission[slot] += commission
+            charged_qty = cum_qty
+
+        # The exact fill price when this row is a single fill, otherwise what the average price implies
+        quantity = cum_qty - done_qty
+        price = None
+        if quantity > 0 and last_qty == quantity and last_px:
+            price = last_px
+        elif quantity > 0 and row.get("avgPx"):
+            price = (cum_qty * row["avgPx"] - done_notional) / quantity
+        if price:
+            self.fill(account, row["symbol"], quantity if row["side"] == "Buy" else -quantity, price)
+            done_qty, done_notional = cum_qty, done_notional + quantity * price
+
+        self.applied[order_id] = (done_qty, done_notional, charged_qty)
+        self.applied.move_to_end(order_id)
+        while len(self.applied) > self.max_orders:
+            self.applied.popitem(last=False)
+
+    def apply_orders(self, account: str, rows: Union[dict, Iterable[dict]]):
+        # Order rows as returned when placing, filled quantity is read from cumQty and avgPx
+        if isinstance(rows, dict):
+            rows = [rows]
+        for row in rows:
+            if isinstance(row, dict):
+                self._apply(account, row)
+
+    def apply_execution(self, account: str, row: dict):
+        if row.get("execType") == "Trade":
+            self._apply(account, row, row.get("lastQty"), row.get("lastPx"), row.get("execComm") or 0.0)
+
+    def apply_stream_event(self, event: dict):
+        # The stream carries the default account's executions and the marks of every subscribed symbol
+        table = event.get("table")
+        if table == "execution" and event.get("action") == "insert":
+            for row in event.get("data", []):
+                self.apply_execution(DEFAULT_ACCOUNT, row)
+        elif table == "execution" and event.get("action") == "partial":
+            # Recent history sent on (re)connect: it only fills gaps of orders seen since the start
+            for row in event.get("data", []):
+                if row.get("orderID") in self.applied:
+                    self.apply_execution(DEFAULT_ACCOUNT, row)
+        elif table == "quote":
+            for row in event.get("data", []):
+                if row.get("bidPrice") and row.get("askPrice"):
+                    self.marks[row["symbol"]] = (row["bidPrice"] + row["askPrice"]) / 2
+        elif table == "instrument":
+            for row in event.get("data", []):
+                if row.get("markPrice"):
+                    self.marks[row["symbol"]] = row["markPrice"]
+
+    def notional(self, symbol: str, quantity: float, price: float) -> float:
+        # Value of a quantity at a price, in the currency PnL is reported in
+        contract = self.contracts.get(symbol, {})
+        multiplier = float(contract.get("multiplier", 1))
+        return quantity * multiplier / price if contract.get("inverse") else quantity * price * multiplier
+
+    def quantity(self, account: str, symbol: str) -> float:
+        slot = self.slots.get((account, symbol))
+        return 0.0 if slot is None else self.qty[slot]
+
+    def exposure(self, account: str) -> float:
+        # Gross value of the account's positions at the marks
+        total = 0.0
+        for slot, (slot_account, symbol) in enumerate(self.keys):
+            if slot_account == account and self.qty[slot]:
+                mark = self.marks.get(symbol) or self.last_price[slot]
+                total += abs(self._value(slot, self.qty[slot], mark))
+        return total
+
+    def query(self, account: Optional[str] = None, symbol: Optional[str] = None) -> List[dict]:
+        positions = []
+        for slot, (slot_account, slot_symbol) in enumerate(self.keys):
+            if (account is not None and slot_account != account) or (symbol is not None and slot_symbol != symbol):
+                continue
+            qty, cost = self.qty[slot], self.cost[slot]
+            mark = self.marks.get(slot_symbol) or self.last_price[slot]
+            value = self._value(slot, qty, mark) if mark else 0.0
+            if not qty:
+                entry = None
+            elif self.inverse[slot]:
+                entry = qty * self.multiplier[slot] / cost
+            else:
+                entry = cost / (qty * self.multiplier[slot])
+            positions.append({
+                "account": slot_account,
+                "symbol": slot_symbol,
+                "currentQty": qty,
+                "avgEntryPrice": entry,
+                "markPrice": mark or None,
+                "realisedPnl": self.realised[slot],
+                "unrealisedPnl": (cost - value if self.inverse[slot] else value - cost) if qty else 0.0,
+                # Signed value of the position at the mark, same currency as the PnL
+                "exposure": value,
+                "commission": self.commission[slot],
+                "volume": self.volume[slot],
+            })
+        return positions
+
+
+positions = PositionEngine()
@@ -0,0 +1,65 @@
+import argparse
+import math
+import os
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List
+from urllib.parse import urlsplit
+
+import orjson
+
+from app.api.journal import Record, journal_files, read_all
+from .store import OrderStore, normalize_status
+
+# Calls answered with order rows
+ORDER_PATHS = ("/order", "/order/bulk", "/order/all")
+
+
+def replay(records: Iterable[Record]) -> Dict[str, OrderStore]:
+    # Every order row BitMEX answered with, applied in journal order, one store per account. Nothing is forgotten,
+    # unlike in the live order cache.
+    stores: Dict[str, OrderStore] = {}
+    for record in records:
+        if record.status != 200 or not urlsplit(record.meta["url"]).path.endswith(ORDER_PATHS):
+            continue
+        try:
+            rows = orjson.loads(record.response)
+        except orjson.JSONDecodeError:
+            continue
+        stores.setdefault(record.meta["account"], OrderStore(max_closed=math.inf)).upsert(rows)
+    return stores
+
+
+def expand(paths: List[str]) -> List[str]:
+    # Directories stand for every BitMEX journal in them
+    files = []
+    for path in paths:
+        files.extend(journal_files(path, "bitmex") if os.path.isdir(path) else [path])
+    return files
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.api.bitmex.replay",
+                                     description="Rebuild BitMEX order state from the journal.")
+    parser.add_argument("paths", nargs="+", help="Journal files or directories (JOURNAL_DIR).")
+    parser.add_argument("--account", help="Only this account.")
+    parser.add_argument("--orders", action="store_true", help="Print every order as NDJSON instead of a summary.")
+    args = parser.parse_args(argv)
+
+    stores = replay(read_all(expand(args.paths)))
+    for account, store in sorted(stores.items()):
+        if args.account and account != args.account:
+            continue
+        if args.orders:
+            for order in store.orders.values():
+                sys.stdout.buffer.write(orjson.dumps({"account": account, **order}) + b"\n")
+            continue
+        statuses = Counter(normalize_status(order["ordStatus"]) for order in store.orders.values()
+                           if order.get("ordStatus"))
+        summary = {"account": account, "orders": len(store.orders), "working": len(store.working),
+                   "statuses": dict(statuses), "last_timestamp": store.last_timestamp}
+        sys.stdout.buffer.write(orjson.dumps(summary) + b"\n")
+
+
+if __name__ == "__main__":
+    main()
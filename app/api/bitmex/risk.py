@@ -0,0 +1,135 @@
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from app.api.metrics import registry
+from app.settings import BITMEX_RISK_LIMITS
+from .adapter import DEFAULT_ACCOUNT
+from .orderbook import OrderBooks, order_books
+from .positions import PositionEngine, positions
+from .schemas import AmendRequest, OrderRequest
+from .store import OrderStore, order_store
+from .stream import stream
+
+risk_rejections = registry.counter(
+    "gateway_risk_rejections_total", "Orders rejected by the pre-trade risk checks.", ("account", "check")
+)
+
+
+class RiskRejection(HTTPException):
+    # Raised before anything is sent, the same order may pass once positions or limits change
+    pass
+
+
+class RiskChecks:
+    def __init__(self, limits: Dict[str, dict] = None, positions: PositionEngine = positions,
+                 order_store: OrderStore = order_store, order_books: OrderBooks = order_books):
+        limits = BITMEX_RISK_LIMITS if limits is None else limits
+        self.symbols: Dict[str, dict] = limits.get("symbols", {})
+        self.accounts: Dict[str, dict] = limits.get("accounts", {})
+        self.positions = positions
+        self.order_store = order_store
+        self.order_books = order_books
+
+    def reference_price(self, symbol: str) -> Optional[float]:
+        # Mark or quote mid from the stream, the mirrored L2 book's mid otherwise
+        mark = self.positions.marks.get(symbol)
+        if mark:
+            return mark
+        book = self.order_books.get(symbol)
+        if book is not None and book.synced:
+            bid, ask = book.bids.best(), book.asks.best()
+            if bid and ask:
+                return (bid + ask) / 2
+        return None
+
+    def check(self, order: OrderRequest, account: str):
+        symbol_limits = self.symbols.get(order.symbol) or self.symbols.get("*")
+        account_limits = self.accounts.get(account) or self.accounts.get("*")
+        if not symbol_limits and not account_limits:
+            return
+
+        # A negative quantity sells on BitMEX whatever the side says
+        quantity = abs(order.orderQty or 0)
+        signed = -quantity if order.side == "Sell" or (order.orderQty or 0) < 0 else quantity
+        self._check_order(account, order.symbol, quantity, order.price, symbol_limits or {})
+
+        # Open orders are only known locally for the default account, and only while the store is in sync
+        counted = account == DEFAULT_ACCOUNT and self.order_store.is_fresh()
+        if symbol_limits and symbol_limits.get("max_open_orders") is not None and counted:
+            if len(self.order_store.working_by_symbol.get(order.symbol, ())) >= symbol_limits["max_open_orders"]:
+                self._reject(account, "max_open_orders",
+                             f"{order.symbol} already has {symbol_limits['max_open_orders']} open orders.")
+
+        if not account_limits:
+            return
+        if account_limits.get("max_open_orders") is not None and counted:
+            if len(self.order_store.working) >= account_limits["max_open_orders"]:
+                self._reject(account, "max_open_orders",
+                             f"Account '{account}' already has {account_limits['max_open_orders']} open orders.")
+
+        # Orders reducing the position always pass, the others may not take the gross exposure over the limit
+        limit = account_limits.get("max_exposure")
+        price = order.price or self.reference_price(order.symbol)
+        if limit is not None and not price:
+            self._reject(account, "no_price", f"No price or reference price for {order.symbol} to value the order at.")
+        if limit is not None:
+            current = self.positions.quantity(account, order.symbol)
+            added = (abs(self.positions.notional(order.symbol, current + signed, price))
+                     - abs(self.positions.notional(order.symbol, current, price)))
+            if added > 0 and self.positions.exposure(account) + added > limit:
+                self._reject(account, "max_exposure",
+                             f"Order would take the exposure of account '{account}' over {limit}.")
+
+    def check_amend(self, request: AmendRequest, account: str):
+        # The symbol comes from the order store, amends of orders it does not know are left to the exchange
+        if account != DEFAULT_ACCOUNT or (request.orderQty is None and request.price is None):
+            return
+        order = self.order_store.get(request.orderID)
+        if order is None or not order.get("symbol"):
+            return
+        symbol_limits = self.symbols.get(order["symbol"]) or self.symbols.get("*")
+        if symbol_limits:
+            quantity = request.orderQty if request.orderQty is not None else order.get("orderQty") or 0
+            self._check_order(account, order["symbol"], abs(quantity), request.price or order.get("price"),
+                              symbol_limits)
+
+    def _check_order(self, account: str, symbol: str, quantity: float, price: Optional[float], limits: dict):
+        if limits.get("max_qty") is not None and quantity > limits["max_qty"]:
+            self._reject(account, "max_qty", f"Order quantity {quantity} exceeds the limit of {limits['max_qty']} "
+                                             f"for {symbol}.")
+
+        # Limits needing a price fail closed when there is none to check against
+        reference = self.reference_price(symbol)
+        if limits.get("price_band") is not None and price and not reference:
+            self._reject(account, "no_price", f"No reference price for {symbol} to check the price band against.")
+        if limits.get("price_band") is not None and price:
+            if abs(price / reference - 1) > limits["price_band"]:
+                self._reject(account, "price_band", f"Price {price} is more than {limits['price_band']:.2%} away "
+                                                    f"from the reference price {reference} of {symbol}.")
+
+        # Market orders are valued at the reference price
+        value_price = price or reference
+        if limits.get("max_notional") is not None:
+            if not value_price:
+                self._reject(account, "no_price", f"No price or reference price for {symbol} to value the order at.")
+            if abs(self.positions.notional(symbol, quantity, value_price)) > limits["max_notional"]:
+                self._reject(account, "max_notional", f"Order value exceeds the limit of {limits['max_notional']} "
+                                                      f"for {symbol}.")
+
+    @staticmethod
+    def _reject(account: str, check: str, message: str):
+        risk_rejections.inc(account, check)
+        raise RiskRejection(status_code=400, detail=message)
+
+
+risk = RiskChecks()
+
+
+def subscribe_marks():
+    # Marks of every symbol with limits come from the instrument table, the risk checks have nothing to price with
+    # otherwise
+    for symbol in BITMEX_RISK_LIMITS.get("symbols", {}):
+        topic = "instrument:" + symbol
+        if symbol != "*" and topic not in stream.tables_to_subscribe:
+            stream.tables_to_subscribe.append(topic)
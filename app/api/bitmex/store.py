@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from app.settings import (
+    BITMEX_ORDER_CACHE_MAX_AGE,
+    BITMEX_ORDER_CACHE_MAX_CLOSED,
+    BITMEX_ORDER_CACHE_RECONCILE_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Upper bound of rows BitMEX returns for a single GET /order
+RECONCILE_PAGE_SIZE = 500
+
+# Final order states, normalized
+CLOSED_STATUSES = ("filled", "canceled", "rejected", "expired")
+
+
+def normalize_status(status: str) -> str:
+    # OrderState uses 'PARTIALLY FILLED' while BitMEX reports 'PartiallyFilled'
+    return getattr(status, "value", status).replace(" ", "").lower()
+
+
+class OrderStore:
+    def __init__(self, max_age: float = None, max_closed: float = None):
+        self.max_age = BITMEX_ORDER_CACHE_MAX_AGE if max_age is None else max_age
+        # math.inf keeps every closed order, e.g. to rebuild the full history
+        self.max_closed = BITMEX_ORDER_CACHE_MAX_CLOSED if max_closed is None else max_closed
+
+        self.orders: Dict[str, dict] = {}
+        self.by_clordid: Dict[str, str] = {}
+        self.by_symbol: Dict[str, Set[str]] = {}
+        self.by_status: Dict[str, Set[str]] = {}
+        self.working: Set[str] = set()
+        self.working_by_symbol: Dict[str, Set[str]] = {}
+        # Closed orders in the order they closed, the oldest are forgotten beyond max_closed
+        self.closed: "OrderedDict[str, None]" = OrderedDict()
+
+        # Monotonic time of the last successful reconciliation, None until the first one
+        self.synced_at: Optional[float] = None
+        self.last_timestamp: Optional[str] = None
+        # Newest timestamp fetched by a reconciliation, rows written through from responses or the stream do not
+        # move it, or an older change made elsewhere would fall before the next startTime
+        self.reconciled_timestamp: Optional[str] = None
+        # Called with the rows of every completed reconciliation
+        self.listeners: List[Callable[[List[dict]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= self.max_age
+
+    def upsert(self, rows: Union[dict, Iterable[dict]]):
+        if isinstance(rows, dict):
+            rows = [rows]
+
+        for row in rows:
+            # Ignore anything that is not an order row (e.g. error payloads)
+            if not isinstance(row, dict) or not row.get("orderID"):
+                continue
+
+            order_id = row["orderID"]
+            previous = self.orders.get(order_id)
+            if previous is not None:
+                self._unindex(previous)
+                order = {**previous, **row}
+            else:
+                order = dict(row)
+
+            self.orders[order_id] = order
+            self._index(order)
+            if normalize_status(order.get("ordStatus") or "") in CLOSED_STATUSES:
+                self.closed[order_id] = None
+                self.closed.move_to_end(order_id)
+            else:
+                self.closed.pop(order_id, None)
+
+            timestamp = order.get("timestamp")
+            if timestamp and (self.last_timestamp is None or timestamp > self.last_timestamp):
+                self.last_timestamp = timestamp
+
+        while len(self.closed) > self.max_closed:
+            self.remove(next(iter(self.closed)))
+
+    def remove(self, order_id: str):
+        order = self.orders.pop(order_id, None)
+        self.closed.pop(order_id, None)
+        if order is not None:
+            self._unindex(order)
+
+    def get(self, order_id: str) -> Optional[dict]:
+        return self.orders.get(order_id)
+
+    def get_by_clordid(self, clordid: str) -> Optional[dict]:
+        order_id = self.by_clordid.get(clordid)
+        return self.orders.get(order_id) if order_id else None
+
+    def can_serve(self, order_ids: Optional[List[str]] = None, active: bool = False) -> bool:
+        if not self.is_fresh():
+            return False
+
+        # Specific orders can be served if all of them are known
+        if order_ids:
+            return all(order_id in self.orders for order_id in order_ids)
+
+        # Every working order is loaded on the first sync, history before that is not
+        return active
+
+    def query(
+            self,
+            order_ids: Optional[List[str]] = None,
+            symbol: Optional[str] = None,
+            state: Optional[List[str]] = None,
+            active: bool = False,
+    ) -> List[dict]:
+        # Start from the smallest candidate set provided by the indexes
+        candidates = None
+        if order_ids:
+            candidates = [order_id for order_id in order_ids if order_id in self.orders]
+        if symbol is not None:
+            candidates = self._intersect(candidates, self.by_symbol.get(symbol, set()))
+        if state:
+            matching = set()
+            for status in state:
+                matching |= self.by_status.get(normalize_status(status), set())
+            candidates = self._intersect(candidates, matching)
+        if active:
+            candidates = self._intersect(candidates, self.working)
+        if candidates is None:
+            candidates = self.orders.keys()
+
+        return [self.orders[order_id] for order_id in candidates]
+
+    def apply_stream_event(self, event: dict):
+        # Keep the store live from the order table of the WebSocket feed
+        if event.get("table") != "order":
+            return
+        if event.get("action") == "delete":
+            for row in event.get("data", []):
+                self.remove(row.get("orderID"))
+        else:
+            self.upsert(event.get("data", []))
+
+    async def reconcile(self, fetch: Callable[[dict], Awaitable[List[dict]]]):
+        # First sync loads every open order, later ones only what changed since the newest timestamp seen
+        params = {"count": RECONCILE_PAGE_SIZE}
+        if self.synced_at is None or self.reconciled_timestamp is None:
+            params["filter"] = '{"open":true}'
+        else:
+            params["startTime"] = self.reconciled_timestamp
+
+        # Walk the pages until a short one marks the end of the range
+        reconciled = []
+        while True:
+            rows = await fetch({**params, "start": len(reconciled)})
+            self.upsert(rows)
+            reconciled.extend(rows)
+            if len(rows) < RECONCILE_PAGE_SIZE:
+                break
+
+        for row in reconciled:
+            timestamp = row.get("timestamp") if isinstance(row, dict) else None
+            if timestamp and (self.reconciled_timestamp is None or timestamp > self.reconciled_timestamp):
+                self.reconciled_timestamp = timestamp
+        self.synced_at = time.monotonic()
+        for listener in self.listeners:
+            listener(reconciled)
+
+    def snapshot(self) -> Optional[dict]:
+        # Everything known and how long ago it was reconciled, None before the first sync
+        if self.synced_at is None:
+            return None
+        return {"rows": list(self.orders.values()), "age": time.monotonic() - self.synced_at}
+
+    def apply_sync(self, sync: dict):
+        # Reconciled by another process (the cluster leader), as fresh as it was there
+        self.upsert(sync["rows"])
+        self.synced_at = time.monotonic() - sync.get("age", 0)
+
+    def start(self, fetch: Callable[[dict], Awaitable[List[dict]]], interval: float = None):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(fetch, interval or BITMEX_ORDER_CACHE_RECONCILE_INTERVAL))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, fetch, interval: float):
+        while True:
+            try:
+                await self.reconcile(fetch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Order store reconciliation failed: %s", e)
+            await asyncio.sleep(interval)
+
+    def _index(self, order: dict):
+        order_id = order["orderID"]
+        if order.get("clOrdID"):
+            self.by_clordid[order["clOrdID"]] = order_id
+        if order.get("symbol"):
+            self.by_symbol.setdefault(order["symbol"], set()).add(order_id)
+        if order.get("ordStatus"):
+            self.by_status.setdefault(normalize_status(order["ordStatus"]), set()).add(order_id)
+        if order.get("workingIndicator"):
+            self.working.add(order_id)
+            if order.get("symbol"):
+                self.working_by_symbol.setdefault(order["symbol"], set()).add(order_id)
+
+    def _unindex(self, order: dict):
+        order_id = order["orderID"]
+        if order.get("clOrdID"):
+            self.by_clordid.pop(order["clOrdID"], None)
+        if order.get("symbol"):
+            self.by_symbol.get(order["symbol"], set()).discard(order_id)
+        if order.get("ordStatus"):
+            self.by_status.get(normalize_status(order["ordStatus"]), set()).discard(order_id)
+        self.working.discard(order_id)
+        if order.get("symbol"):
+            self.working_by_symbol.get(order["symbol"], set()).discard(order_id)
+
+    @staticmethod
+    def _intersect(candidates, ids: Set[str]):
+        if candidates is None:
+            return list(ids)
+        return [order_id for order_id in candidates if order_id in ids]
+
+
+order_store = OrderStore()
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from websockets.asyncio.client import connect
+
+from app.settings import (
+    BITMEX_API_KEY,
+    BITMEX_SECRET_KEY,
+    BITMEX_STREAM_MAX_ROWS,
+    BITMEX_STREAM_QUEUE_SIZE,
+    BITMEX_STREAM_TABLES,
+    BITMEX_WS_URL,
+)
+from .auth import generate_signature
+
+logger = logging.getLogger(__name__)
+
+# Tables kept in memory by the stream itself, others (e.g. orderBookL2) are only passed on to listeners
+STORED_TABLES = ("order", "execution", "quote")
+
+# Tables sent to /bitmex/stream consumers that do not ask for specific ones
+CONSUMER_TABLES = ("order", "execution")
+
+# Default keys for tables in case the partial message does not carry them
+DEFAULT_KEYS = {
+    "order": ["orderID"],
+    "execution": ["execID"],
+    "quote": ["symbol"],
+}
+
+
+class BitmexStream:
+    def __init__(self, url=None, api_key=None, secret=None, tables=None, max_rows=None, queue_size=None):
+        self.url = url or BITMEX_WS_URL
+        self.api_key = api_key or BITMEX_API_KEY
+        self.secret = secret or BITMEX_SECRET_KEY
+        # Copied, features add their topics (e.g. quote:XBTUSD) to it
+        self.tables_to_subscribe = list(tables or BITMEX_STREAM_TABLES)
+        self.max_rows = max_rows or BITMEX_STREAM_MAX_ROWS
+        self.queue_size = queue_size or BITMEX_STREAM_QUEUE_SIZE
+
+        # table name -> rows keyed by the tuple of the table's key columns, oldest first
+        self.tables: Dict[str, OrderedDict] = {}
+        self.keys: Dict[str, List[str]] = {}
+        # Consumer queue -> tables it receives, None for all of them
+        self.subscribers: Dict[asyncio.Queue, Optional[FrozenSet[str]]] = {}
+        self.listeners: List[Callable[[dict], None]] = []
+        # Raw messages as received, e.g. relayed to cluster workers that rebuild the same state from them
+        self.relays: List[Callable[[dict], None]] = []
+        self.connected = False
+        self._websocket = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def subscribe(self, tables: Optional[Iterable[str]] = None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[queue] = frozenset(tables) if tables is not None else None
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+
+    def snapshot(self, table: str) -> List[dict]:
+        return list(self.tables.get(table, {}).values())
+
+    def resubscribe(self, topic: str):
+        # Unsubscribing and subscribing again makes BitMEX send a fresh partial for the topic
+        if self._websocket is not None:
+            asyncio.create_task(self._resubscribe(topic))
+
+    async def _resubscribe(self, topic: str):
+        try:
+            await self._websocket.send(json.dumps({"op": "unsubscribe", "args": [topic]}))
+            await self._websocket.send(json.dumps({"op": "subscribe", "args": [topic]}))
+        except Exception as e:
+            logger.warning("BitMEX stream resubscribe to %s failed: %s", topic, e)
+
+    def auth_message(self) -> dict:
+        # Same signature scheme as the REST API, signed over 'GET/realtime'
+        expires = int(round(time.time()) + 5)
+        signature = generate_signature(self.secret, verb="GET", url="/realtime", nonce=expires)
+        return {"op": "authKeyExpires", "args": [self.api_key, expires, signature]}
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                async with connect(self.url) as websocket:
+                    await websocket.send(json.dumps(self.auth_message()))
+                    await websocket.send(json.dumps({"op": "subscribe", "args": self.tables_to_subscribe}))
+                    self.connected = True
+                    self._websocket = websocket
+                    delay = 1
+                    async for message in websocket:
+                        self.handle_message(json.loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("BitMEX stream disconnected: %s", e)
+            finally:
+                self.connected = False
+                self._websocket = None
+
+            # Reconnect with exponential backoff, the next partial message rebuilds the tables
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def partials(self) -> List[dict]:
+        # The stored tables as partial messages, a late consumer starts from the same state
+        return [
+            {"table": table, "action": "partial", "keys": self.keys[table], "data": list(rows.values())}
+            for table, rows in self.tables.items()
+        ]
+
+    def handle_message(self, message: dict):
+        for relay in self.relays:
+            relay(message)
+
+        table = message.get("table")
+        action = message.get("action")
+        if not table or not action:
+            if "error" in message:
+                logger.error("BitMEX stream error: %s", message["error"])
+            return
+
+        data = message.get("data", [])
+        if table not in STORED_TABLES:
+            # Book diffs and the like only feed in-process mirrors, they would crowd orders out of consumer queues
+            self._notify({"table": table, "action": action, "data": data})
+            return
+
+        if action == "partial":
+            self.keys[table] = message.get("keys") or DEFAULT_KEYS.get(table, [])
+            self.tables[table] = OrderedDict()
+            self._insert(table, data)
+        elif table not in self.tables:
+            # Updates received before the partial cannot be applied
+            return
+        elif action == "insert":
+            self._insert(table, data)
+        elif action == "update":
+            rows = self.tables[table]
+            for row in data:
+                key = self._key(table, row)
+                if key in rows:
+                    rows[key].update(row)
+        elif action == "delete":
+            rows = self.tables[table]
+            for row in data:
+                rows.pop(self._key(table, row), None)
+
+        self._publish({"table": table, "action": action, "data": data})
+
+    def _key(self, table: str, row: dict) -> tuple:
+        return tuple(row.get(key) for key in self.keys[table])
+
+    def _insert(self, table: str, data: List[dict]):
+        rows = self.tables[table]
+        for row in data:
+            rows[self._key(table, row)] = dict(row)
+
+        # Keep the tables bounded, dropping the oldest rows first
+        while len(rows) > self.max_rows:
+            rows.popitem(last=False)
+
+    def _notify(self, event: dict):
+        # In-process listeners (e.g. the order store) are applied synchronously
+        for listener in self.listeners:
+            listener(event)
+
+    def _publish(self, event: dict):
+        self._notify(event)
+        for queue, tables in self.subscribers.items():
+            if tables is not None and event["table"] not in tables:
+                continue
+            # Slow consumers lose their oldest pending event instead of blocking the feed
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+stream = BitmexStream()
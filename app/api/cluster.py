@@ -0,0 +1,320 @@
+import asyncio
+import fcntl
+import itertools
+import logging
+import os
+import struct
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+import orjson
+from fastapi import HTTPException
+
+from app.api.metrics import record_stage, registry
+from app.api.ratelimit import Priority
+from app.settings import CLUSTER_MAX_BACKLOG, CLUSTER_RECONNECT_INTERVAL, CLUSTER_REQUEST_TIMEOUT, CLUSTER_SOCKET
+
+logger = logging.getLogger(__name__)
+
+SINGLE, LEADER, WORKER = "single", "leader", "worker"
+
+# Every frame is the header and body lengths, the orjson encoded header, then the raw body bytes
+FRAME = struct.Struct(">II")
+
+# Transfer headers do not apply to a body that was already decoded by the leader
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+forward_seconds = registry.histogram(
+    "gateway_cluster_forward_seconds", "Round trip of upstream calls forwarded to the cluster leader.",
+    ("op", "status")
+)
+published_events = registry.counter(
+    "gateway_cluster_events_total", "Events fanned out by the cluster leader to its workers.", ("channel",)
+)
+
+
+def encode(header: dict, body: bytes = b"") -> bytes:
+    head = orjson.dumps(header)
+    return FRAME.pack(len(head), len(body)) + head + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[dict, bytes]:
+    head_size, body_size = FRAME.unpack(await reader.readexactly(FRAME.size))
+    header = orjson.loads(await reader.readexactly(head_size))
+    body = await reader.readexactly(body_size) if body_size else b""
+    return header, body
+
+
+class Cluster:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or CLUSTER_SOCKET
+        self.role = SINGLE
+
+        # Leader side: adapters workers can call through, connected workers and the state a new worker starts from
+        self.adapters: Dict[Tuple[str, str], object] = {}
+        self.workers: Set[asyncio.StreamWriter] = set()
+        self.snapshots: List[Callable[[], List[Tuple[str, dict]]]] = []
+        # Calls beyond plain upstream ones, run with the leader's state (e.g. its clOrdID cache)
+        self.handlers: Dict[str, Callable[[object, dict], Awaitable[httpx.Response]]] = {}
+
+        # Worker side: channel -> callbacks applying the leader's events, calls waiting for the leader's answer
+        self.subscribers: Dict[str, List[Callable[[dict], None]]] = {}
+        self.pending: Dict[int, asyncio.Future] = {}
+
+        self._ids = itertools.count()
+        self._calls: Set[asyncio.Task] = set()
+        self._connected = asyncio.Event()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lock_file = None
+        self._on_leader: Optional[Callable[[], Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_worker(self) -> bool:
+        return self.role == WORKER
+
+    def register(self, adapter):
+        self.adapters[(adapter.name, adapter.account)] = adapter
+
+    def handle(self, op: str, handler: Callable[[object, dict], Awaitable[httpx.Response]]):
+        self.handlers[op] = handler
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        callbacks = self.subscribers.setdefault(channel, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    async def start(self, on_leader: Callable[[], Awaitable[None]]):
+        # on_leader starts whatever talks to the exchanges, run here or once this process takes over
+        self._on_leader = on_leader
+        self._connected = asyncio.Event()
+        if not self.path:
+            await on_leader()
+            return
+
+        if not await self._elect():
+            self.role = WORKER
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._disconnect()
+
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self.workers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+            self.workers.clear()
+
+        # The socket goes before the lock, a successor binds its own
+        if self._lock_file is not None:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._lock_file.close()
+            self._lock_file = None
+        self.role = SINGLE
+
+    def stats(self) -> dict:
+        return {
+            "role": self.role,
+            "pid": os.getpid(),
+            "workers": len(self.workers),
+            "connected": self.role != WORKER or self._connected.is_set(),
+            "pending": len(self.pending),
+        }
+
+    async def _elect(self) -> bool:
+        # Whoever holds the lock leads, the kernel releases it when the process dies
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+
+        # A socket left behind by a dead leader is replaced
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        self.role = LEADER
+        logger.info("Process %s leads the cluster on %s", os.getpid(), self.path)
+
+        await self._on_leader()
+        # Calls that were waiting for a leader now run locally
+        self._connected.set()
+        return True
+
+    # Leader side
+
+    def publish(self, channel: str, message: dict):
+        if not self.workers:
+            return
+
+        # Encoded once for every worker
+        frame = encode({"channel": channel}, orjson.dumps(message))
+        for writer in list(self.workers):
+            # A worker this far behind is cut off, it resyncs from the snapshots when it reconnects
+            if writer.transport.get_write_buffer_size() > CLUSTER_MAX_BACKLOG:
+                logger.warning("Dropping cluster worker with %s bytes of events pending",
+                               writer.transport.get_write_buffer_size())
+                self.workers.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+        published_events.inc(channel)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # A new worker starts from the leader's current state
+            for snapshot in self.snapshots:
+                for channel, message in snapshot():
+                    writer.write(encode({"channel": channel}, orjson.dumps(message)))
+            self.workers.add(writer)
+
+            while True:
+                header, body = await read_frame(reader)
+                task = asyncio.create_task(self._execute(writer, header, body))
+                self._calls.add(task)
+                task.add_done_callback(self._calls.discard)
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            self.workers.discard(writer)
+            writer.close()
+
+    async def _execute(self, writer: asyncio.StreamWriter, header: dict, body: bytes):
+        request_id = header.pop("id")
+        op = header.pop("op")
+        adapter = self.adapters.get((header.pop("venue"), header.pop("account")))
+        try:
+            if adapter is None:
+                raise HTTPException(status_code=404, detail="Unknown adapter.")
+            response = await self.call(adapter, op, {**header, "data": body.decode()})
+            reply = {
+                "id": request_id,
+                "status": response.status_code,
+                "headers": [(k, v) for k, v in response.headers.multi_items() if k not in DROPPED_HEADERS],
+            }
+            content = response.content
+        except HTTPException as e:
+            reply, content = {"id": request_id, "error": {"status_code": e.status_code, "detail": e.detail}}, b""
+        except Exception as e:
+            logger.exception("Cluster call %s failed", op)
+            reply, content = {"id": request_id, "error": {"status_code": 502, "detail": str(e)}}, b""
+
+        if not writer.is_closing():
+            writer.write(encode(reply, content))
+
+    async def call(self, adapter, op: str, call: dict) -> httpx.Response:
+        # 'request' goes through the leader's rate budget, 'send' is an already signed call (e.g. the kill switch)
+        if op == "request":
+            return await adapter.request(call["verb"], call["path"], Priority(call["priority"]), call["params"],
+                                         call["data"])
+        if op == "send":
+            return await adapter.send(call["verb"], call["url"], call["headers"], call["query"], call["data"])
+        if op in self.handlers:
+            return await self.handlers[op](adapter, call)
+        raise HTTPException(status_code=400, detail=f"Unknown cluster call '{op}'.")
+
+    # Worker side
+
+    async def forward(self, adapter, op: str, data: str = "", **call) -> httpx.Response:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            # Calls made while the leader is away wait for a reconnection or a takeover
+            try:
+                await asyncio.wait_for(self._connected.wait(), CLUSTER_REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=503, detail="Cluster leader unavailable.")
+            if self.role == LEADER:
+                response = await self.call(adapter, op, {**call, "data": data})
+                status = response.status_code
+                return response
+
+            request_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self.pending[request_id] = future
+            try:
+                self._writer.write(encode(
+                    {"id": request_id, "op": op, "venue": adapter.name, "account": adapter.account, **call},
+                    data.encode() if data else b"",
+                ))
+                header, body = await asyncio.wait_for(future, CLUSTER_REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail="Cluster leader did not answer in time.")
+            finally:
+                self.pending.pop(request_id, None)
+
+            if "error" in header:
+                status = header["error"]["status_code"]
+                raise HTTPException(status_code=status, detail=header["error"]["detail"])
+            status = header["status"]
+            return httpx.Response(status, headers=header["headers"], content=body)
+        finally:
+            elapsed = time.perf_counter() - started
+            record_stage("upstream", elapsed)
+            forward_seconds.observe(elapsed, op, status)
+
+    async def _run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                reader = writer = None
+
+            if writer is not None:
+                self._writer = writer
+                self._connected.set()
+                try:
+                    await self._receive(reader)
+                except (asyncio.IncompleteReadError, OSError) as e:
+                    logger.warning("Cluster leader connection lost: %s", e)
+                finally:
+                    self._disconnect()
+
+            # The leader may be gone for good, the first worker to get the lock takes over
+            if await self._elect():
+                return
+            await asyncio.sleep(CLUSTER_RECONNECT_INTERVAL)
+
+    async def _receive(self, reader: asyncio.StreamReader):
+        while True:
+            header, body = await read_frame(reader)
+            if "id" in header:
+                future = self.pending.get(header["id"])
+                if future is not None and not future.done():
+                    future.set_result((header, body))
+                continue
+
+            message = orjson.loads(body)
+            for callback in self.subscribers.get(header["channel"], ()):
+                try:
+                    callback(message)
+                except Exception:
+                    logger.exception("Cluster event on %s failed", header["channel"])
+
+    def _disconnect(self):
+        self._connected.clear()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+        # Nothing will answer the calls in flight
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(HTTPException(status_code=503, detail="Cluster leader connection lost."))
+        self.pending.clear()
+
+
+cluster = Cluster()
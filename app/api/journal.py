@@ -0,0 +1,141 @@
+import heapq
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+import orjson
+
+from app.api.metrics import registry
+from app.settings import JOURNAL_DIR, JOURNAL_FSYNC_INTERVAL, JOURNAL_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Every record is its payload length and CRC32, then the payload: unix time, status code, the lengths of the
+# orjson encoded metadata, request body and response body, then those three as they are
+FRAME = struct.Struct("<II")
+RECORD = struct.Struct("<dHIII")
+
+journal_records = registry.counter(
+    "gateway_journal_records_total", "Records handed to the journal by outcome.", ("journal", "result")
+)
+
+
+class Record(NamedTuple):
+    time: float
+    status: int
+    meta: dict
+    request: bytes
+    response: bytes
+
+
+def encode(time_: float, status: int, meta: dict, request: bytes, response: bytes) -> bytes:
+    meta = orjson.dumps(meta)
+    payload = b"".join((RECORD.pack(time_, status, len(meta), len(request), len(response)), meta, request, response))
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read(path: str) -> Iterator[Record]:
+    with open(path, "rb") as file:
+        while True:
+            frame = file.read(FRAME.size)
+            if len(frame) < FRAME.size:
+                return
+            size, checksum = FRAME.unpack(frame)
+            payload = file.read(size)
+            # A record cut short by a crash ends the file
+            if len(payload) < size or zlib.crc32(payload) != checksum:
+                logger.warning("Journal %s ends with a torn record at offset %s", path, file.tell() - len(payload))
+                return
+
+            time_, status, meta_size, request_size, response_size = RECORD.unpack_from(payload)
+            offset = RECORD.size
+            meta = orjson.loads(payload[offset:offset + meta_size])
+            offset += meta_size
+            request = payload[offset:offset + request_size]
+            offset += request_size
+            yield Record(time_, status, meta, request, payload[offset:offset + response_size])
+
+
+def read_all(paths: Iterable[str]) -> Iterator[Record]:
+    # Files of several processes merged by time, each of them is already in order
+    return heapq.merge(*(read(path) for path in paths), key=lambda record: record.time)
+
+
+def journal_files(directory: str, name: str) -> List[str]:
+    return sorted(os.path.join(directory, file) for file in os.listdir(directory)
+                  if file.startswith(name + "-") and file.endswith(".journal"))
+
+
+class Journal:
+    def __init__(self, name: str, directory: Optional[str] = None, queue_size: int = None,
+                 fsync_interval: float = None):
+        self.name = name
+        self.directory = directory if directory is not None else JOURNAL_DIR
+        self.queue_size = queue_size or JOURNAL_QUEUE_SIZE
+        self.fsync_interval = JOURNAL_FSYNC_INTERVAL if fsync_interval is None else fsync_interval
+        self.path: Optional[str] = None
+
+        # Appended on the event loop, drained by the writer thread, both ends are atomic on a deque
+        self._pending: deque = deque()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if not self.directory or self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # One file per process, names sort by start time
+        self.path = os.path.join(self.directory, f"{self.name}-{time.time():.6f}-{os.getpid()}.journal")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"journal-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        # The writer drains what is left before exiting
+        self._running = False
+        self._thread.join()
+        self._thread = None
+
+    def record(self, meta: dict, request: bytes, status: int, response: bytes):
+        # Called on the order path: no encoding and no I/O here
+        if self._thread is None:
+            return
+        if len(self._pending) >= self.queue_size:
+            journal_records.inc(self.name, "dropped")
+            return
+        self._pending.append((time.time(), status, meta, request, response))
+        journal_records.inc(self.name, "queued")
+
+    def _run(self):
+        pending = self._pending
+        synced_at = time.monotonic()
+        dirty = False
+        with open(self.path, "ab") as file:
+            while True:
+                running = self._running
+                if pending:
+                    # Everything queued so far goes out in one write
+                    frames = []
+                    while pending:
+                        frames.append(encode(*pending.popleft()))
+                    file.write(b"".join(frames))
+                    dirty = True
+
+                # fsync is batched: at most once per interval, and once more on the way out
+                if dirty and (not running or time.monotonic() - synced_at >= self.fsync_interval):
+                    file.flush()
+                    os.fsync(file.fileno())
+                    synced_at = time.monotonic()
+                    dirty = False
+
+                if not running:
+                    return
+                if not pending:
+                    time.sleep(min(self.fsync_interval, 0.01) or 0.001)
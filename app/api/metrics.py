@@ -0,0 +1,206 @@
+import bisect
+import contextvars
+import functools
+import logging
+import random
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app.settings import METRICS_SLOW_REQUEST_SAMPLE_RATE, METRICS_SLOW_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, 50us up to 10s
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self.series.items():
+            base = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.series: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for labels, value in self.series.items():
+            lines.append(f"{self.name}{{{_labels(self.labelnames, labels)}}} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.series: Dict[tuple, float] = {}
+
+    def set(self, value: float, *labels):
+        self.series[labels] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.series.items():
+            lines.append(f"{self.name}{{{_labels(self.labelnames, labels)}}} {value}")
+        return lines
+
+
+def _labels(names, values) -> str:
+    return ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, tuple(labelnames), buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, labelnames=()) -> Counter:
+        metric = Counter(name, description, tuple(labelnames))
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, description, labelnames=()) -> Gauge:
+        metric = Gauge(name, description, tuple(labelnames))
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_seconds = registry.histogram(
+    "gateway_request_seconds", "Total time spent handling a request.", ("method", "endpoint", "status")
+)
+stage_seconds = registry.histogram(
+    "gateway_stage_seconds", "Time spent per handling stage of a request.", ("endpoint", "stage")
+)
+upstream_seconds = registry.histogram(
+    "gateway_upstream_seconds", "Round trip time of upstream exchange calls.", ("venue", "method", "status")
+)
+upstream_requests = registry.counter(
+    "gateway_upstream_requests_total", "Upstream exchange calls by response status.", ("venue", "method", "status")
+)
+
+# Per-request trace: {"started": ..., "stages": [(stage, seconds), ...], "handler_done": ...}
+_trace: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    # Time a stage of the current request, a no-op outside of a traced request
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace["stages"].append((name, time.perf_counter() - started))
+
+
+def record_stage(name: str, seconds: float):
+    trace = _trace.get()
+    if trace is not None:
+        trace["stages"].append((name, seconds))
+
+
+def instrument(endpoint):
+    # Marks when validation ended (handler entered) and when the handler returned
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        trace = _trace.get()
+        if trace is not None:
+            trace["stages"].append(("validate", time.perf_counter() - trace["started"]))
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            if trace is not None:
+                trace["handler_done"] = time.perf_counter()
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace = {"started": time.perf_counter(), "stages": [], "handler_done": None}
+        token = _trace.set(trace)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                # Time from the handler returning to the response going out (encoding, response middleware)
+                if trace["handler_done"] is not None:
+                    trace["stages"].append(("respond", time.perf_counter() - trace["handler_done"]))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            elapsed = time.perf_counter() - trace["started"]
+            route = scope.get("route")
+            endpoint = route.path if route is not None else "unmatched"
+
+            request_seconds.observe(elapsed, scope["method"], endpoint, status[0])
+            for name, seconds in trace["stages"]:
+                stage_seconds.observe(seconds, endpoint, name)
+
+            # Sampled log of slow requests with their stage breakdown
+            if elapsed >= METRICS_SLOW_REQUEST_SECONDS and random.random() < METRICS_SLOW_REQUEST_SAMPLE_RATE:
+                breakdown = " ".join(f"{name}={seconds * 1000:.2f}ms" for name, seconds in trace["stages"])
+                logger.warning("Slow request %s %s %s %.2fms %s", scope["method"], endpoint, status[0],
+                               elapsed * 1000, breakdown)
@@ -0,0 +1,139 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+
+class Priority(IntEnum):
+    # Lower value is served first, cancels must get through when the budget is short
+    CANCEL = 0
+    AMEND = 1
+    NEW = 2
+    READ = 3
+
+
+class RateLimitGovernor:
+    def __init__(self, limit: int, burst: int):
+        # 'limit' requests per minute refilled continuously, up to 'burst' requests at once
+        self.rate = limit / 60
+        self.capacity = float(burst)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+        # No call is let through before this monotonic time (set by 429s or an exhausted budget)
+        self.blocked_until = 0.0
+
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump: Optional[asyncio.Task] = None
+
+        self.total_waits = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _try_take(self) -> bool:
+        self._refill()
+        if time.monotonic() >= self.blocked_until and self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, priority: Priority = Priority.READ):
+        # Fast path without queueing when nothing is waiting and the budget allows it
+        if not self._waiters and self._try_take():
+            return
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._ensure_pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The pump skips futures that are already done
+            future.cancel()
+            raise
+
+        waited = time.monotonic() - started
+        self.total_waits += 1
+        self.total_wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+
+    def _ensure_pump(self):
+        # Waiters and the pump task belong to one event loop, start over if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._pump = None
+            self._waiters = [waiter for waiter in self._waiters if waiter[2].get_loop() is loop]
+        self._wakeup.set()
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._waiters:
+            # Drop waiters whose callers went away
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                break
+
+            if self._try_take():
+                _, _, future = heapq.heappop(self._waiters)
+                future.set_result(None)
+                continue
+
+            # Sleep until the next token is due, or until new information arrives
+            delay = max(self.blocked_until - time.monotonic(), (1 - self.tokens) / self.rate, 0.001)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def update(self, remaining: Optional[float] = None, reset_at: Optional[float] = None,
+               rejected: bool = False, retry_after: Optional[float] = None):
+        # Align the local bucket with the budget the exchange reports (reset_at is a unix timestamp)
+        if remaining is not None:
+            self._refill()
+            self.tokens = min(self.tokens, remaining)
+            if remaining < 1 and reset_at is not None:
+                self.block(reset_at - time.time())
+
+        # A rejected call means the exchange budget is spent, hold everything back for a while
+        if rejected:
+            self.tokens = 0
+            self.block(retry_after if retry_after is not None else 1 / self.rate)
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + max(seconds, 0))
+
+    def stats(self) -> Dict:
+        self._refill()
+        depth = {priority.name: 0 for priority in Priority}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[Priority(priority).name] += 1
+
+        return {
+            "tokens": round(self.tokens, 3),
+            "blocked_for": round(max(self.blocked_until - time.monotonic(), 0), 3),
+            "queue_depth": depth,
+            "waits": self.total_waits,
+            "average_wait": self.total_wait_time / self.total_waits if self.total_waits else 0.0,
+            "max_wait": self.max_wait_time,
+        }
+
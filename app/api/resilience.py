@@ -0,0 +1,127 @@
+import asyncio
+import math
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from fastapi import HTTPException
+
+from app.api.metrics import registry
+from app.settings import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_OPEN_SECONDS,
+    UPSTREAM_RETRY_BACKOFF,
+    UPSTREAM_RETRY_MAX_BACKOFF,
+)
+
+# Overloaded (BitMEX answers 503 "system overloaded"), timed out or unreachable: the exchange did not handle the call
+FAILURE_STATUS_CODES = (502, 503, 504)
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+upstream_retries = registry.counter(
+    "gateway_upstream_retries_total", "Idempotent upstream calls sent again after a failure.", ("venue", "status")
+)
+hedged_requests = registry.counter(
+    "gateway_hedged_requests_total", "Second reads sent after the hedging delay and the ones answering first.",
+    ("venue", "result"),
+)
+circuit_state = registry.gauge(
+    "gateway_circuit_state", "Upstream circuit breaker state: 0 closed, 1 half-open, 2 open.", ("venue",)
+)
+circuit_rejections = registry.counter(
+    "gateway_circuit_rejections_total", "Calls failed fast while the venue's circuit was open.", ("venue",)
+)
+
+
+class CircuitBreaker:
+    def __init__(self, venue: str, threshold: int = None, open_seconds: float = None):
+        self.venue = venue
+        self.threshold = threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.open_seconds = CIRCUIT_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        # Monotonic time the next call may go out at while not closed
+        self.retry_at = 0.0
+        circuit_state.set(CLOSED, venue)
+
+    def _set(self, state: int):
+        self.state = state
+        circuit_state.set(state, self.venue)
+
+    def check(self):
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if now < self.retry_at:
+            circuit_rejections.inc(self.venue)
+            wait = self.retry_at - now
+            raise HTTPException(status_code=503, headers={"Retry-After": str(math.ceil(wait))},
+                                detail=f"{self.venue} is overloaded, calls are paused for {wait:.1f}s.")
+        # One probe per window decides whether to close again, a probe that never reports back frees the next window
+        self._set(HALF_OPEN)
+        self.retry_at = now + self.open_seconds
+
+    def success(self):
+        self.failures = 0
+        if self.state != CLOSED:
+            self._set(CLOSED)
+
+    def failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            self._set(OPEN)
+            self.retry_at = time.monotonic() + self.open_seconds
+
+    def stats(self) -> dict:
+        return {
+            "state": ("closed", "half-open", "open")[self.state],
+            "failures": self.failures,
+            "retry_in": max(0.0, self.retry_at - time.monotonic()) if self.state != CLOSED else 0.0,
+        }
+
+
+# One breaker per venue, every account of a venue talks to the same overloaded matching engine
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(venue: str) -> CircuitBreaker:
+    breaker = breakers.get(venue)
+    if breaker is None:
+        breaker = breakers[venue] = CircuitBreaker(venue)
+    return breaker
+
+
+def backoff(attempt: int) -> float:
+    # Full jitter: retries of calls that failed together spread out instead of hitting the exchange in step
+    return random.uniform(0, min(UPSTREAM_RETRY_MAX_BACKOFF, UPSTREAM_RETRY_BACKOFF * 2 ** attempt))
+
+
+async def hedged(call: Callable[[], Awaitable[Any]], delay: float, venue: str) -> Any:
+    # A second identical call goes out when the first is slower than the delay, the first answer wins
+    if delay <= 0:
+        return await call()
+
+    primary = asyncio.ensure_future(call())
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            hedged_requests.inc(venue, "sent")
+            pending.add(asyncio.ensure_future(call()))
+
+        error = None
+        while True:
+            # A failed call leaves the answer to the other one
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        hedged_requests.inc(venue, "won")
+                    return task.result()
+                error = task.exception()
+            if not pending:
+                raise error
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,17 @@
+import orjson
+from starlette.responses import JSONResponse as StarletteJSONResponse, Response
+
+from app.api.metrics import stage
+
+
+class JSONResponse(StarletteJSONResponse):
+    def render(self, content) -> bytes:
+        # Encoding is one of the per-request stages reported in the metrics
+        with stage("encode"):
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class RawJSONResponse(Response):
+    # Upstream JSON bodies forwarded as received, without a decode/encode round trip.
+    # httpx has already undone any content encoding, so only the media type is carried over.
+    media_type = "application/json"
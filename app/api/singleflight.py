@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.api.metrics import registry
+
+coalesced_requests = registry.counter(
+    "gateway_coalesced_requests_total", "Calls that led an upstream request or joined one in flight.",
+    ("group", "result"),
+)
+
+
+class SingleFlight:
+    def __init__(self, group: str):
+        self.group = group
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.joins = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        # Concurrent calls with the same key share the result of the first one
+        future = self.inflight.get(key)
+        if future is not None:
+            self.joins += 1
+            coalesced_requests.inc(self.group, "join")
+            return await asyncio.shield(future)
+
+        self.leaders += 1
+        coalesced_requests.inc(self.group, "leader")
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await call()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody joined is not reported as unhandled
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Only calls arriving while this one is in flight share it, later ones start a new request
+            del self.inflight[key]
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "joins": self.joins, "inflight": len(self.inflight)}
@@ -0,0 +1,175 @@
+import asyncio
+import math
+import time
+from typing import Dict, List
+
+from fastapi import APIRouter, HTTPException
+
+from app.api.binance.main import submit_order as submit_binance_order
+from app.api.binance.schemas import OrderRequest as BinanceOrderRequest
+from app.api.bitmex.main import submit_order as submit_bitmex_order
+from app.api.bitmex.schemas import OrderRequest as BitmexOrderRequest
+from app.api.metrics import instrument, record_stage
+from app.api.responses import JSONResponse
+from app.settings import SOR_FEES, SOR_MAX_QUOTE_AGE, SOR_SYMBOLS
+from .quotes import quote_book
+from .schemas import RoutedOrderRequest
+
+router = APIRouter(
+    tags=["Routing"]
+)
+
+
+async def send_to_bitmex(symbol: str, request: RoutedOrderRequest, quantity: float):
+    order = BitmexOrderRequest(
+        symbol=symbol,
+        side=request.side,
+        orderQty=quantity,
+        price=request.price,
+        ordType="Limit" if request.price is not None else "Market",
+        timeInForce="GoodTillCancel" if request.price is not None else None,
+        text=request.text,
+    )
+    return await submit_bitmex_order(order)
+
+
+async def send_to_binance(symbol: str, request: RoutedOrderRequest, quantity: float):
+    order = BinanceOrderRequest(
+        symbol=symbol,
+        side=request.side.upper(),
+        type="LIMIT" if request.price is not None else "MARKET",
+        timeInForce="GTC" if request.price is not None else None,
+        quantity=quantity,
+        price=request.price,
+    )
+    return await submit_binance_order(order)
+
+
+VENUES = {
+    "bitmex": send_to_bitmex,
+    "binance": send_to_binance,
+}
+
+# Lot size per venue in venue units, unless the SOR_SYMBOLS listing gives a "step": whole contracts on BitMEX, the
+# finest quantity precision Binance accepts
+STEPS = {
+    "bitmex": 1,
+    "binance": 0.00000001,
+}
+
+
+def round_to_step(quantity: float, step: float) -> float:
+    # Down to whole lots, the tolerance keeps 0.3 / 0.1 from flooring to 2
+    return round(math.floor(quantity / step + 1e-9) * step, 10)
+
+
+def plan_routes(request: RoutedOrderRequest, symbols: Dict[str, dict], fees: Dict[str, float],
+                max_age: float) -> List[dict]:
+    buying = request.side == "Buy"
+
+    # Effective price per venue: touch price adjusted by the venue's taker fee
+    candidates = []
+    for venue, listing in symbols.items():
+        if venue not in VENUES or (request.venues and venue not in request.venues):
+            continue
+        quote = quote_book.get(venue, listing["symbol"], max_age)
+        if quote is None:
+            continue
+
+        factor = listing.get("factor", 1)
+        fee = fees.get(venue, 0)
+        if buying:
+            price, size, effective = quote.ask, quote.ask_size, quote.ask * (1 + fee)
+        else:
+            price, size, effective = quote.bid, quote.bid_size, quote.bid * (1 - fee)
+        if price <= 0:
+            continue
+
+        # A limit price excludes venues that cannot fill at it once their fee is paid
+        if request.price is not None and (effective > request.price if buying else effective < request.price):
+            continue
+        step = listing.get("step", STEPS[venue])
+        candidates.append((effective, venue, listing["symbol"], factor, size / factor, price, step))
+
+    candidates.sort(reverse=not buying)
+    if not candidates:
+        return []
+
+    if not request.split:
+        # The best venue whose lot size the order is big enough for
+        for effective, venue, symbol, factor, size, price, step in candidates:
+            quantity = round_to_step(request.orderQty * factor, step)
+            if quantity > 0:
+                return [{"venue": venue, "symbol": symbol, "orderQty": quantity,
+                         "expected_price": price, "effective_price": effective}]
+        return []
+
+    # Walk the venues from best to worst taking what each top of book shows in whole lots, the rest of every child
+    # is carried to the next venue
+    routes = {}
+    remaining = request.orderQty
+    for effective, venue, symbol, factor, size, price, step in candidates:
+        quantity = round_to_step(min(remaining, size) * factor, step)
+        if quantity > 0:
+            routes[venue] = {"venue": venue, "symbol": symbol, "orderQty": quantity,
+                             "expected_price": price, "effective_price": effective}
+            remaining -= quantity / factor
+
+    # What the tops of book do not show goes to the best venues, a rest below every lot size is not routed
+    for effective, venue, symbol, factor, size, price, step in candidates:
+        quantity = round_to_step(remaining * factor, step)
+        if quantity <= 0:
+            continue
+        route = routes.setdefault(venue, {"venue": venue, "symbol": symbol, "orderQty": 0,
+                                          "expected_price": price, "effective_price": effective})
+        route["orderQty"] = round(route["orderQty"] + quantity, 10)
+        remaining -= quantity / factor
+    return [routes[candidate[1]] for candidate in candidates if candidate[1] in routes]
+
+
+async def _dispatch(route: dict, request: RoutedOrderRequest):
+    # A failure on one venue is reported without failing the other legs
+    try:
+        route["order"] = await VENUES[route["venue"]](route["symbol"], request, route["orderQty"])
+        route["status_code"] = 200
+    except HTTPException as e:
+        route["status_code"] = e.status_code
+        route["error"] = e.detail
+    return route
+
+
+@router.post("/orders")
+@instrument
+async def route_order(request: RoutedOrderRequest):
+    symbols = SOR_SYMBOLS.get(request.symbol)
+    if not symbols:
+        raise HTTPException(status_code=400, detail=f"Symbol '{request.symbol}' is not configured for routing.")
+
+    # The decision only reads the local quote cache, no upstream round trip
+    started = time.perf_counter()
+    routes = plan_routes(request, symbols, SOR_FEES, SOR_MAX_QUOTE_AGE)
+    decision_us = (time.perf_counter() - started) * 1e6
+    record_stage("route", decision_us / 1e6)
+    if not routes:
+        raise HTTPException(status_code=503, detail="No venue has a fresh quote within the requested price.")
+
+    routes = await asyncio.gather(*(_dispatch(route, request) for route in routes))
+    failed = sum(1 for route in routes if "error" in route)
+    if failed == len(routes):
+        status_code = routes[0]["status_code"]
+    elif failed:
+        status_code = 207
+    else:
+        status_code = 200
+    return JSONResponse(status_code=status_code, content={"routes": routes, "decision_us": decision_us})
+
+
+@router.get("/quotes")
+async def get_quotes():
+    # Top of book per venue as currently cached for routing
+    now = time.monotonic()
+    return [
+        {"venue": venue, "symbol": symbol, "bid": quote.bid, "bid_size": quote.bid_size,
+         "ask": quote.ask, "ask_size": quote.ask_size, "age": now - quote.received_at}
+        for (venue, symbol), quote in quote_book.quotes.items()
+    ]
@@ -0,0 +1,63 @@
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.api.binance.stream import stream as binance_stream
+from app.api.bitmex.stream import stream as bitmex_stream
+from app.settings import SOR_SYMBOLS
+
+
+class Quote(NamedTuple):
+    bid: float
+    bid_size: float
+    ask: float
+    ask_size: float
+    received_at: float
+
+
+class QuoteBook:
+    def __init__(self):
+        # (venue, venue symbol) -> latest top of book
+        self.quotes: Dict[Tuple[str, str], Quote] = {}
+
+    def update(self, venue: str, symbol: str, bid: float, bid_size: float, ask: float, ask_size: float):
+        self.quotes[(venue, symbol)] = Quote(bid, bid_size, ask, ask_size, time.monotonic())
+
+    def get(self, venue: str, symbol: str, max_age: float) -> Optional[Quote]:
+        # Stale quotes are as good as none for routing
+        quote = self.quotes.get((venue, symbol))
+        if quote is None or time.monotonic() - quote.received_at > max_age:
+            return None
+        return quote
+
+    def apply_bitmex_event(self, event: dict):
+        # 'quote' table rows of the BitMEX stream
+        if event.get("table") != "quote" or event.get("action") == "delete":
+            return
+        for row in event.get("data", []):
+            if row.get("bidPrice") is not None and row.get("askPrice") is not None:
+                self.update("bitmex", row["symbol"], row["bidPrice"], row.get("bidSize") or 0,
+                            row["askPrice"], row.get("askSize") or 0)
+
+    def apply_binance_event(self, data: dict):
+        # '<symbol>@bookTicker' payloads of the Binance stream
+        if "b" in data and "a" in data:
+            self.update("binance", data["s"], float(data["b"]), float(data["B"]), float(data["a"]), float(data["A"]))
+
+
+quote_book = QuoteBook()
+
+
+def subscribe_quotes():
+    # Top of book for every routed symbol comes from the venue streams
+    for symbols in SOR_SYMBOLS.values():
+        if "bitmex" in symbols:
+            table = "quote:" + symbols["bitmex"]["symbol"]
+            if table not in bitmex_stream.tables_to_subscribe:
+                bitmex_stream.tables_to_subscribe.append(table)
+        if "binance" in symbols:
+            binance_stream.add_streams(symbols["binance"]["symbol"].lower() + "@bookTicker")
+
+    if quote_book.apply_bitmex_event not in bitmex_stream.listeners:
+        bitmex_stream.listeners.append(quote_book.apply_bitmex_event)
+    if quote_book.apply_binance_event not in binance_stream.listeners:
+        binance_stream.listeners.append(quote_book.apply_binance_event)
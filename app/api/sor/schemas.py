@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+class RoutedOrderRequest(BaseModel):
+    symbol: str = Field(..., description="Venue-neutral symbol configured in SOR_SYMBOLS (e.g., 'BTC-USD').")
+    side: Literal["Buy", "Sell"] = Field(..., description="Order side. Valid options: Buy, Sell.")
+    orderQty: float = Field(..., gt=0, description="Order quantity in the neutral symbol's units.")
+    price: Optional[float] = Field(
+        None, description="Optional limit price. Venues whose effective price is worse are skipped."
+    )
+    split: bool = Field(
+        False, description="Split the order across venues by top-of-book size instead of routing it to one venue."
+    )
+    venues: Optional[List[str]] = Field(None, description="Optional subset of venues to consider.")
+    text: Optional[str] = Field(None, description="Optional order annotation.")
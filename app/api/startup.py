@@ -0,0 +1,72 @@
+import asyncio
+import importlib
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from fastapi import FastAPI
+
+from app.api.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Venue routers by name: the module holding the router, which pulls in most of the gateway, and the paths it serves
+ROUTERS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "bitmex": ("app.api.bitmex.main", ("/bitmex",)),
+    "binance": ("app.api.binance.main", ("/binance",)),
+    # Smart order routing is mounted at the root
+    "sor": ("app.api.sor.main", ("/orders", "/quotes")),
+}
+
+# Pages describing the whole API need every router
+SCHEMA_PATHS = ("/openapi.json", "/docs", "/redoc")
+
+startup_seconds = registry.gauge(
+    "gateway_startup_seconds", "Time spent starting the gateway by phase.", ("phase",)
+)
+
+
+def include_router(app: FastAPI, name: str, module: str) -> float:
+    started = time.perf_counter()
+    app.include_router(importlib.import_module(module).router)
+    seconds = time.perf_counter() - started
+    startup_seconds.set(seconds, "router:" + name)
+    return seconds
+
+
+class LazyRouters:
+    def __init__(self, app, routers: Dict[str, Tuple[str, Tuple[str, ...]]]):
+        self.app = app
+        self.routers = dict(routers)
+        self.lock = asyncio.Lock()
+
+    def pending(self, path: str) -> List[str]:
+        if path in SCHEMA_PATHS:
+            return list(self.routers)
+        return [name for name, (_, prefixes) in self.routers.items()
+                if any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes)]
+
+    async def load(self, app: FastAPI, names: List[str]):
+        async with self.lock:
+            for name in names:
+                if name not in self.routers:
+                    # Loaded by a request that held the lock before this one
+                    continue
+                module = self.routers[name][0]
+                # Module code runs in a thread, requests for loaded routers keep being served meanwhile
+                started = time.perf_counter()
+                loaded = await asyncio.to_thread(importlib.import_module, module)
+                app.include_router(loaded.router)
+                seconds = time.perf_counter() - started
+                startup_seconds.set(seconds, "router:" + name)
+                del self.routers[name]
+                logger.info("Loaded %s routes from %s in %.1fms", name, module, seconds * 1000)
+            # The cached schema predates the new routes
+            app.openapi_schema = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and self.routers:
+            names = self.pending(scope["path"])
+            if names:
+                await self.load(scope["app"], names)
+        await self.app(scope, receive, send)
@@ -0,0 +1,95 @@
+import importlib
+import importlib.util
+import ssl
+from typing import Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from app.settings import (
+    HTTP2_ENABLED,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_TIMEOUT,
+)
+
+# Single pooled client shared by all upstream calls for the lifetime of the app
+_client: Optional[httpx.AsyncClient] = None
+
+# Named pools for callers that need connections of their own (e.g. one per exchange account)
+_pools: Dict[str, httpx.AsyncClient] = {}
+
+_ssl_context: Optional[ssl.SSLContext] = None
+
+
+def ssl_context() -> ssl.SSLContext:
+    global _ssl_context
+
+    # Loading the CA bundle takes tens of milliseconds, every pool shares the one context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+    return _ssl_context
+
+
+def preload():
+    # What the first client would otherwise load on the event loop: httpcore (and trio when installed) and the CA
+    # bundle. Blocking, meant for a thread.
+    importlib.import_module("httpcore")
+    ssl_context()
+
+
+def create_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+    # HTTP/2 needs the optional 'h2' package, fall back to HTTP/1.1 keep-alive without it
+    http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2, verify=ssl_context())
+
+
+def get_client(pool: Optional[str] = None) -> httpx.AsyncClient:
+    global _client
+
+    if pool is not None:
+        client = _pools.get(pool)
+        if client is None or client.is_closed:
+            client = _pools[pool] = create_client()
+        return client
+
+    # Created lazily so the routers also work when the app lifespan is not run (e.g. bare TestClient)
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+
+async def close_client():
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+    while _pools:
+        _, client = _pools.popitem()
+        await client.aclose()
+
+
+async def request(method: str, url: str, timeout: Optional[float] = None, pool: Optional[str] = None,
+                  **kwargs) -> httpx.Response:
+    # Per-call timeout overrides the pool default when given
+    if timeout is None:
+        timeout = httpx.USE_CLIENT_DEFAULT
+
+    try:
+        return await get_client(pool).request(method, url, timeout=timeout, **kwargs)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="Upstream request timed out.")
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=502, detail=f"Upstream connection failed: {e}")
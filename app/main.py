@@ -1,11 +1,208 @@
+import time
+
+# Everything from here on counts as import time in the startup report
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import httpx
+import orjson
 from fastapi import FastAPI
+from starlette.responses import PlainTextResponse
+
+from app.api import transport
+from app.api.cluster import cluster
+from app.api.metrics import MetricsMiddleware, registry
+from app.api.binance.adapter import adapter as binance_adapter
+from app.api.binance.stream import stream as binance_stream
+from app.api.bitmex.accounts import accounts, reconcile_orders
+from app.api.bitmex.adapter import journal
+from app.api.bitmex.killswitch import get_kill_switch
+from app.api.bitmex.matching import engine as paper_engine
+from app.api.bitmex.orderbook import subscribe_order_books
+from app.api.bitmex.positions import positions
+from app.api.bitmex.risk import subscribe_marks
+from app.api.bitmex.store import order_store
+from app.api.bitmex.stream import stream as bitmex_stream
+from app.api.sor.quotes import subscribe_quotes
+from app.api.startup import ROUTERS, LazyRouters, include_router, startup_seconds
+from app.settings import (
+    BITMEX_API_KEY,
+    BITMEX_BACKEND,
+    BITMEX_DEADMAN_TIMEOUT,
+    BITMEX_ORDER_CACHE_ENABLED,
+    BITMEX_STREAM_ENABLED,
+    LAZY_ROUTERS,
+    validate,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def apply_paper_execution(execution: dict):
+    # Paper fills of resting orders never come back in a response, the engine reports them. It runs in the leader,
+    # workers get the fills relayed.
+    account = paper_engine.account_names[execution["account"]]
+    positions.apply_execution(account, execution)
+    cluster.publish("paper", {**execution, "account": account})
+
+
+def apply_relayed_paper_execution(execution: dict):
+    positions.apply_execution(execution["account"], execution)
+
+
+async def submit_forwarded(adapter, call: dict) -> httpx.Response:
+    # Orders placed through workers, deduplicated by clOrdID here. Imported on use, like the routers when lazy.
+    from app.api.bitmex.main import submit_order
+    from app.api.bitmex.schemas import OrderRequest
+
+    content = await submit_order(OrderRequest.model_validate_json(call["data"]), adapter)
+    return httpx.Response(200, content=orjson.dumps(content))
+
+
+def relay_bitmex(message: dict):
+    cluster.publish("bitmex", message)
+
+
+def relay_binance(message: dict):
+    cluster.publish("binance", message)
+
+
+def relay_orders(rows: list):
+    cluster.publish("orders", {"rows": rows, "age": 0})
+
+
+def cluster_snapshot() -> list:
+    # Order books get fresh partials for every process, stored tables and reconciled orders are sent as they are
+    for topic in bitmex_stream.tables_to_subscribe:
+        if topic.startswith("orderBookL2"):
+            bitmex_stream.resubscribe(topic)
+    messages = [("bitmex", message) for message in bitmex_stream.partials()]
+    orders = order_store.snapshot()
+    if orders is not None:
+        messages.append(("orders", orders))
+    return messages
+
 
-from app.api.bitmex.main import router as bitmex
+async def start_upstream():
+    # Runs in the one process talking to the exchanges: the cluster leader, or every process when standalone
+    binance_stream.start()
 
-app = FastAPI()
-app.include_router(bitmex)
+    # Everything sent to BitMEX is journaled by a background thread, with JOURNAL_DIR set
+    journal.start()
+
+    # One upstream order/execution feed shared by all local stream consumers
+    if BITMEX_STREAM_ENABLED and BITMEX_API_KEY and BITMEX_BACKEND == "live":
+        bitmex_stream.start()
+
+    # Local order cache kept fresh by periodic reconciliation and the order stream
+    if BITMEX_ORDER_CACHE_ENABLED and BITMEX_API_KEY:
+        order_store.start(reconcile_orders)
+
+    # The dead man's switch keeps cancelAllAfter armed per account
+    if BITMEX_API_KEY and BITMEX_DEADMAN_TIMEOUT > 0:
+        for adapter in accounts.adapters.values():
+            get_kill_switch(adapter).start()
+
+    # Workers get the feeds and reconciled orders relayed as they arrive
+    if relay_bitmex not in bitmex_stream.relays:
+        bitmex_stream.relays.append(relay_bitmex)
+    if relay_binance not in binance_stream.relays:
+        binance_stream.relays.append(relay_binance)
+    if relay_orders not in order_store.listeners:
+        order_store.listeners.append(relay_orders)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    errors = validate()
+    if errors:
+        raise RuntimeError("Invalid configuration:\n" + "\n".join(errors))
+
+    # Open the pooled upstream client once and reuse its connections for every request. Cold starts leave it to the
+    # first upstream call, with its dependencies loaded in the background meanwhile.
+    if LAZY_ROUTERS:
+        preloading = asyncio.create_task(asyncio.to_thread(transport.preload))
+    else:
+        transport.get_client()
+
+    # Quotes for smart order routing ride on the venue streams
+    subscribe_quotes()
+
+    # L2 book mirrors for the configured symbols
+    subscribe_order_books()
+
+    # Marks the pre-trade risk checks price orders at
+    subscribe_marks()
+
+    if BITMEX_ORDER_CACHE_ENABLED and BITMEX_API_KEY:
+        if order_store.apply_stream_event not in bitmex_stream.listeners:
+            bitmex_stream.listeners.append(order_store.apply_stream_event)
+
+    # Positions follow the execution stream, or the matching engine when paper trading
+    if positions.apply_stream_event not in bitmex_stream.listeners:
+        bitmex_stream.listeners.append(positions.apply_stream_event)
+    if BITMEX_BACKEND == "paper" and apply_paper_execution not in paper_engine.listeners:
+        paper_engine.listeners.append(apply_paper_execution)
+
+    # Kill switches are pre-signed up front, in workers too since their kill calls skip the leader's queue
+    if BITMEX_API_KEY:
+        for adapter in accounts.adapters.values():
+            get_kill_switch(adapter).presign()
+
+    # With CLUSTER_SOCKET set one process leads, the others forward upstream calls to it and mirror its feeds
+    for adapter in (*accounts.adapters.values(), binance_adapter):
+        cluster.register(adapter)
+    cluster.subscribe("bitmex", bitmex_stream.handle_message)
+    cluster.subscribe("binance", binance_stream.handle_message)
+    cluster.subscribe("orders", order_store.apply_sync)
+    cluster.subscribe("paper", apply_relayed_paper_execution)
+    cluster.handle("submit", submit_forwarded)
+    if cluster_snapshot not in cluster.snapshots:
+        cluster.snapshots.append(cluster_snapshot)
+    await cluster.start(start_upstream)
+    startup_seconds.set(time.perf_counter() - started, "lifespan")
+    logger.info("Ready %.1fms after the first import: %s", (time.perf_counter() - IMPORT_STARTED) * 1000,
+                ", ".join(f"{phase} {seconds * 1000:.1f}ms" for (phase,), seconds in startup_seconds.series.items()))
+    yield
+    if LAZY_ROUTERS:
+        await preloading
+    await cluster.stop()
+    for adapter in accounts.adapters.values():
+        await get_kill_switch(adapter).stop()
+    await order_store.stop()
+    await bitmex_stream.stop()
+    await binance_stream.stop()
+    await transport.close_client()
+    journal.stop()
+
+
+startup_seconds.set(time.perf_counter() - IMPORT_STARTED, "import")
+
+app = FastAPI(lifespan=lifespan)
+if LAZY_ROUTERS:
+    # Cold starts skip the venue routers until a request needs them, their loading time shows in the request metrics
+    app.add_middleware(LazyRouters, routers=ROUTERS)
+else:
+    for name, (module, _) in ROUTERS.items():
+        include_router(app, name, module)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
 async def root():
-    return {"message": "Hello World"}
\ No newline at end of file
+    return {"message": "Hello World"}
+
+
+@app.get("/cluster")
+async def cluster_status():
+    return cluster.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
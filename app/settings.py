@@ -1,11 +1,175 @@
+import json
 import os
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Values that could not be parsed, reported by validate() with every other problem instead of failing the import
+_parse_errors = []
+
+
+def _parse(name: str, default: str, parse, kind: str):
+    value = os.getenv(name, default)
+    try:
+        return parse(value)
+    except ValueError:
+        _parse_errors.append(f"{name} must be {kind}, not '{value}'.")
+        return parse(default)
+
+
+def _int(name: str, default: str) -> int:
+    return _parse(name, default, int, "an integer")
+
+
+def _float(name: str, default: str) -> float:
+    return _parse(name, default, float, "a number")
+
+
+def _json(name: str, default: str) -> dict:
+    value = _parse(name, default, json.loads, "valid JSON")
+    if not isinstance(value, dict):
+        _parse_errors.append(f"{name} must be a JSON object, not '{os.getenv(name)}'.")
+        return json.loads(default)
+    return value
+
+
 BITMEX_API_KEY = os.getenv("BITMEX_API_KEY")
 BITMEX_BASE_URL = os.getenv("BITMEX_BASE_URL")
 BITMEX_SECRET_KEY = os.getenv("BITMEX_SECRET_KEY")
+# Additional accounts as JSON: {"name": {"api_key": "...", "secret_key": "..."}}
+BITMEX_ACCOUNTS = _json("BITMEX_ACCOUNTS", "{}")
+BITMEX_TIMEOUT = _float("BITMEX_TIMEOUT", "10")
+BITMEX_BULK_ORDER_LIMIT = _int("BITMEX_BULK_ORDER_LIMIT", "20")
+BITMEX_PAGE_SIZE = _int("BITMEX_PAGE_SIZE", "500")
+BITMEX_PAGINATION_CONCURRENCY = _int("BITMEX_PAGINATION_CONCURRENCY", "4")
+BITMEX_WS_URL = os.getenv(
+    "BITMEX_WS_URL",
+    (BITMEX_BASE_URL or "").replace("https://", "wss://").replace("/api/v1", "/realtime"),
+)
+BITMEX_STREAM_ENABLED = os.getenv("BITMEX_STREAM_ENABLED", "true").lower() == "true"
+BITMEX_STREAM_TABLES = os.getenv("BITMEX_STREAM_TABLES", "order,execution").split(",")
+BITMEX_STREAM_MAX_ROWS = _int("BITMEX_STREAM_MAX_ROWS", "10000")
+BITMEX_STREAM_QUEUE_SIZE = _int("BITMEX_STREAM_QUEUE_SIZE", "1000")
+BITMEX_ORDERBOOK_SYMBOLS = [symbol for symbol in os.getenv("BITMEX_ORDERBOOK_SYMBOLS", "").split(",") if symbol]
+BITMEX_ORDERBOOK_QUEUE_SIZE = _int("BITMEX_ORDERBOOK_QUEUE_SIZE", "1000")
+BITMEX_ORDER_CACHE_ENABLED = os.getenv("BITMEX_ORDER_CACHE_ENABLED", "true").lower() == "true"
+BITMEX_ORDER_CACHE_MAX_AGE = _float("BITMEX_ORDER_CACHE_MAX_AGE", "5")
+BITMEX_ORDER_CACHE_RECONCILE_INTERVAL = _float("BITMEX_ORDER_CACHE_RECONCILE_INTERVAL", "1")
+# Filled, canceled and rejected orders kept in the order cache, the oldest closed ones are forgotten beyond it
+BITMEX_ORDER_CACHE_MAX_CLOSED = _int("BITMEX_ORDER_CACHE_MAX_CLOSED", "100000")
+BITMEX_RATE_LIMIT = _int("BITMEX_RATE_LIMIT", "120")
+BITMEX_RATE_LIMIT_BURST = _int("BITMEX_RATE_LIMIT_BURST", "120")
+BITMEX_RATE_LIMIT_RETRIES = _int("BITMEX_RATE_LIMIT_RETRIES", "2")
+BITMEX_IDEMPOTENCY_TTL = _float("BITMEX_IDEMPOTENCY_TTL", "300")
+BITMEX_IDEMPOTENCY_MAX_SIZE = _int("BITMEX_IDEMPOTENCY_MAX_SIZE", "100000")
+# cancelAllAfter timeout in seconds kept armed by the heartbeat, 0 disables the dead man's switch
+BITMEX_DEADMAN_TIMEOUT = _float("BITMEX_DEADMAN_TIMEOUT", "0")
+BITMEX_DEADMAN_INTERVAL = _float("BITMEX_DEADMAN_INTERVAL", "15")
+BITMEX_KILL_SIGNATURE_TTL = _float("BITMEX_KILL_SIGNATURE_TTL", "30")
+BITMEX_KILL_SIGNATURE_MARGIN = _float("BITMEX_KILL_SIGNATURE_MARGIN", "5")
+# 'live' talks to BITMEX_BASE_URL, 'paper' to the in-process matching engine
+BITMEX_BACKEND = os.getenv("BITMEX_BACKEND", "live")
+BITMEX_PAPER_MAX_CLOSED_ORDERS = _int("BITMEX_PAPER_MAX_CLOSED_ORDERS", "100000")
+BITMEX_PAPER_RATE_LIMIT = _int("BITMEX_PAPER_RATE_LIMIT", "6000000")
+BITMEX_PAPER_RATE_LIMIT_BURST = _int("BITMEX_PAPER_RATE_LIMIT_BURST", "100000")
+BITMEX_HISTORY_PAGE_SIZE = _int("BITMEX_HISTORY_PAGE_SIZE", "1000")
+# Root of the memory-mapped trade and bucket columns, one directory per symbol
+HISTORY_DIR = os.getenv("HISTORY_DIR", "data/history")
+# Contract specs used for PnL: inverse contracts (e.g. XBTUSD) settle in the base coin, others are linear
+BITMEX_CONTRACTS = _json("BITMEX_CONTRACTS", '{"XBTUSD": {"inverse": true, "multiplier": 1}}')
+# Orders whose applied fills are remembered, so the same fill reported twice is counted once
+BITMEX_POSITION_MAX_ORDERS = _int("BITMEX_POSITION_MAX_ORDERS", "100000")
+# Pre-trade limits checked locally before an order goes out, empty disables them, e.g.
+# {"symbols": {"XBTUSD": {"max_qty": 100000, "max_notional": 5, "price_band": 0.05, "max_open_orders": 50}},
+#  "accounts": {"default": {"max_exposure": 20, "max_open_orders": 200}}}
+# "*" holds the limits of symbols or accounts without limits of their own
+BITMEX_RISK_LIMITS = _json("BITMEX_RISK_LIMITS", "{}")
 BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
-BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL")
\ No newline at end of file
+BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL")
+BINANCE_SECRET_KEY = os.getenv("BINANCE_SECRET_KEY")
+BINANCE_TIMEOUT = _float("BINANCE_TIMEOUT", "10")
+BINANCE_RECV_WINDOW = _int("BINANCE_RECV_WINDOW", "5000")
+BINANCE_RATE_LIMIT = _int("BINANCE_RATE_LIMIT", "1200")
+BINANCE_RATE_LIMIT_BURST = _int("BINANCE_RATE_LIMIT_BURST", "100")
+BINANCE_RATE_LIMIT_RETRIES = _int("BINANCE_RATE_LIMIT_RETRIES", "2")
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+
+# Smart order routing: venue-neutral symbol -> venue -> venue symbol (and optional quantity factor and lot size "step")
+# e.g. {"BTC-USD": {"bitmex": {"symbol": "XBTUSD"}, "binance": {"symbol": "BTCUSDT"}}}
+SOR_SYMBOLS = _json("SOR_SYMBOLS", "{}")
+SOR_FEES = _json("SOR_FEES", '{"bitmex": 0.00075, "binance": 0.001}')
+SOR_MAX_QUOTE_AGE = _float("SOR_MAX_QUOTE_AGE", "2")
+
+# Multi-worker mode: processes sharing this Unix socket elect one leader that owns upstream connections,
+# rate budgets and streams, the others forward to it. Unset, every process runs standalone.
+CLUSTER_SOCKET = os.getenv("CLUSTER_SOCKET")
+CLUSTER_REQUEST_TIMEOUT = _float("CLUSTER_REQUEST_TIMEOUT", "30")
+CLUSTER_RECONNECT_INTERVAL = _float("CLUSTER_RECONNECT_INTERVAL", "1")
+# Bytes of events a worker may fall behind by before the leader drops it, it resyncs on reconnect
+CLUSTER_MAX_BACKLOG = _int("CLUSTER_MAX_BACKLOG", str(16 * 1024 * 1024))
+
+# Binary journal of every call to BitMEX and its answer, one file per process in this directory. Unset disables it.
+JOURNAL_DIR = os.getenv("JOURNAL_DIR")
+# Records waiting for the writer thread beyond this are dropped instead of slowing the order path
+JOURNAL_QUEUE_SIZE = _int("JOURNAL_QUEUE_SIZE", "1000000")
+JOURNAL_FSYNC_INTERVAL = _float("JOURNAL_FSYNC_INTERVAL", "0.1")
+
+# Idempotent upstream calls (reads, cancels of given orders) failing with 502/503/504 or a timeout are sent again up
+# to UPSTREAM_RETRIES times, each after a random delay of up to UPSTREAM_RETRY_BACKOFF * 2^attempt seconds (capped)
+UPSTREAM_RETRIES = _int("UPSTREAM_RETRIES", "2")
+UPSTREAM_RETRY_BACKOFF = _float("UPSTREAM_RETRY_BACKOFF", "0.1")
+UPSTREAM_RETRY_MAX_BACKOFF = _float("UPSTREAM_RETRY_MAX_BACKOFF", "2")
+# After this many failures in a row calls to a venue fail fast for CIRCUIT_OPEN_SECONDS, then one call probes it
+CIRCUIT_FAILURE_THRESHOLD = _int("CIRCUIT_FAILURE_THRESHOLD", "5")
+CIRCUIT_OPEN_SECONDS = _float("CIRCUIT_OPEN_SECONDS", "5")
+# Order queries not answered after this many seconds are sent a second time, the first answer wins. Hedges spend
+# rate budget like any other read. 0 disables it.
+BITMEX_HEDGE_AFTER = _float("BITMEX_HEDGE_AFTER", "0")
+
+# Upstream HTTP connection pool shared by every venue router
+HTTP_MAX_CONNECTIONS = _int("HTTP_MAX_CONNECTIONS", "100")
+HTTP_MAX_KEEPALIVE_CONNECTIONS = _int("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+HTTP_KEEPALIVE_EXPIRY = _float("HTTP_KEEPALIVE_EXPIRY", "30")
+HTTP_CONNECT_TIMEOUT = _float("HTTP_CONNECT_TIMEOUT", "5")
+HTTP_TIMEOUT = _float("HTTP_TIMEOUT", "10")
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# Slow requests are logged with their stage breakdown, sampled to keep the log volume bounded
+METRICS_SLOW_REQUEST_SECONDS = _float("METRICS_SLOW_REQUEST_SECONDS", "0.5")
+METRICS_SLOW_REQUEST_SAMPLE_RATE = _float("METRICS_SLOW_REQUEST_SAMPLE_RATE", "0.1")
+
+# Venue routers are imported on the first request for one of their paths instead of at startup, for fast cold starts
+LAZY_ROUTERS = os.getenv("LAZY_ROUTERS", "false").lower() == "true"
+
+
+def validate() -> list:
+    # Every problem with the configuration at once, so a bad deploy fails on startup with the full list
+    errors = list(_parse_errors)
+    if BITMEX_BACKEND not in ("live", "paper"):
+        errors.append(f"BITMEX_BACKEND must be 'live' or 'paper', not '{BITMEX_BACKEND}'.")
+    if BITMEX_API_KEY and not BITMEX_SECRET_KEY:
+        errors.append("BITMEX_SECRET_KEY is required with BITMEX_API_KEY.")
+    if BITMEX_API_KEY and BITMEX_BACKEND == "live" and not BITMEX_BASE_URL:
+        errors.append("BITMEX_BASE_URL is required with BITMEX_API_KEY on the live backend.")
+    for name, credentials in BITMEX_ACCOUNTS.items():
+        if name == "default":
+            errors.append("BITMEX_ACCOUNTS may not name an account 'default', it is reserved for BITMEX_API_KEY.")
+        elif not isinstance(credentials, dict) or not credentials.get("api_key") or not credentials.get("secret_key"):
+            errors.append(f"BITMEX_ACCOUNTS['{name}'] needs an api_key and a secret_key.")
+    if BINANCE_API_KEY and not (BINANCE_SECRET_KEY and BINANCE_BASE_URL):
+        errors.append("BINANCE_SECRET_KEY and BINANCE_BASE_URL are required with BINANCE_API_KEY.")
+
+    for name in ("BITMEX_RATE_LIMIT", "BITMEX_RATE_LIMIT_BURST", "BINANCE_RATE_LIMIT", "BINANCE_RATE_LIMIT_BURST",
+                 "BITMEX_PAGE_SIZE", "BITMEX_BULK_ORDER_LIMIT", "JOURNAL_QUEUE_SIZE", "HTTP_MAX_CONNECTIONS",
+                 "CIRCUIT_FAILURE_THRESHOLD"):
+        if globals()[name] <= 0:
+            errors.append(f"{name} must be positive, not {globals()[name]}.")
+    if BITMEX_DEADMAN_TIMEOUT > 0 and not 0 < BITMEX_DEADMAN_INTERVAL < BITMEX_DEADMAN_TIMEOUT:
+        errors.append("BITMEX_DEADMAN_INTERVAL must be below BITMEX_DEADMAN_TIMEOUT, or the switch fires between "
+                      "heartbeats.")
+    if not 0 <= BITMEX_KILL_SIGNATURE_MARGIN < BITMEX_KILL_SIGNATURE_TTL:
+        errors.append("BITMEX_KILL_SIGNATURE_MARGIN must be below BITMEX_KILL_SIGNATURE_TTL.")
+    if UPSTREAM_RETRIES < 0 or BITMEX_HEDGE_AFTER < 0:
+        errors.append("UPSTREAM_RETRIES and BITMEX_HEDGE_AFTER may not be negative.")
+    return errors
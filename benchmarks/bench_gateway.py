@@ -0,0 +1,139 @@
+# Throughput and latency of the order gateway hot path.
+# Drives app.main:app in-process against a local fake BitMEX server and reports
+# throughput and p50/p99 latency for place/amend/cancel/get-orders at several
+# concurrency levels, followed by the signing/serialization micro-benchmarks.
+# Run with: python -m benchmarks.bench_gateway --concurrency 1 8 32 --latency 0.005
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from .fake_bitmex import FakeBitmex, serve
+
+
+def configure(port):
+    # Settings are read at import time, point the gateway at the fake exchange before importing it
+    os.environ["BITMEX_BASE_URL"] = f"http://127.0.0.1:{port}/api/v1"
+    os.environ.setdefault("BITMEX_API_KEY", "benchmark")
+    os.environ.setdefault("BITMEX_SECRET_KEY", "benchmark")
+    os.environ.setdefault("BITMEX_RATE_LIMIT", "100000000")
+    os.environ.setdefault("BITMEX_RATE_LIMIT_BURST", "100000000")
+    os.environ.setdefault("BITMEX_STREAM_ENABLED", "false")
+    os.environ.setdefault("BITMEX_ORDER_CACHE_ENABLED", "false")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run_operation(client, operation, requests, concurrency, order_ids):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    def build(i):
+        if operation == "place":
+            return "POST", {"json": {"symbol": "XBTUSD", "orderQty": 100, "price": 50000 + i % 50}}
+        if operation == "amend":
+            return "PUT", {"json": {"orderID": order_ids[i % len(order_ids)], "price": 49000 + i % 50}}
+        if operation == "cancel":
+            return "DELETE", {"json": {"orderID": order_ids[i % len(order_ids)]}}
+        return "GET", {"params": {"active": True, "fresh": True}}
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, kwargs = build(i)
+            started = time.perf_counter()
+            response = await client.request(method, "/bitmex/orders", **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+            elif operation == "place":
+                order_ids.append(response.json()["orderID"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "operation": operation,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+async def run(args):
+    import httpx
+
+    from app.api import transport
+    from app.main import app
+
+    results = []
+    order_ids = []
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gateway")
+    try:
+        for concurrency in args.concurrency:
+            for operation in args.operations:
+                results.append(await run_operation(client, operation, args.requests, concurrency, order_ids))
+    finally:
+        await client.aclose()
+        await transport.close_client()
+    return results
+
+
+def report(results, output):
+    header = f"{'operation':<12}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    print(header, file=output)
+    for result in results:
+        print(
+            f"{result['operation']:<12}{result['concurrency']:>6}{result['throughput']:>10.1f}"
+            f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}",
+            file=output,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and latency of the order gateway hot path.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=500, help="Requests per operation and concurrency level.")
+    parser.add_argument("--operations", nargs="+", default=["place", "amend", "cancel", "get_orders"],
+                        choices=["place", "amend", "cancel", "get_orders"])
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake exchange latency in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream 503 responses.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of upstream 429 responses.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Also append the report to this file (e.g. bench_output.txt).")
+    parser.add_argument("--skip-micro", action="store_true", help="Skip the signing/serialization benchmarks.")
+    args = parser.parse_args(argv)
+
+    configure(args.port)
+    fake = FakeBitmex(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=0)
+    server = serve(fake, port=args.port)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+
+    report(results, sys.stdout)
+    if args.output:
+        with open(args.output, "a") as output:
+            report(results, output)
+
+    if not args.skip_micro:
+        from .bench_auth import run as run_micro
+        print()
+        run_micro()
+    return results
+
+
+if __name__ == "__main__":
+    main()
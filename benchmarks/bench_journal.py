@@ -0,0 +1,49 @@
+# Throughput of the BitMEX call journal.
+# Hands order-sized records to the journal as the adapter does and reports
+# the cost of record() on the event loop and how fast the writer thread
+# gets them encoded, written and fsynced.
+# Run with: python -m benchmarks.bench_journal
+import argparse
+import tempfile
+import time
+
+import orjson
+
+from app.api.journal import Journal, read
+
+
+def run(count, fsync_interval):
+    request = orjson.dumps({"symbol": "XBTUSD", "side": "Buy", "orderQty": 100, "price": 50000.5,
+                            "clOrdID": "9ff4320a-476b-46c8-80e4-cc0f18873109", "ordType": "Limit"})
+    response = orjson.dumps({"orderID": "b87f6df0-f428-436a-a7d4-000000000001", "ordStatus": "New",
+                             "symbol": "XBTUSD", "side": "Buy", "orderQty": 100, "price": 50000.5,
+                             "leavesQty": 100, "cumQty": 0, "timestamp": "2024-01-01T00:00:00.000Z"} | {
+                                f"field{i}": i for i in range(20)})
+    meta = {"account": "default", "verb": "POST", "url": "https://www.bitmex.com/api/v1/order", "query": None}
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = Journal("bench", directory=directory, queue_size=count, fsync_interval=fsync_interval)
+        journal.start()
+        started = time.perf_counter()
+        for _ in range(count):
+            journal.record(meta, request, 200, response)
+        recorded = time.perf_counter() - started
+        journal.stop()
+        written = time.perf_counter() - started
+        assert sum(1 for _ in read(journal.path)) == count
+    return recorded, written
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=500000)
+    parser.add_argument("--fsync-interval", type=float, default=0.1)
+    args = parser.parse_args()
+
+    recorded, written = run(args.n, args.fsync_interval)
+    print(f"record()  {recorded / args.n * 1e6:8.2f} us/event on the caller")
+    print(f"written   {args.n / written:10,.0f} events/s end to end, fsync every {args.fsync_interval}s")
+
+
+if __name__ == "__main__":
+    main()
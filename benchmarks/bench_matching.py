@@ -0,0 +1,66 @@
+# Throughput of the paper-trading matching engine.
+# Feeds random limit and market orders around a mid price straight into the
+# engine, then through the paper adapter as the order endpoints would.
+# Run with: python -m benchmarks.bench_matching
+import argparse
+import asyncio
+import random
+import time
+
+import orjson
+
+from app.api.bitmex.matching import MatchingEngine
+from app.api.bitmex.paper import PaperAdapter
+from app.api.ratelimit import Priority
+
+
+def make_orders(count, seed=1):
+    rng = random.Random(seed)
+    orders = []
+    for _ in range(count):
+        side = rng.choice(("Buy", "Sell"))
+        if rng.random() < 0.1:
+            orders.append({"symbol": "XBTUSD", "side": side, "orderQty": rng.randint(1, 50), "ordType": "Market"})
+        else:
+            # Limit orders within 20 ticks of the mid, buys below and sells above on average
+            offset = rng.randint(-5, 20)
+            price = 50000 - offset * 0.5 if side == "Buy" else 50000 + offset * 0.5
+            orders.append({"symbol": "XBTUSD", "side": side, "orderQty": rng.randint(1, 50), "price": price})
+    return orders
+
+
+def run_engine(orders):
+    engine = MatchingEngine()
+    started = time.perf_counter()
+    for order in orders:
+        engine.submit("bench", order)
+    return time.perf_counter() - started
+
+
+def run_adapter(orders):
+    adapter = PaperAdapter(MatchingEngine(), account="bench")
+    bodies = [orjson.dumps(order).decode() for order in orders]
+
+    async def submit():
+        for body in bodies:
+            adapter.parse(await adapter.request("POST", "/order", Priority.NEW, data=body))
+
+    started = time.perf_counter()
+    asyncio.run(submit())
+    return time.perf_counter() - started
+
+
+def run(count=200000):
+    orders = make_orders(count)
+    results = {}
+    for name, runner in (("engine", run_engine), ("adapter", run_adapter)):
+        elapsed = runner(orders)
+        results[name] = count / elapsed * 60
+        print(f"{name:<8} {count} orders in {elapsed:6.2f} s  {results[name] / 1e6:6.2f}M orders/min")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the paper-trading matching engine.")
+    parser.add_argument("-n", "--number", type=int, default=200000, help="Orders to submit.")
+    run(parser.parse_args().number)
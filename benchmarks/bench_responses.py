@@ -0,0 +1,63 @@
+# Micro-benchmark of the get_orders response path on large results.
+# Compares decoding the upstream body and re-encoding it through the stdlib
+# JSON response (previous behaviour) with the orjson response class and with
+# forwarding the upstream bytes as they are. Run with: python -m benchmarks.bench_responses
+import argparse
+import json
+import timeit
+
+import orjson
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+from app.api.responses import JSONResponse, RawJSONResponse
+
+
+def make_orders(count):
+    # Shaped like BitMEX GET /order rows
+    return [
+        {
+            "orderID": f"00000000-0000-0000-0000-{i:012d}", "clOrdID": f"bench-{i}", "clOrdLinkID": "",
+            "account": 12345, "symbol": "XBTUSD", "side": "Buy" if i % 2 else "Sell", "orderQty": 100 + i,
+            "price": 50000.5 + i, "displayQty": None, "stopPx": None, "pegOffsetValue": None, "pegPriceType": "",
+            "currency": "USD", "settlCurrency": "XBt", "ordType": "Limit", "timeInForce": "GoodTillCancel",
+            "execInst": "ParticipateDoNotInitiate", "ordStatus": "New", "workingIndicator": True,
+            "ordRejReason": "", "leavesQty": 100 + i, "cumQty": 0, "avgPx": None, "text": "Submitted via API.",
+            "transactTime": "2024-01-01T00:00:00.000Z", "timestamp": "2024-01-01T00:00:00.000Z",
+        }
+        for i in range(count)
+    ]
+
+
+def measure(statement, number):
+    # Best of several repeats, reported in microseconds per call
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def run(sizes=(100, 500, 5000), number=200):
+    results = {}
+    for size in sizes:
+        body = json.dumps(make_orders(size), separators=(",", ":")).encode()
+        assert orjson.loads(JSONResponse(orjson.loads(body)).body) == json.loads(body)
+
+        cases = {
+            "stdlib": lambda: StarletteJSONResponse(json.loads(body)),
+            "orjson": lambda: JSONResponse(orjson.loads(body)),
+            "decode+passthrough": lambda: (orjson.loads(body), RawJSONResponse(body)),
+            "passthrough": lambda: RawJSONResponse(body),
+        }
+
+        timings = {name: measure(case, number) for name, case in cases.items()}
+        results[size] = timings
+        baseline = timings["stdlib"]
+        print(f"{size} orders, {len(body) / 1024:.0f} KiB")
+        for name, elapsed in timings.items():
+            print(f"  {name:<20} {elapsed:10.1f} us  saved {baseline - elapsed:10.1f} us  speedup {baseline / elapsed:7.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of the get_orders response path on large results.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 5000], help="Orders per response.")
+    parser.add_argument("-n", "--number", type=int, default=200, help="Responses per repeat.")
+    args = parser.parse_args()
+    run(args.sizes, args.number)
@@ -0,0 +1,59 @@
+# Cold start of the gateway, eager against lazy routers.
+# Starts uvicorn in a fresh process per run, as an autoscaled pod would,
+# and reports the time until GET / and until a BitMEX route first answers,
+# along with the import time of app.main on its own.
+# Run with: python -m benchmarks.bench_startup
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+IMPORT = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+
+
+def import_seconds(env):
+    output = subprocess.run([sys.executable, "-c", IMPORT], env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.split()[-1])
+
+
+def first_request_seconds(env, port, path):
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                               "--log-level", "warning"], env=env, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1).read()
+                return time.perf_counter() - started
+            except urllib.error.HTTPError:
+                # Any answer from the route counts
+                return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.002)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args()
+
+    for lazy in ("false", "true"):
+        env = dict(os.environ, LAZY_ROUTERS=lazy, BITMEX_API_KEY="", BINANCE_API_KEY="")
+        imports = [import_seconds(env) for _ in range(args.n)]
+        print(f"LAZY_ROUTERS={lazy}")
+        print(f"  {'import app.main':<24} {statistics.median(imports) * 1000:8.1f} ms median")
+        for path in ("/", "/bitmex/positions"):
+            runs = [first_request_seconds(env, args.port, path) for _ in range(args.n)]
+            print(f"  {'first ' + path:<24} {statistics.median(runs) * 1000:8.1f} ms median from process start")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Local stand-in for the BitMEX REST order API used by the benchmarks.
+# Latency, error rate and 429 injection are configurable so the gateway can be
+# measured without touching the real exchange.
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class FakeBitmex:
+    def __init__(self, latency=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.orders = {}
+        self.ids = itertools.count(1)
+        self.requests = 0
+
+        self.app = Starlette(routes=[
+            Route("/api/v1/order", self.order, methods=["GET", "POST", "PUT", "DELETE"]),
+            Route("/api/v1/order/all", self.cancel_all, methods=["DELETE"]),
+            Route("/api/v1/order/bulk", self.bulk, methods=["POST", "PUT"]),
+        ])
+
+    def new_order(self, body):
+        order_id = f"fake-{next(self.ids)}"
+        order = {
+            "orderID": order_id,
+            "ordStatus": "New",
+            "workingIndicator": True,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+            **body,
+        }
+        self.orders[order_id] = order
+        return order
+
+    def amend(self, body):
+        order = self.orders.get(body.get("orderID"), {"orderID": body.get("orderID"), "ordStatus": "New"})
+        order.update(body)
+        return order
+
+    def cancel(self, order_id):
+        order = self.orders.pop(order_id, {"orderID": order_id})
+        return {**order, "ordStatus": "Canceled", "workingIndicator": False}
+
+    async def fault(self):
+        # Simulated network + matching latency, then optional injected failures
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse({"error": {"message": "Rate limit exceeded"}}, status_code=429,
+                                headers={"retry-after": "0"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse({"error": {"message": "The system is currently overloaded."}}, status_code=503)
+        return None
+
+    async def order(self, request: Request):
+        failure = await self.fault()
+        if failure is not None:
+            return failure
+
+        headers = {"x-ratelimit-remaining": "1000000", "x-ratelimit-reset": str(int(time.time()) + 60)}
+        if request.method == "GET":
+            return JSONResponse(list(self.orders.values())[-100:], headers=headers)
+
+        body = json.loads(await request.body() or b"{}")
+        if request.method == "POST":
+            return JSONResponse(self.new_order(body), headers=headers)
+        if request.method == "PUT":
+            return JSONResponse(self.amend(body), headers=headers)
+        return JSONResponse([self.cancel(body.get("orderID"))], headers=headers)
+
+    async def cancel_all(self, request: Request):
+        failure = await self.fault()
+        if failure is not None:
+            return failure
+        return JSONResponse([self.cancel(order_id) for order_id in list(self.orders)])
+
+    async def bulk(self, request: Request):
+        failure = await self.fault()
+        if failure is not None:
+            return failure
+        orders = json.loads(await request.body())["orders"]
+        if request.method == "POST":
+            return JSONResponse([self.new_order(order) for order in orders])
+        return JSONResponse([self.amend(order) for order in orders])
+
+
+def serve(fake: FakeBitmex, host="127.0.0.1", port=8765) -> uvicorn.Server:
+    # Run the fake exchange in a background thread and wait until it accepts connections
+    server = uvicorn.Server(uvicorn.Config(fake.app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
@@ -0,0 +1,126 @@
+import hashlib
+import hmac
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.api.binance.adapter import format_value
+from app.main import app
+from app.settings import BINANCE_BASE_URL, BINANCE_SECRET_KEY
+
+client = TestClient(app)
+
+
+def split_signed_url(url):
+    # Separate the signed query string from the trailing signature
+    parts = urlsplit(url)
+    query, signature = parts.query.rsplit("&signature=", 1)
+    return parts.scheme + "://" + parts.netloc + parts.path, query, signature
+
+
+@patch("app.api.transport.request")
+def test_place_order_success(mock_post):
+    mock_success_response = {"orderId": 1, "status": "NEW"}
+    mock_post.return_value = httpx.Response(200, json=mock_success_response)
+
+    response = client.post("/binance/orders", json={
+        "symbol": "BTCUSDT",
+        "side": "BUY",
+        "type": "LIMIT",
+        "timeInForce": "GTC",
+        "quantity": 0.00001,
+        "price": 50000
+    })
+
+    mock_post.assert_called_once()
+    args, kwargs = mock_post.call_args
+    assert args[0] == "POST"
+
+    # The query string is signed with the secret key and carries a timestamp
+    url, query, signature = split_signed_url(args[1])
+    assert url == BINANCE_BASE_URL + "/api/v3/order"
+    params = dict(parse_qsl(query))
+    assert params["quantity"] == "0.00001"
+    assert "timestamp" in params
+    expected = hmac.new(BINANCE_SECRET_KEY.encode(), query.encode(), hashlib.sha256).hexdigest()
+    assert signature == expected
+
+    assert response.status_code == 200
+    assert response.json() == mock_success_response
+
+
+@patch("app.api.transport.request")
+def test_place_order_failure(mock_post):
+    mock_error_response = {"code": -1013, "msg": "Filter failure: LOT_SIZE"}
+    mock_post.return_value = httpx.Response(400, json=mock_error_response)
+
+    response = client.post("/binance/orders", json={"symbol": "BTCUSDT", "side": "BUY", "quantity": 1, "price": 1})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": mock_error_response}
+
+
+@patch("app.api.transport.request")
+def test_get_open_orders(mock_get):
+    mock_get.return_value = httpx.Response(200, json=[])
+
+    response = client.get("/binance/orders", params={"symbol": "BTCUSDT", "active": True})
+
+    args, kwargs = mock_get.call_args
+    assert split_signed_url(args[1])[0] == BINANCE_BASE_URL + "/api/v3/openOrders"
+    assert response.status_code == 200
+
+
+@patch("app.api.transport.request")
+def test_amend_order_uses_cancel_replace(mock_post):
+    mock_post.return_value = httpx.Response(200, json={"cancelResult": "SUCCESS", "newOrderResult": "SUCCESS"})
+
+    response = client.put("/binance/orders", json={
+        "symbol": "BTCUSDT",
+        "side": "BUY",
+        "cancelOrderId": 1,
+        "timeInForce": "GTC",
+        "quantity": 1,
+        "price": 49000
+    })
+
+    args, kwargs = mock_post.call_args
+    assert args[0] == "POST"
+    assert split_signed_url(args[1])[0] == BINANCE_BASE_URL + "/api/v3/order/cancelReplace"
+    assert response.status_code == 200
+
+
+def test_amend_order_requires_order_to_replace():
+    response = client.put("/binance/orders", json={"symbol": "BTCUSDT", "side": "BUY", "quantity": 1, "price": 1})
+    assert response.status_code == 400
+
+
+@patch("app.api.transport.request")
+def test_cancel_all_orders(mock_delete):
+    mock_delete.return_value = httpx.Response(200, json=[])
+
+    response = client.request("DELETE", "/binance/orders", json={"symbol": "BTCUSDT", "all": True})
+
+    args, kwargs = mock_delete.call_args
+    assert split_signed_url(args[1])[0] == BINANCE_BASE_URL + "/api/v3/openOrders"
+    assert response.status_code == 200
+
+
+@patch("app.api.transport.request")
+def test_cancel_order(mock_delete):
+    mock_delete.return_value = httpx.Response(200, json={"orderId": 1, "status": "CANCELED"})
+
+    response = client.request("DELETE", "/binance/orders", json={"symbol": "BTCUSDT", "orderId": 1})
+
+    args, kwargs = mock_delete.call_args
+    assert split_signed_url(args[1])[0] == BINANCE_BASE_URL + "/api/v3/order"
+    assert response.status_code == 200
+
+
+def test_format_value():
+    assert format_value(0.00001) == "0.00001"
+    assert format_value(50000.0) == "50000.0"
+    assert format_value(True) == "true"
+    assert format_value("BTCUSDT") == "BTCUSDT"
@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.bitmex.accounts import AccountRegistry, accounts
+from app.api.bitmex.adapter import BitmexAdapter, adapter
+from app.api.bitmex.store import order_store
+from app.main import app
+
+client = TestClient(app)
+
+SUB_ACCOUNT = BitmexAdapter(api_key="sub-key", secret="sub-secret", account="sub")
+
+
+def test_registry_builds_an_adapter_per_account():
+    registry = AccountRegistry(adapter, {"sub": {"api_key": "sub-key", "secret_key": "sub-secret"}})
+
+    sub = registry.get("sub")
+    assert registry.get() is adapter and registry.get("default") is adapter
+    assert sub.api_key == "sub-key" and sub.pool == "bitmex:sub"
+    assert sub.governor is not adapter.governor
+    assert not registry.is_default(sub)
+    assert set(registry.stats()) == {"default", "sub"}
+
+
+def test_registry_rejects_unknown_and_reserved_accounts():
+    with pytest.raises(HTTPException) as e:
+        accounts.get("missing")
+    assert e.value.status_code == 404
+
+    # Reserved or incomplete entries are left to validate() to report, the registry still builds
+    registry = AccountRegistry(adapter, {"default": {"api_key": "k", "secret_key": "s"}, "hedge": {"api_key": "k"},
+                                         "spot": "k"})
+    assert set(registry.adapters) == {"default"} and registry.get("default") is adapter
+
+
+@patch.dict(accounts.adapters, {"sub": SUB_ACCOUNT})
+@patch("app.api.transport.request")
+def test_account_selected_by_path(mock_request):
+    mock_request.return_value = httpx.Response(200, json={"orderID": "sub-1"})
+
+    response = client.put("/bitmex/accounts/sub/orders", json={"orderID": "sub-1", "price": 1})
+
+    assert response.status_code == 200
+    assert mock_request.call_args.kwargs["headers"]["api-key"] == "sub-key"
+    assert mock_request.call_args.kwargs["pool"] == "bitmex:sub"
+    # Orders of other accounts are not mixed into the default account's store
+    assert order_store.get("sub-1") is None
+
+
+@patch.dict(accounts.adapters, {"sub": SUB_ACCOUNT})
+@patch("app.api.transport.request")
+def test_account_selected_by_header(mock_request):
+    mock_request.return_value = httpx.Response(200, json=[])
+
+    client.get("/bitmex/orders", params={"fresh": True}, headers={"X-Account": "sub"})
+    assert mock_request.call_args.kwargs["headers"]["api-key"] == "sub-key"
+
+    client.get("/bitmex/orders", params={"fresh": True})
+    assert mock_request.call_args.kwargs["pool"] is None
+
+
+def test_unknown_account_is_not_found():
+    response = client.get("/bitmex/accounts/missing/ratelimit")
+
+    assert response.status_code == 404
@@ -15,4 +15,23 @@ def test_to_valid_json_with_dict():
     data = {"id": 1, "name": "John", "age": None}
     result = to_valid_json(data)
     expected_result = '{"id":1,"name":"John"}'
-    assert result == expected_result
\ No newline at end of file
+    assert result == expected_result
+
+# Example signatures from the BitMEX API key documentation
+SECRET = "chNOOS4KvNXR_Xq4k4c9qsfoKWvnDecLATCRlcBwyKDYnWgO"
+
+def test_generate_signature_get():
+    result = generate_signature(SECRET, "GET", "https://www.bitmex.com/api/v1/instrument", 1518064236)
+    assert result == "c7682d435d0cfe87c16098df34ef2eb5a549d4c5a3c2b1f0f77b8af73423bf00"
+
+def test_generate_signature_post():
+    data = '{"symbol":"XBTM15","price":219.0,"clOrdID":"mm_bitmex_1a/oemUeQ4CAJZgP3fjHsA","orderQty":98}'
+    result = generate_signature(SECRET, "POST", "/api/v1/order", 1518064238, data=data)
+    assert result == "1749cd2ccae4aa49048ae09f0b95110cee706e0944e6a14ad0b3a8cb45bd336b"
+
+def test_signer_is_reusable():
+    signer = Signer(SECRET)
+    data = b'{"symbol":"XBTM15","price":219.0,"clOrdID":"mm_bitmex_1a/oemUeQ4CAJZgP3fjHsA","orderQty":98}'
+    first = signer.sign("POST", "/api/v1/order", 1518064238, data=data)
+    second = signer.sign("POST", "/api/v1/order", 1518064238, data=data)
+    assert first == second == "1749cd2ccae4aa49048ae09f0b95110cee706e0944e6a14ad0b3a8cb45bd336b"
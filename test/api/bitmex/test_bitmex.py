@@ -1,7 +1,14 @@
+import json
+import time
+
+import httpx
 from fastapi.testclient import TestClient
 from pydantic.dataclasses import dataclass
 from starlette.testclient import TestClient as StartletteTestClient
 
+from app.api.bitmex.adapter import adapter
+from app.api.ratelimit import RateLimitGovernor
+from app.api.bitmex.store import order_store
 from app.main import app
 from unittest.mock import patch, call
 
@@ -10,15 +17,14 @@ from app.settings import BITMEX_BASE_URL
 client = TestClient(app)
 new_client = StartletteTestClient(app)
 
-@patch("app.api.bitmex.main.requests.get")
+@patch("app.api.transport.request")
 def test_get_orders_success(mock_get):
     mock_success_response = {
         "status": "success",
     }
 
     # Set up the mock to return a successful response
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.json.return_value = mock_success_response
+    mock_get.return_value = httpx.Response(200, json=mock_success_response)
 
     response = client.get("/bitmex/orders", params={"order_ids": ["1"]})
 
@@ -28,15 +34,14 @@ def test_get_orders_success(mock_get):
     assert response.json() == mock_success_response
 
 
-@patch("app.api.bitmex.main.requests.get")
+@patch("app.api.transport.request")
 def test_get_orders_failure(mock_get):
     mock_error_response = {
         "error": "Invalid ID"
     }
 
     # Set up the mock to return an error response
-    mock_get.return_value.status_code = 400
-    mock_get.return_value.json.return_value = mock_error_response
+    mock_get.return_value = httpx.Response(400, json=mock_error_response)
 
     response = client.get("/bitmex/orders", params={"order_ids": ["invalid"]})
 
@@ -46,15 +51,74 @@ def test_get_orders_failure(mock_get):
     assert response.json() == {"detail": mock_error_response}
 
 
-@patch("app.api.bitmex.main.requests.post")
+@patch("app.api.transport.request")
+def test_get_orders_normalizes_filters(mock_get):
+    mock_get.return_value = httpx.Response(200, json=[])
+
+    client.get("/bitmex/orders", params={"order_ids": ["2", "1", "2"], "state": ["NEW", "FILLED"], "fresh": True})
+
+    # Equivalent queries produce the same upstream filter, so they coalesce when in flight together
+    params = mock_get.call_args.kwargs["params"]
+    assert json.loads(params["filter"]) == {"orderID": ["1", "2"], "ordStatus": ["FILLED", "NEW"]}
+
+
+@patch("app.api.transport.request")
+def test_get_orders_forwards_paging_params(mock_get):
+    mock_get.return_value = httpx.Response(200, json=[{"orderID": "1", "price": 100}])
+
+    response = client.get("/bitmex/orders", params={"count": 10, "start": 20, "reverse": True, "columns": ["price"]})
+
+    params = mock_get.call_args.kwargs["params"]
+    assert params["count"] == 10 and params["start"] == 20 and params["reverse"] is True
+    assert json.loads(params["columns"]) == ["price"]
+    assert response.json() == [{"orderID": "1", "price": 100}]
+    # Partial rows are not written through to the order store
+    assert order_store.get("1") is None
+
+
+@patch("app.api.transport.request")
+def test_get_orders_paginate_streams_ndjson(mock_get):
+    # The second window fetches two pages at once, the first of them short
+    pages = [[{"orderID": "1"}, {"orderID": "2"}], [{"orderID": "3"}], []]
+    mock_get.side_effect = [httpx.Response(200, json=rows) for rows in pages]
+
+    response = client.get("/bitmex/orders", params={"paginate": True, "count": 2, "symbol": "XBTUSD"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["orderID"] for line in response.text.splitlines()] == ["1", "2", "3"]
+    assert [c.kwargs["params"]["start"] for c in mock_get.call_args_list] == [0, 2, 4]
+
+
+@patch("app.api.transport.request")
+def test_get_orders_paginate_maps_first_page_error(mock_get):
+    mock_get.return_value = httpx.Response(400, json={"error": "Invalid filter"})
+
+    response = client.get("/bitmex/orders", params={"paginate": True})
+
+    assert response.status_code == 400
+
+
+@patch("app.api.transport.request")
+def test_get_orders_forwards_upstream_body(mock_get):
+    body = b'[{"orderID": "1", "price": 50000.50, "symbol": "XBTUSD"}]'
+    mock_get.return_value = httpx.Response(200, content=body)
+
+    response = client.get("/bitmex/orders", params={"fresh": True})
+
+    # Bytes are passed through as received instead of being re-encoded
+    assert response.content == body
+    assert response.headers["content-type"] == "application/json"
+
+
+@patch("app.api.transport.request")
 def test_place_order_success(mock_post):
     mock_success_response = {
         "status": "success",
     }
 
     # Set up the mock to return a successful response
-    mock_post.return_value.status_code = 200
-    mock_post.return_value.json.return_value = mock_success_response
+    mock_post.return_value = httpx.Response(200, json=mock_success_response)
 
     # Call the endpoint with mocked order request data
     response = client.post("/bitmex/orders", json={
@@ -70,15 +134,14 @@ def test_place_order_success(mock_post):
     assert response.json() == mock_success_response
 
 
-@patch("app.api.bitmex.main.requests.post")
+@patch("app.api.transport.request")
 def test_place_order_failure(mock_post):
     mock_error_response = {
         "error": "error"
     }
 
     # Set up the mock to return an error response
-    mock_post.return_value.status_code = 400
-    mock_post.return_value.json.return_value = mock_error_response
+    mock_post.return_value = httpx.Response(400, json=mock_error_response)
 
     # Call the endpoint with mocked order request data
     response = client.post("/bitmex/orders", json={
@@ -94,15 +157,14 @@ def test_place_order_failure(mock_post):
     assert response.json() == {"detail": mock_error_response}
 
 
-@patch("app.api.bitmex.main.requests.put")
+@patch("app.api.transport.request")
 def test_amend_order_success(mock_put):
     mock_success_response = {
         "status": "success",
     }
 
     # Set up the mock to return a successful response
-    mock_put.return_value.status_code = 200
-    mock_put.return_value.json.return_value = mock_success_response
+    mock_put.return_value = httpx.Response(200, json=mock_success_response)
 
     # Call the endpoint with mocked amend request data
     response = client.put("/bitmex/orders", json={
@@ -117,15 +179,14 @@ def test_amend_order_success(mock_put):
     assert response.json() == mock_success_response
 
 
-@patch("app.api.bitmex.main.requests.put")
+@patch("app.api.transport.request")
 def test_amend_order_failure(mock_put):
     mock_error_response = {
         "error": "Invalid ID"
     }
 
     # Set up the mock to return an error response
-    mock_put.return_value.status_code = 400
-    mock_put.return_value.json.return_value = mock_error_response
+    mock_put.return_value = httpx.Response(400, json=mock_error_response)
 
     # Call the endpoint with mocked amend request data
     response = client.put("/bitmex/orders", json={
@@ -141,15 +202,14 @@ def test_amend_order_failure(mock_put):
 
 
 # Cancel an order by orderID or origClOrdID
-@patch("app.api.bitmex.main.requests.delete")
+@patch("app.api.transport.request")
 def test_cancel_orders_success(mock_delete):
     mock_success_response = {
         "status": "success",
     }
 
     # Set up the mock to return a successful response
-    mock_delete.return_value.status_code = 200
-    mock_delete.return_value.json.return_value = mock_success_response
+    mock_delete.return_value = httpx.Response(200, json=mock_success_response)
 
     # Call the endpoint with mocked cancel request data
     response = client.request("DELETE", "/bitmex/orders", json={
@@ -163,22 +223,21 @@ def test_cancel_orders_success(mock_delete):
     args, kwargs = mock_delete.call_args
 
     # Check that the called URL is correct
-    assert args[0] == BITMEX_BASE_URL + "/order"
+    assert args[1] == BITMEX_BASE_URL + "/order"
 
     assert response.status_code == 200
     assert response.json() == mock_success_response
 
 
 # Error response for cancellation failure
-@patch("app.api.bitmex.main.requests.delete")
+@patch("app.api.transport.request")
 def test_cancel_orders_failure(mock_delete):
     mock_error_response = {
         "error": "Invalid ID"
     }
 
     # Set up the mock to return an error response
-    mock_delete.return_value.status_code = 400
-    mock_delete.return_value.json.return_value = mock_error_response
+    mock_delete.return_value = httpx.Response(400, json=mock_error_response)
 
     # Call the endpoint with mocked cancel request data
     response = client.request("DELETE", "/bitmex/orders", json={
@@ -192,15 +251,14 @@ def test_cancel_orders_failure(mock_delete):
 
 
 # Cancel all orders without any filter
-@patch("app.api.bitmex.main.requests.delete")
+@patch("app.api.transport.request")
 def test_cancel_orders_all_without_filter_success(mock_delete):
     mock_success_response = {
         "status": "success",
     }
 
     # Set up the mock to return a successful response
-    mock_delete.return_value.status_code = 200
-    mock_delete.return_value.json.return_value = mock_success_response
+    mock_delete.return_value = httpx.Response(200, json=mock_success_response)
 
     # Call the endpoint without request data to cancel all orders that the authenticated user has
     response = client.request("DELETE", "/bitmex/orders", json={
@@ -214,22 +272,21 @@ def test_cancel_orders_all_without_filter_success(mock_delete):
     args, kwargs = mock_delete.call_args
 
     # Check that the called URL is correct
-    assert args[0] == BITMEX_BASE_URL + "/order/all"
+    assert args[1] == BITMEX_BASE_URL + "/order/all"
 
     assert response.status_code == 200
     assert response.json() == mock_success_response
 
 
 # Cancel all orders without any filter, and add a memo (text)
-@patch("app.api.bitmex.main.requests.delete")
+@patch("app.api.transport.request")
 def test_cancel_orders_all_without_filter_success_added_description(mock_delete):
     mock_success_response = {
         "status": "success",
     }
 
     # Set up the mock to return a successful response
-    mock_delete.return_value.status_code = 200
-    mock_delete.return_value.json.return_value = mock_success_response
+    mock_delete.return_value = httpx.Response(200, json=mock_success_response)
 
     # Call the endpoint without request data to cancel all orders that the authenticated user has
     response = client.request("DELETE", "/bitmex/orders", json={
@@ -244,7 +301,7 @@ def test_cancel_orders_all_without_filter_success_added_description(mock_delete)
     args, kwargs = mock_delete.call_args
 
     # Check that the called URL is correct
-    assert args[0] == BITMEX_BASE_URL + "/order/all"
+    assert args[1] == BITMEX_BASE_URL + "/order/all"
 
     assert response.status_code == 200
     assert response.json() == mock_success_response
@@ -263,15 +320,14 @@ def test_cancel_orders_all_without_filter_failure():
 
 
 # Cancel all orders from the filtered results
-@patch("app.api.bitmex.main.requests.delete")
+@patch("app.api.transport.request")
 def test_cancel_orders_all_with_filter_success(mock_delete):
     mock_success_response = {
         "status": "success",
     }
 
     # Set up the mock to return a successful response
-    mock_delete.return_value.status_code = 200
-    mock_delete.return_value.json.return_value = mock_success_response
+    mock_delete.return_value = httpx.Response(200, json=mock_success_response)
 
     # Call the endpoint with mocked 'cancel all' request data
     response = client.request("DELETE", "/bitmex/orders", json={
@@ -288,7 +344,118 @@ def test_cancel_orders_all_with_filter_success(mock_delete):
     args, kwargs = mock_delete.call_args
 
     # Check that the called URL is correct
-    assert args[0] == BITMEX_BASE_URL + "/order/all"
+    assert args[1] == BITMEX_BASE_URL + "/order/all"
+
+    assert response.status_code == 200
+    assert response.json() == mock_success_response
+
+# Place a batch of orders split into several upstream bulk requests
+@patch("app.api.bitmex.main.BITMEX_BULK_ORDER_LIMIT", 2)
+@patch("app.api.transport.request")
+def test_place_orders_bulk_success(mock_post):
+    # Echo back the orders of each chunk as the upstream response
+    def echo(verb, url, content, **kwargs):
+        return httpx.Response(200, json=json.loads(content)["orders"])
+
+    mock_post.side_effect = echo
+
+    orders = [{"symbol": "XBTUSD", "price": 50000 + i, "orderQty": 1} for i in range(5)]
+    response = client.post("/bitmex/orders/bulk", json=orders)
+
+    # 5 orders with a limit of 2 per request should result in 3 upstream calls
+    assert mock_post.call_count == 3
+    args, kwargs = mock_post.call_args
+    assert args[1] == BITMEX_BASE_URL + "/order/bulk"
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["order"]["price"] for result in results] == [50000 + i for i in range(5)]
+    assert response.json()["failed"] == 0
+
+
+# Every upstream bulk request carries a single symbol, results stay in input order
+@patch("app.api.bitmex.main.BITMEX_BULK_ORDER_LIMIT", 2)
+@patch("app.api.transport.request")
+def test_place_orders_bulk_groups_by_symbol(mock_post):
+    def echo(verb, url, content, **kwargs):
+        orders = json.loads(content)["orders"]
+        if len({order["symbol"] for order in orders}) > 1:
+            return httpx.Response(400, json={"error": "Mixed symbols"})
+        return httpx.Response(200, json=orders)
+
+    mock_post.side_effect = echo
+
+    symbols = ["XBTUSD", "ETHUSD", "XBTUSD", "ETHUSD", "XBTUSD"]
+    orders = [{"symbol": symbol, "price": 100 + i, "orderQty": 1} for i, symbol in enumerate(symbols)]
+    response = client.post("/bitmex/orders/bulk", json=orders)
+
+    # XBTUSD needs two requests of at most 2 orders, ETHUSD one
+    assert mock_post.call_count == 3
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+    assert [(result["order"]["symbol"], result["order"]["price"]) for result in results] == [
+        (symbol, 100 + i) for i, symbol in enumerate(symbols)
+    ]
+
+
+# A failed chunk is reported per order without failing the rest of the batch
+@patch("app.api.bitmex.main.BITMEX_BULK_ORDER_LIMIT", 2)
+@patch("app.api.transport.request")
+def test_amend_orders_bulk_partial_failure(mock_put):
+    def reject_second_chunk(verb, url, content, **kwargs):
+        orders = json.loads(content)["orders"]
+        if orders[0]["orderID"] == "3":
+            return httpx.Response(400, json={"error": "Invalid ID"})
+        return httpx.Response(200, json=orders)
+
+    mock_put.side_effect = reject_second_chunk
+
+    amends = [{"orderID": str(i + 1), "price": 100.0} for i in range(4)]
+    response = client.put("/bitmex/orders/bulk", json=amends)
+
+    assert response.status_code == 207
+    results = response.json()["results"]
+    assert [result["status_code"] for result in results] == [200, 200, 400, 400]
+    assert results[2]["error"] == {"error": "Invalid ID"}
+    assert response.json()["failed"] == 2
+
+
+# Fresh cached orders are served without calling the exchange
+@patch("app.api.transport.request")
+def test_get_orders_from_cache(mock_get):
+    order_store.upsert({"orderID": "cached", "ordStatus": "New", "workingIndicator": True})
+    order_store.synced_at = time.monotonic()
+    try:
+        response = client.get("/bitmex/orders", params={"order_ids": ["cached"]})
+        mock_get.assert_not_called()
+        assert response.status_code == 200
+        assert response.json()[0]["orderID"] == "cached"
+
+        # 'fresh' forces the upstream call
+        mock_get.return_value = httpx.Response(200, json=[])
+        client.get("/bitmex/orders", params={"order_ids": ["cached"], "fresh": True})
+        mock_get.assert_called_once()
+    finally:
+        order_store.remove("cached")
+        order_store.synced_at = None
+
+
+# Calls rejected with 429 are queued again instead of failing
+@patch.object(adapter, "governor", RateLimitGovernor(limit=6000, burst=10))
+@patch("app.api.transport.request")
+def test_place_order_retried_after_rate_limit(mock_post):
+    mock_post.side_effect = [
+        httpx.Response(429, headers={"retry-after": "0"}, json={"error": "Rate limit exceeded"}),
+        httpx.Response(200, json={"status": "success"}),
+    ]
+
+    response = client.post("/bitmex/orders", json={
+        "symbol": "XBTUSD",
+        "price": 50000,
+        "orderQty": 1,
+        "side": "Buy"
+    })
 
+    assert mock_post.call_count == 2
     assert response.status_code == 200
-    assert response.json() == mock_success_response
\ No newline at end of file
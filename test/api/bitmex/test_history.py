@@ -0,0 +1,142 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.bitmex.history import ColumnStore, download, parse_interval, resample, to_millis
+from app.main import app
+
+client = TestClient(app)
+
+MINUTE = 60 * 1000
+
+
+def trade_columns(ts, price, size):
+    return {"ts": np.array(ts, dtype=np.int64), "price": np.array(price, dtype=float), "size": np.array(size, dtype=float)}
+
+
+def test_append_read_and_range(tmp_path):
+    store = ColumnStore("XBTUSD", "trade", root=str(tmp_path))
+    assert len(store) == 0 and len(store.read()["ts"]) == 0
+
+    store.append(trade_columns([1000, 2000, 2000], [1, 2, 3], [10, 20, 30]))
+    store.append(trade_columns([3000], [4], [40]))
+
+    assert len(store) == 4
+    assert isinstance(store.read()["price"], np.memmap)
+    window = store.range(2000, 3000)
+    assert list(window["price"]) == [2, 3]
+    assert store.last() == (3000, 1)
+
+
+def test_symbols_cannot_leave_the_history_dir(tmp_path):
+    for symbol in ("..", ".", "../XBTUSD", "xbtusd", ""):
+        with pytest.raises(HTTPException) as exc_info:
+            ColumnStore(symbol, "trade", root=str(tmp_path))
+        assert exc_info.value.status_code == 400
+    assert ColumnStore(".BXBT", "trade", root=str(tmp_path)).path == str(tmp_path / ".BXBT" / "trade")
+
+    with patch("app.api.bitmex.history.HISTORY_DIR", str(tmp_path)):
+        assert client.get("/bitmex/history/%2E%2E/candles").status_code == 400
+        assert client.post("/bitmex/history/%2E%2E").status_code == 400
+
+
+def test_append_after_a_torn_append_realigns_columns(tmp_path):
+    store = ColumnStore("XBTUSD", "trade", root=str(tmp_path))
+    store.append(trade_columns([1000], [1], [10]))
+    # A crash after the price column of the next append was written, and half of its size column
+    with open(store._file("price"), "ab") as file:
+        file.write(np.array([2.0]).tobytes())
+    with open(store._file("size"), "ab") as file:
+        file.write(b"\0" * 4)
+    assert len(store) == 1
+
+    store.append(trade_columns([3000], [3], [30]))
+    columns = store.read()
+    assert list(columns["ts"]) == [1000, 3000]
+    assert list(columns["price"]) == [1, 3]
+    assert list(columns["size"]) == [10, 30]
+
+
+def test_resample_trades_matches_naive_aggregation():
+    rng = np.random.default_rng(1)
+    ts = np.sort(rng.integers(0, 60 * MINUTE, 5000))
+    price = rng.uniform(100, 200, len(ts))
+    size = rng.integers(1, 100, len(ts)).astype(float)
+
+    candles = resample(trade_columns(ts, price, size), "trade", 5 * MINUTE)
+
+    for index, start in enumerate(candles["ts"]):
+        mask = (ts >= start) & (ts < start + 5 * MINUTE)
+        assert candles["open"][index] == price[mask][0] and candles["close"][index] == price[mask][-1]
+        assert candles["high"][index] == price[mask].max() and candles["low"][index] == price[mask].min()
+        assert candles["volume"][index] == size[mask].sum() and candles["trades"][index] == mask.sum()
+
+
+def test_resample_buckets_skips_empty_ones():
+    buckets = {
+        "ts": np.array([0, MINUTE, 2 * MINUTE]),
+        "open": np.array([1.0, np.nan, 3.0]), "high": np.array([2.0, np.nan, 5.0]),
+        "low": np.array([0.5, np.nan, 2.0]), "close": np.array([1.5, np.nan, 4.0]),
+        "volume": np.array([10.0, 0.0, 5.0]),
+    }
+
+    candles = resample(buckets, "bucket", 5 * MINUTE)
+
+    assert list(candles["ts"]) == [0]
+    assert (candles["open"][0], candles["high"][0], candles["low"][0], candles["close"][0]) == (1, 5, 0.5, 4)
+    assert candles["volume"][0] == 15
+
+
+def test_parse_interval():
+    assert parse_interval("30s") == 30000 and parse_interval("4h") == 4 * 60 * MINUTE
+    with pytest.raises(HTTPException):
+        parse_interval("5x")
+
+
+def trades(start, count):
+    return [{"timestamp": f"2024-01-01T00:00:{second:02d}.000Z", "price": 100 + second, "size": 1}
+            for second in range(start, start + count)]
+
+
+@patch("app.api.bitmex.history.BITMEX_HISTORY_PAGE_SIZE", 3)
+@patch("app.api.transport.request")
+def test_download_pages_and_resumes(mock_request, tmp_path):
+    mock_request.side_effect = [httpx.Response(200, json=rows) for rows in (trades(0, 3), trades(3, 2))]
+
+    added = asyncio.run(download("XBTUSD", "trade", start_time="2024-01-01", root=str(tmp_path)))
+
+    assert added == 5
+    store = ColumnStore("XBTUSD", "trade", root=str(tmp_path))
+    assert list(store.read()["ts"]) == list(to_millis([row["timestamp"] for row in trades(0, 5)]))
+
+    # A second run resumes at the newest stored timestamp, past the rows already stored for it
+    mock_request.side_effect = [httpx.Response(200, json=trades(5, 1))]
+    asyncio.run(download("XBTUSD", "trade", root=str(tmp_path)))
+    params = mock_request.call_args.kwargs["params"]
+    assert params["startTime"] == "2024-01-01T00:00:04.000Z" and params["start"] == 1
+    assert len(store) == 6
+
+
+def test_candles_endpoint(tmp_path):
+    store = ColumnStore("XBTUSD", "trade", root=str(tmp_path))
+    store.append(trade_columns([0, 30000, MINUTE, 2 * MINUTE], [1, 3, 2, 5], [1, 1, 1, 1]))
+
+    with patch("app.api.bitmex.history.HISTORY_DIR", str(tmp_path)):
+        response = client.get("/bitmex/history/XBTUSD/candles", params={
+            "interval": "2m", "end_time": "1970-01-01T00:02:00Z",
+        })
+        invalid = client.get("/bitmex/history/XBTUSD/candles", params={"interval": "30s", "kind": "bucket"})
+        malformed = client.get("/bitmex/history/XBTUSD/candles", params={"start_time": "yesterday"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "ts": [0], "open": [1.0], "high": [3.0], "low": [1.0], "close": [2.0], "volume": [3.0], "trades": [3],
+    }
+    assert invalid.status_code == 400
+    assert malformed.status_code == 400
+    assert malformed.json()["detail"] == "start_time and end_time must be ISO 8601 timestamps."
@@ -0,0 +1,205 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+from app.api.bitmex.adapter import adapter
+from app.api.bitmex.idempotency import IdempotencyCache
+from app.api.bitmex.risk import RiskRejection
+from app.main import app, submit_forwarded
+
+client = TestClient(app)
+
+
+def test_duplicates_join_in_flight_submission():
+    async def run():
+        cache = IdempotencyCache(max_size=10, ttl=60)
+        calls = []
+
+        async def submit(recovering):
+            calls.append(recovering)
+            await asyncio.sleep(0.01)
+            return {"orderID": "1"}
+
+        results = await asyncio.gather(*(cache.run("a", submit) for _ in range(5)))
+        assert results == [{"orderID": "1"}] * 5
+        assert calls == [False]
+
+        # Answered submissions are served from the cache
+        assert await cache.run("a", submit) == {"orderID": "1"}
+        assert calls == [False]
+
+    asyncio.run(run())
+
+
+def test_ambiguous_failure_recovers_on_retry():
+    async def run():
+        cache = IdempotencyCache(max_size=10, ttl=60)
+        calls = []
+
+        async def submit(recovering):
+            calls.append(recovering)
+            if len(calls) == 1:
+                raise HTTPException(status_code=504, detail="Upstream request timed out.")
+            return {"orderID": "1"}
+
+        with pytest.raises(HTTPException):
+            await cache.run("a", submit)
+        assert await cache.run("a", submit) == {"orderID": "1"}
+        assert calls == [False, True]
+
+    asyncio.run(run())
+
+
+def test_unresolved_attempts_are_bounded_and_expire():
+    async def run():
+        cache = IdempotencyCache(max_size=2, ttl=60)
+
+        async def submit(recovering):
+            raise HTTPException(status_code=504, detail="Upstream request timed out.")
+
+        for key in "abc":
+            with pytest.raises(HTTPException):
+                await cache.run(key, submit)
+        assert list(cache.unresolved) == ["b", "c"]
+
+        cache.unresolved["c"] = 0
+        recovered = []
+
+        async def place(recovering):
+            recovered.append(recovering)
+            return {"orderID": "1"}
+
+        await cache.run("c", place)
+        await cache.run("b", place)
+        assert recovered == [False, True]
+        assert not cache.unresolved
+
+    asyncio.run(run())
+
+
+def test_rejections_are_cached():
+    async def run():
+        cache = IdempotencyCache(max_size=10, ttl=60)
+        calls = []
+
+        async def submit(recovering):
+            calls.append(recovering)
+            raise HTTPException(status_code=400, detail="Invalid price")
+
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await cache.run("a", submit)
+        assert calls == [False]
+
+    asyncio.run(run())
+
+
+def test_throttled_and_risk_rejected_submissions_are_not_cached():
+    async def run():
+        cache = IdempotencyCache(max_size=10, ttl=60)
+        errors = [HTTPException(status_code=429, detail="Rate limit exceeded"),
+                  RiskRejection(status_code=400, detail="Order exceeds max_position.")]
+        calls = []
+
+        async def submit(recovering):
+            calls.append(recovering)
+            if errors:
+                raise errors.pop(0)
+            return {"orderID": "1"}
+
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await cache.run("a", submit)
+        assert await cache.run("a", submit) == {"orderID": "1"}
+        # Nothing was placed, so no attempt looks the order up first
+        assert calls == [False, False, False]
+
+    asyncio.run(run())
+
+
+def test_cache_is_bounded():
+    async def run():
+        cache = IdempotencyCache(max_size=2, ttl=60)
+
+        async def submit(recovering):
+            return {}
+
+        for key in "abc":
+            await cache.run(key, submit)
+        assert list(cache.entries) == ["b", "c"]
+
+    asyncio.run(run())
+
+
+@patch("app.api.transport.request")
+def test_place_order_deduplicates_by_clordid(mock_post):
+    mock_post.return_value = httpx.Response(200, json={"orderID": "dedup-1", "clOrdID": "client-dedup-1"})
+    order = {"symbol": "XBTUSD", "price": 50000, "orderQty": 1, "clOrdID": "client-dedup-1"}
+
+    first = client.post("/bitmex/orders", json=order)
+    second = client.post("/bitmex/orders", json=order)
+
+    mock_post.assert_called_once()
+    assert first.json() == second.json()
+
+
+@patch.object(adapter, "retries", 0)
+@patch("app.api.transport.request")
+def test_retry_after_rate_limit_reaches_upstream(mock_post):
+    mock_post.side_effect = [
+        httpx.Response(429, headers={"retry-after": "0"}, json={"error": "Rate limit exceeded"}),
+        httpx.Response(200, json={"orderID": "dedup-3", "clOrdID": "client-dedup-3"}),
+    ]
+    order = {"symbol": "XBTUSD", "price": 50000, "orderQty": 1, "clOrdID": "client-dedup-3"}
+
+    assert client.post("/bitmex/orders", json=order).status_code == 429
+    second = client.post("/bitmex/orders", json=order)
+
+    assert mock_post.call_count == 2
+    assert second.json()["orderID"] == "dedup-3"
+
+
+@patch("app.api.transport.request")
+def test_place_order_assigns_clordid(mock_post):
+    mock_post.return_value = httpx.Response(200, json={"orderID": "dedup-2"})
+
+    client.post("/bitmex/orders", json={"symbol": "XBTUSD", "price": 50000, "orderQty": 1},
+                headers={"Idempotency-Key": "key-dedup-2"})
+    client.post("/bitmex/orders", json={"symbol": "XBTUSD", "price": 50000, "orderQty": 1})
+
+    first_body = mock_post.call_args_list[0].kwargs["content"]
+    second_body = mock_post.call_args_list[1].kwargs["content"]
+    assert '"clOrdID":"key-dedup-2"' in first_body
+    assert '"clOrdID":"' in second_body
+
+
+# Workers send orders to the leader, whose cache catches a clOrdID sent to several processes
+@patch("app.api.bitmex.main.cluster")
+def test_workers_submit_through_the_leader(cluster):
+    cluster.is_worker.return_value = True
+    cluster.forward = AsyncMock(return_value=httpx.Response(200, json={"orderID": "dedup-4"}))
+
+    response = client.post("/bitmex/orders", json={"symbol": "XBTUSD", "price": 50000, "orderQty": 1,
+                                                   "clOrdID": "client-dedup-4"})
+
+    assert response.json() == {"orderID": "dedup-4"}
+    assert cluster.forward.await_args.args[:2] == (adapter, "submit")
+    assert '"clOrdID":"client-dedup-4"' in cluster.forward.await_args.args[2]
+
+
+@patch("app.api.transport.request")
+def test_forwarded_submissions_share_the_leaders_cache(mock_post):
+    mock_post.return_value = httpx.Response(200, json={"orderID": "dedup-5", "clOrdID": "client-dedup-5"})
+    call = {"data": '{"symbol":"XBTUSD","orderQty":1,"price":50000.0,"clOrdID":"client-dedup-5"}'}
+
+    async def run():
+        return [await submit_forwarded(adapter, call) for _ in range(2)]
+
+    first, second = asyncio.run(run())
+    mock_post.assert_called_once()
+    assert first.json() == second.json() == {"orderID": "dedup-5", "clOrdID": "client-dedup-5"}
+
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.api.bitmex.adapter import BitmexAdapter
+from app.api.bitmex.killswitch import KillSwitch, kill_seconds
+from app.api.ratelimit import RateLimitGovernor
+from app.main import app
+
+client = TestClient(app)
+
+
+def make_kill_switch():
+    return KillSwitch(BitmexAdapter(api_key="key", secret="secret", account="kill-test"))
+
+
+def test_presign_reuses_signature_until_it_nears_expiry():
+    kill_switch = make_kill_switch()
+
+    headers = kill_switch.presign()
+    expires = int(headers["api-expires"])
+    assert kill_switch.presign() is headers
+    assert headers["api-signature"] == kill_switch.adapter.signer.sign("DELETE", kill_switch.url, expires)
+
+    # Within the safety margin of expiry a new signature is made
+    with patch("app.api.bitmex.killswitch.time.time", return_value=expires - 1):
+        assert kill_switch.presign() is not headers
+
+
+@patch("app.api.transport.request")
+def test_kill_skips_rate_governor(mock_request):
+    mock_request.return_value = httpx.Response(200, json=[{"orderID": "1", "ordStatus": "Canceled"}])
+    kill_switch = make_kill_switch()
+    kill_switch.adapter.governor = AsyncMock(spec=RateLimitGovernor)
+
+    response = asyncio.run(kill_switch.kill())
+
+    assert response.status_code == 200
+    kill_switch.adapter.governor.acquire.assert_not_called()
+    args, kwargs = mock_request.call_args
+    assert args == ("DELETE", kill_switch.url)
+    assert kwargs["headers"]["api-signature"] == kill_switch.presign()["api-signature"]
+    assert ("kill-test", 200) in kill_seconds.series
+
+
+@patch("app.api.transport.request")
+def test_heartbeat_arms_cancel_all_after(mock_request):
+    mock_request.return_value = httpx.Response(200, json={"now": "2024-01-01T00:00:00.000Z"})
+    kill_switch = make_kill_switch()
+
+    asyncio.run(kill_switch.heartbeat(timeout=60))
+
+    args, kwargs = mock_request.call_args
+    assert args == ("POST", kill_switch.adapter.base_url + "/order/cancelAllAfter")
+    assert json.loads(kwargs["content"]) == {"timeout": 60000}
+
+
+@patch("app.api.transport.request")
+def test_kill_endpoint(mock_request):
+    mock_request.return_value = httpx.Response(200, json=[])
+
+    response = client.post("/bitmex/kill")
+
+    assert response.status_code == 200
+    assert mock_request.call_args.args[1].endswith("/order/all")
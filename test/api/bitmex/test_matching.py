@@ -0,0 +1,214 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.api.bitmex.matching import EngineError, MatchingEngine
+
+SYMBOL = "XBTUSD"
+
+
+def order(side, qty, price=None, **fields):
+    return {"symbol": SYMBOL, "side": side, "orderQty": qty, "price": price, **fields}
+
+
+def test_price_time_priority():
+    engine = MatchingEngine()
+    first = engine.submit("maker", order("Sell", 5, 100))
+    second = engine.submit("maker", order("Sell", 5, 100))
+    better = engine.submit("maker", order("Sell", 5, 99))
+
+    taker = engine.submit("taker", order("Buy", 8, 100))
+
+    assert better.ordStatus == "Filled"
+    assert first.cumQty == 3 and first.ordStatus == "PartiallyFilled"
+    assert second.cumQty == 0
+    assert taker.ordStatus == "Filled" and taker.notional / taker.cumQty == pytest.approx((5 * 99 + 3 * 100) / 8)
+    assert engine.position("taker", SYMBOL) == 8 and engine.position("maker", SYMBOL) == -8
+    assert engine.depth(SYMBOL) == {"bids": [], "asks": [[100, 7]]}
+
+
+def test_market_remainder_is_canceled():
+    engine = MatchingEngine()
+    engine.submit("maker", order("Sell", 5, 100))
+
+    taker = engine.submit("taker", order("Buy", 8, ordType="Market"))
+
+    assert taker.cumQty == 5 and taker.ordStatus == "Canceled"
+
+
+def test_time_in_force():
+    engine = MatchingEngine()
+    engine.submit("maker", order("Sell", 5, 100))
+
+    fok = engine.submit("taker", order("Buy", 8, 100, timeInForce="FillOrKill"))
+    assert fok.ordStatus == "Canceled" and fok.cumQty == 0
+
+    ioc = engine.submit("taker", order("Buy", 8, 100, timeInForce="ImmediateOrCancel"))
+    assert ioc.cumQty == 5 and ioc.ordStatus == "Canceled"
+    assert engine.depth(SYMBOL)["bids"] == []
+
+
+def test_post_only_is_canceled_when_it_would_take():
+    engine = MatchingEngine()
+    engine.submit("maker", order("Sell", 5, 100))
+
+    crossing = engine.submit("taker", order("Buy", 1, 100, execInst="ParticipateDoNotInitiate"))
+    resting = engine.submit("taker", order("Buy", 1, 99, execInst="ParticipateDoNotInitiate"))
+
+    assert crossing.ordStatus == "Canceled"
+    assert resting.ordStatus == "New" and resting.workingIndicator
+
+
+def test_all_or_none_only_trades_in_full():
+    engine = MatchingEngine()
+    hidden = engine.submit("maker", order("Sell", 10, 100, execInst="AllOrNone", displayQty=0))
+
+    engine.submit("taker", order("Buy", 5, 100, timeInForce="ImmediateOrCancel"))
+    assert hidden.cumQty == 0
+    assert engine.depth(SYMBOL)["asks"] == [[100, 0]]
+
+    engine.submit("taker", order("Buy", 10, 100))
+    assert hidden.ordStatus == "Filled"
+
+    with pytest.raises(EngineError):
+        engine.submit("maker", order("Sell", 10, 100, execInst="AllOrNone", displayQty=5))
+
+
+def test_reduce_only_and_close():
+    engine = MatchingEngine()
+    engine.submit("maker", order("Sell", 10, 100))
+    engine.submit("trader", order("Buy", 4, 100))
+
+    increasing = engine.submit("trader", order("Buy", 1, 90, execInst="ReduceOnly"))
+    assert increasing.ordStatus == "Canceled"
+
+    engine.submit("maker", order("Buy", 10, 99))
+    close = engine.submit("trader", {"symbol": SYMBOL, "side": "Sell", "ordType": "Market", "execInst": "Close"})
+    assert close.cumQty == 4
+    assert engine.position("trader", SYMBOL) == 0
+
+
+def test_stops_trigger_on_reference_price():
+    engine = MatchingEngine()
+    stop = engine.submit("trader", order("Sell", 2, ordType="Stop", stopPx=95, execInst="LastPrice"))
+    touched = engine.submit("trader", order("Buy", 2, 90, ordType="LimitIfTouched", stopPx=96))
+    assert not stop.workingIndicator and stop.ordStatus == "New"
+
+    engine.submit("maker", order("Buy", 10, 94))
+    engine.set_price(SYMBOL, last=94)
+    assert stop.triggered == "StopOrderTriggered" and stop.ordStatus == "Filled"
+
+    # Mark price is the default trigger reference
+    engine.set_price(SYMBOL, mark=96)
+    assert touched.triggered == "StopOrderTriggered" and touched.workingIndicator
+
+
+def test_trailing_stop_follows_price():
+    engine = MatchingEngine()
+    engine.set_price(SYMBOL, mark=100)
+    trailing = engine.submit("trader", order("Sell", 1, ordType="Stop", pegPriceType="TrailingStopPeg",
+                                              pegOffsetValue=-5))
+    assert trailing.stopPx == 95
+
+    engine.set_price(SYMBOL, mark=110)
+    engine.set_price(SYMBOL, mark=107)
+    assert trailing.stopPx == 105 and trailing.triggered == ""
+
+    engine.set_price(SYMBOL, mark=104)
+    assert trailing.triggered == "StopOrderTriggered"
+
+
+def test_pegged_order_prices_from_the_book():
+    engine = MatchingEngine()
+    engine.submit("maker", order("Buy", 1, 99))
+
+    pegged = engine.submit("trader", order("Buy", 1, ordType="Pegged", pegPriceType="PrimaryPeg", pegOffsetValue=-1))
+    assert pegged.price == 98
+
+    unpriced = engine.submit("trader", order("Sell", 1, ordType="Pegged", pegPriceType="PrimaryPeg"))
+    assert unpriced.ordStatus == "Canceled"
+
+
+def test_one_cancels_the_other():
+    engine = MatchingEngine()
+    take_profit = engine.submit("trader", order("Sell", 1, 110, clOrdLinkID="exit",
+                                                contingencyType="OneCancelsTheOther"))
+    stop_loss = engine.submit("trader", order("Sell", 1, ordType="Stop", stopPx=90, clOrdLinkID="exit",
+                                              contingencyType="OneCancelsTheOther"))
+
+    engine.submit("maker", order("Buy", 1, 110))
+
+    assert take_profit.ordStatus == "Filled"
+    assert stop_loss.ordStatus == "Canceled"
+    assert engine.stops[SYMBOL] == []
+
+
+def test_one_triggers_the_other():
+    engine = MatchingEngine()
+    entry = engine.submit("trader", order("Buy", 1, 100, clOrdLinkID="trade", contingencyType="OneTriggersTheOther"))
+    exit_order = engine.submit("trader", order("Sell", 1, 110, clOrdLinkID="trade"))
+    assert exit_order.held and not exit_order.workingIndicator
+    assert engine.depth(SYMBOL)["asks"] == []
+
+    engine.submit("maker", order("Sell", 1, 100))
+
+    assert entry.ordStatus == "Filled"
+    assert not exit_order.held and exit_order.workingIndicator
+    assert engine.depth(SYMBOL)["asks"] == [[110, 1]]
+
+
+def test_amend_keeps_priority_only_when_reducing():
+    engine = MatchingEngine()
+    first = engine.submit("maker", order("Sell", 5, 100))
+    second = engine.submit("maker", order("Sell", 5, 100))
+
+    engine.amend("maker", {"orderID": first.orderID, "orderQty": 4})
+    assert engine.books[SYMBOL].asks.levels[100] == [first, second]
+
+    engine.amend("maker", {"orderID": first.orderID, "orderQty": 6})
+    assert engine.books[SYMBOL].asks.levels[100] == [second, first]
+
+    engine.amend("maker", {"orderID": second.orderID, "price": 98})
+    taker = engine.submit("taker", order("Buy", 1, 99))
+    assert second.cumQty == 1 and taker.ordStatus == "Filled"
+
+    with pytest.raises(EngineError):
+        engine.amend("other", {"orderID": first.orderID, "price": 1})
+
+
+def test_cancel_and_cancel_all_after():
+    engine = MatchingEngine()
+    resting = engine.submit("trader", order("Buy", 1, 90, clOrdID="mine"))
+    other = engine.submit("trader", order("Buy", 1, 91))
+
+    results = engine.cancel("trader", clordids=["mine", "unknown"])
+    assert results[0]["ordStatus"] == "Canceled" and results[1]["error"] == "Not Found"
+    assert resting.ordStatus == "Canceled"
+
+    armed = engine.cancel_all_after("trader", 1000)
+    assert armed["cancelTime"] is not None
+    with patch("app.api.bitmex.matching.time.time", return_value=engine.now + 2):
+        engine.query("trader")
+    assert other.ordStatus == "Canceled" and other.text == "Canceled: Cancel all after timeout"
+
+
+def test_query_filters_and_pages():
+    engine = MatchingEngine()
+    orders = [engine.submit("trader", order("Buy", 1, 90 + i)) for i in range(5)]
+    engine.cancel("trader", [orders[0].orderID])
+    engine.submit("someone", order("Buy", 1, 80))
+
+    assert len(engine.query("trader")) == 5
+    assert [o.orderID for o in engine.query("trader", filter={"open": True}, count=2, start=1)] == \
+           [orders[2].orderID, orders[3].orderID]
+    assert engine.query("trader", filter={"ordStatus": ["CANCELED"]}) == [orders[0]]
+    assert engine.query("trader", reverse=True, count=1) == [orders[4]]
+
+
+def test_closed_orders_are_forgotten_beyond_limit():
+    engine = MatchingEngine(max_closed=2)
+    orders = [engine.submit("trader", order("Buy", 1, 90, clOrdID=str(i))) for i in range(3)]
+    engine.cancel_all("trader")
+
+    assert orders[0].orderID not in engine.orders and ("trader", "0") not in engine.by_clordid
+    assert orders[2].orderID in engine.orders
@@ -0,0 +1,94 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.bitmex.orderbook import BookGap, OrderBook, OrderBooks, order_books
+from app.main import app
+
+client = TestClient(app)
+
+
+def level(level_id, side, price, size, symbol="XBTUSD"):
+    return {"symbol": symbol, "id": level_id, "side": side, "price": price, "size": size}
+
+
+def partial(symbol="XBTUSD"):
+    return {"table": "orderBookL2", "action": "partial", "data": [
+        level(1, "Sell", 101.0, 10, symbol),
+        level(2, "Sell", 100.5, 5, symbol),
+        level(3, "Buy", 100.0, 7, symbol),
+        level(4, "Buy", 99.5, 3, symbol),
+    ]}
+
+
+def test_book_applies_incremental_updates():
+    book = OrderBook("XBTUSD")
+    book.apply("partial", partial()["data"])
+    book.apply("insert", [level(5, "Buy", 99.8, 1)])
+    assert book.apply("update", [{"symbol": "XBTUSD", "id": 3, "side": "Buy", "size": 9}]) == [["Buy", 100.0, 9]]
+    assert book.apply("delete", [{"symbol": "XBTUSD", "id": 2, "side": "Sell"}]) == [["Sell", 100.5, 0]]
+
+    snapshot = book.snapshot(depth=2)
+    assert snapshot["bids"] == [[100.0, 9], [99.8, 1]]
+    assert snapshot["asks"] == [[101.0, 10]]
+    assert snapshot["sequence"] == 4
+
+
+def test_level_moved_to_another_price_leaves_no_phantom():
+    book = OrderBook("XBTUSD")
+    book.apply("partial", partial()["data"])
+
+    assert book.apply("update", [level(4, "Buy", 99.0, 3)]) == [["Buy", 99.5, 0], ["Buy", 99.0, 3]]
+    assert book.apply("insert", [level(1, "Sell", 102.0, 10)]) == [["Sell", 101.0, 0], ["Sell", 102.0, 10]]
+    assert book.snapshot()["bids"] == [[100.0, 7], [99.0, 3]]
+    assert book.snapshot()["asks"] == [[100.5, 5], [102.0, 10]]
+
+    # Deleting the moved level removes its new price
+    book.apply("delete", [{"symbol": "XBTUSD", "id": 4, "side": "Buy"}])
+    assert book.snapshot()["bids"] == [[100.0, 7]]
+
+
+def test_book_detects_gaps():
+    book = OrderBook("XBTUSD")
+    with pytest.raises(BookGap):
+        book.apply("update", [{"id": 3, "side": "Buy", "size": 1}])
+
+    book.apply("partial", partial()["data"])
+    with pytest.raises(BookGap):
+        book.apply("delete", [{"id": 42, "side": "Buy"}])
+
+    # A bid above the best ask means updates were missed
+    with pytest.raises(BookGap):
+        book.apply("insert", [level(6, "Buy", 102.0, 1)])
+
+
+def test_gap_requests_resnapshot():
+    requested = []
+    books = OrderBooks(resnapshot=requested.append)
+    books.apply_stream_event(partial())
+    books.apply_stream_event({"table": "orderBookL2", "action": "update", "data": [
+        {"symbol": "XBTUSD", "id": 42, "side": "Buy", "size": 1}
+    ]})
+    assert requested == ["XBTUSD"]
+    assert not books.get("XBTUSD").synced
+
+    # The next partial brings the book back
+    books.apply_stream_event(partial())
+    assert books.get("XBTUSD").synced
+
+
+def test_get_orderbook_endpoint():
+    order_books.apply_stream_event(partial("TESTUSD"))
+    try:
+        response = client.get("/bitmex/orderbook/TESTUSD", params={"depth": 1})
+        assert response.status_code == 200
+        assert response.json()["bids"] == [[100.0, 7]]
+        assert response.json()["asks"] == [[100.5, 5]]
+
+        with client.websocket_connect("/bitmex/orderbook/TESTUSD/stream") as websocket:
+            message = websocket.receive_json()
+        assert message["type"] == "snapshot"
+        assert len(message["bids"]) == 2
+    finally:
+        order_books.books.pop("TESTUSD")
+
+    assert client.get("/bitmex/orderbook/UNKNOWN").status_code == 404
@@ -0,0 +1,52 @@
+import asyncio
+
+from app.api.bitmex.pagination import walk_pages
+
+
+def make_fetch(total, calls):
+    async def fetch(params):
+        calls.append(params["start"])
+        end = min(params["start"] + params["count"], total)
+        return [{"orderID": str(i)} for i in range(params["start"], end)]
+
+    return fetch
+
+
+def collect(total, page_size, concurrency, start=0):
+    calls = []
+
+    async def run():
+        pages = walk_pages(make_fetch(total, calls), {"symbol": "XBTUSD"}, page_size, concurrency, start)
+        return [rows async for rows in pages]
+
+    return asyncio.run(run()), calls
+
+
+def test_short_history_costs_one_call():
+    pages, calls = collect(total=3, page_size=10, concurrency=4)
+
+    assert calls == [0]
+    assert [len(rows) for rows in pages] == [3]
+
+
+def test_walks_every_page_in_order():
+    pages, calls = collect(total=95, page_size=10, concurrency=4)
+
+    rows = [row["orderID"] for page in pages for row in page]
+    assert rows == [str(i) for i in range(95)]
+    # Window widens 1, 2, 4 pages and stops after the short page
+    assert calls == [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+
+
+def test_exact_multiple_ends_with_empty_page():
+    pages, calls = collect(total=20, page_size=10, concurrency=1, start=0)
+
+    assert [len(rows) for rows in pages] == [10, 10, 0]
+    assert calls == [0, 10, 20]
+
+
+def test_starts_from_offset():
+    pages, calls = collect(total=25, page_size=10, concurrency=2, start=5)
+
+    assert [row["orderID"] for page in pages for row in page][0] == "5"
+    assert calls[0] == 5
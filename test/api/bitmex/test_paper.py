@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.api.bitmex.accounts import accounts
+from app.api.bitmex.matching import MatchingEngine
+from app.api.bitmex.paper import PaperAdapter
+from app.api.bitmex.positions import PositionEngine
+from app.api.cluster import cluster
+from app.main import app, apply_paper_execution, apply_relayed_paper_execution
+
+client = TestClient(app)
+
+
+def paper_accounts():
+    engine = MatchingEngine()
+    return {
+        "alice": PaperAdapter(engine, account="alice"),
+        "bob": PaperAdapter(engine, account="bob"),
+    }
+
+
+def test_orders_match_across_accounts_through_the_endpoints():
+    with patch.dict(accounts.adapters, paper_accounts()):
+        resting = client.post("/bitmex/accounts/alice/orders", json={
+            "symbol": "XBTUSD", "side": "Sell", "orderQty": 10, "price": 50000, "clOrdID": "ask-1",
+        })
+        assert resting.status_code == 200 and resting.json()["ordStatus"] == "New"
+
+        taker = client.post("/bitmex/accounts/bob/orders", json={
+            "symbol": "XBTUSD", "side": "Buy", "orderQty": 4, "ordType": "Market",
+        })
+        assert taker.json()["ordStatus"] == "Filled" and taker.json()["avgPx"] == 50000
+
+        orders = client.get("/bitmex/accounts/alice/orders", params={"fresh": True, "columns": ["leavesQty"]})
+        assert orders.json() == [{"orderID": resting.json()["orderID"], "leavesQty": 6}]
+
+        amended = client.put("/bitmex/accounts/alice/orders", json={"orderID": resting.json()["orderID"], "price": 50100})
+        assert amended.json()["price"] == 50100
+
+        canceled = client.post("/bitmex/accounts/alice/kill")
+        assert [order["ordStatus"] for order in canceled.json()] == ["Canceled"]
+
+
+def test_engine_errors_map_to_status_codes():
+    with patch.dict(accounts.adapters, paper_accounts()):
+        response = client.put("/bitmex/accounts/alice/orders", json={"orderID": "missing", "price": 1})
+        assert response.status_code == 404
+        assert response.json() == {"detail": {"error": {"message": "Not Found", "name": "HTTPError"}}}
+
+        response = client.post("/bitmex/accounts/alice/orders", json={"symbol": "XBTUSD", "price": 1})
+        assert response.status_code == 400
+
+
+def test_bulk_and_paginated_history():
+    with patch.dict(accounts.adapters, paper_accounts()):
+        orders = [{"symbol": "XBTUSD", "side": "Buy", "orderQty": 1, "price": 100 + i} for i in range(7)]
+        response = client.post("/bitmex/accounts/alice/orders/bulk", json=orders)
+        assert response.json()["failed"] == 0
+
+        streamed = client.get("/bitmex/accounts/alice/orders", params={"paginate": True, "count": 3})
+        assert len(streamed.text.splitlines()) == 7
+
+
+def test_paper_fills_are_relayed_to_workers():
+    execution = {"execID": "e1", "orderID": "o1", "account": 7, "symbol": "XBTUSD", "side": "Buy",
+                 "execType": "Trade", "lastQty": 10, "lastPx": 50000, "cumQty": 10, "avgPx": 50000}
+    leader, worker = PositionEngine(), PositionEngine()
+
+    with patch("app.main.positions", leader), patch.dict("app.main.paper_engine.account_names", {7: "alice"}), \
+            patch.object(cluster, "publish") as publish:
+        apply_paper_execution(execution)
+    channel, relayed = publish.call_args.args
+    assert channel == "paper" and relayed["account"] == "alice"
+
+    # Workers apply the fill under the account name, their engine never saw the account id
+    with patch("app.main.positions", worker):
+        apply_relayed_paper_execution(relayed)
+    assert worker.query("alice", "XBTUSD") == leader.query("alice", "XBTUSD")
+    assert worker.query("alice", "XBTUSD")[0]["currentQty"] == 10
+
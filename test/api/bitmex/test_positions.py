@@ -0,0 +1,129 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.api.bitmex.positions import PositionEngine
+from app.main import app
+
+client = TestClient(app)
+
+CONTRACTS = {"XBTUSD": {"inverse": True, "multiplier": 1}, "XBTUSDT": {"multiplier": 0.000001}}
+
+
+def execution(order_id, side, last_qty, last_px, cum_qty, avg_px, **fields):
+    row = {
+        "execID": f"{order_id}-{cum_qty}",
+        "orderID": order_id,
+        "symbol": "ETHUSD",
+        "side": side,
+        "execType": "Trade",
+        "lastQty": last_qty,
+        "lastPx": last_px,
+        "cumQty": cum_qty,
+        "avgPx": avg_px,
+    }
+    row.update(fields)
+    return row
+
+
+def position(engine, symbol="ETHUSD", account="default"):
+    return engine.query(account, symbol)[0]
+
+
+def test_linear_average_entry_and_realised_pnl():
+    engine = PositionEngine(contracts=CONTRACTS)
+    engine.fill("default", "ETHUSD", 10, 100)
+    engine.fill("default", "ETHUSD", 10, 110)
+    assert position(engine)["avgEntryPrice"] == pytest.approx(105)
+
+    engine.fill("default", "ETHUSD", -5, 120)
+    result = position(engine)
+    assert result["currentQty"] == 15
+    assert result["realisedPnl"] == pytest.approx(75)
+    assert result["avgEntryPrice"] == pytest.approx(105)
+    assert result["unrealisedPnl"] == pytest.approx(15 * 15)
+    assert result["exposure"] == pytest.approx(15 * 120)
+
+    # Selling through zero flips the position at the fill price
+    engine.fill("default", "ETHUSD", -25, 100)
+    result = position(engine)
+    assert result["currentQty"] == -10
+    assert result["avgEntryPrice"] == pytest.approx(100)
+    assert result["realisedPnl"] == pytest.approx(75 - 15 * 5)
+    assert result["volume"] == 50
+
+
+def test_inverse_and_multiplied_contracts():
+    engine = PositionEngine(contracts=CONTRACTS)
+    engine.fill("default", "XBTUSD", 10000, 50000)
+    engine.fill("default", "XBTUSD", 10000, 40000)
+    result = position(engine, "XBTUSD")
+    # Harmonic average of the entries, PnL in coin
+    assert result["avgEntryPrice"] == pytest.approx(20000 / (10000 / 50000 + 10000 / 40000))
+    engine.fill("default", "XBTUSD", -20000, 50000)
+    result = position(engine, "XBTUSD")
+    assert result["currentQty"] == 0
+    assert result["avgEntryPrice"] is None
+    assert result["realisedPnl"] == pytest.approx(10000 / 40000 - 10000 / 50000)
+
+    engine.fill("default", "XBTUSDT", -1000000, 60000)
+    engine.marks["XBTUSDT"] = 59000
+    assert position(engine, "XBTUSDT")["unrealisedPnl"] == pytest.approx(1000)
+
+
+def test_fills_reported_by_response_and_stream_count_once():
+    engine = PositionEngine(contracts=CONTRACTS)
+    order = {"orderID": "1", "symbol": "ETHUSD", "side": "Buy", "cumQty": 10, "avgPx": 101, "ordStatus": "Filled"}
+
+    # Two executions stream in after the order response already reported both fills
+    engine.apply_orders("default", [order])
+    engine.apply_stream_event({"table": "execution", "action": "insert", "data": [
+        execution("1", "Buy", 4, 100, 4, 100, execComm=10),
+        execution("1", "Buy", 6, 102, 10, 101.2, execComm=15),
+    ]})
+    result = position(engine)
+    assert result["currentQty"] == 10
+    assert result["avgEntryPrice"] == pytest.approx(101)
+    assert result["commission"] == 25
+
+    # A partial on reconnect replays known orders without counting them again, unknown ones are history
+    engine.apply_stream_event({"table": "execution", "action": "partial", "data": [
+        execution("1", "Buy", 6, 102, 10, 101.2, execComm=15),
+        execution("0", "Sell", 5, 90, 5, 90),
+    ]})
+    assert position(engine)["currentQty"] == 10
+    assert position(engine)["commission"] == 25
+
+    # Stream first: only the remainder of the order response is applied
+    engine.apply_stream_event({"table": "execution", "action": "insert",
+                               "data": [execution("2", "Sell", 5, 110, 5, 110)]})
+    engine.apply_orders("default", {"orderID": "2", "symbol": "ETHUSD", "side": "Sell", "cumQty": 8, "avgPx": 111.5})
+    result = position(engine)
+    assert result["currentQty"] == 2
+    assert result["realisedPnl"] == pytest.approx(5 * 9 + 3 * (114 - 101))
+
+
+def test_marks_from_quotes():
+    engine = PositionEngine(contracts=CONTRACTS)
+    engine.fill("default", "ETHUSD", 1, 100)
+    engine.apply_stream_event({"table": "quote", "action": "insert",
+                               "data": [{"symbol": "ETHUSD", "bidPrice": 109, "askPrice": 111}]})
+    result = position(engine)
+    assert result["markPrice"] == 110
+    assert result["unrealisedPnl"] == pytest.approx(10)
+
+
+@patch("app.api.transport.request")
+def test_place_order_updates_positions(mock_post):
+    mock_post.return_value = httpx.Response(200, json={
+        "orderID": "positions-1", "symbol": "POSUSD", "side": "Sell", "cumQty": 3, "avgPx": 20, "ordStatus": "Filled",
+    })
+    response = client.post("/bitmex/orders", json={"symbol": "POSUSD", "orderQty": 3, "side": "Sell"})
+    assert response.status_code == 200
+
+    response = client.get("/bitmex/positions", params={"symbol": "POSUSD"})
+    assert response.status_code == 200
+    assert response.json()[0]["currentQty"] == -3
+    assert response.json()[0]["avgEntryPrice"] == 20
+    assert client.get("/bitmex/positions", params={"symbol": "OTHER"}).json() == []
@@ -0,0 +1,53 @@
+import json
+from unittest.mock import patch
+
+import orjson
+
+from app.api.bitmex.replay import main, replay
+from app.api.journal import Record, encode
+
+URL = "https://testnet.bitmex.com/api/v1"
+
+
+def record(time, verb, path, response, status=200, account="default"):
+    meta = {"account": account, "verb": verb, "url": URL + path, "query": None}
+    return Record(time, status, meta, b"", orjson.dumps(response))
+
+
+def order(order_id, status, working, **fields):
+    return {"orderID": order_id, "symbol": "XBTUSD", "ordStatus": status, "workingIndicator": working, **fields}
+
+
+def test_replay_rebuilds_orders_per_account():
+    stores = replay([
+        record(1, "POST", "/order", order("1", "New", True)),
+        record(2, "POST", "/order/bulk", [order("2", "New", True), order("3", "Filled", False)]),
+        record(3, "POST", "/order", order("4", "New", True), account="desk"),
+        # Failed calls and other endpoints do not touch the orders
+        record(4, "DELETE", "/order", {"error": {"message": "Not Found"}}, status=404),
+        record(5, "POST", "/order/cancelAllAfter", {"now": "x", "cancelTime": "y"}),
+        record(6, "DELETE", "/order/all", [order("1", "Canceled", False)]),
+    ])
+    assert set(stores) == {"default", "desk"}
+    assert stores["default"].working == {"2"}
+    assert stores["default"].get("1")["ordStatus"] == "Canceled"
+    assert list(stores["desk"].orders) == ["4"]
+
+
+@patch("app.api.bitmex.store.BITMEX_ORDER_CACHE_MAX_CLOSED", 1)
+def test_replay_keeps_every_closed_order():
+    stores = replay([record(time, "POST", "/order", order(str(time), "Filled", False)) for time in range(3)])
+    assert len(stores["default"].orders) == 3
+
+
+def test_main_prints_a_summary(tmp_path, capsys):
+    with open(tmp_path / "bitmex-1.0-1.journal", "wb") as file:
+        for time, status in ((1.0, "New"), (2.0, "Filled")):
+            meta = {"account": "default", "verb": "POST", "url": URL + "/order", "query": None}
+            file.write(encode(time, 200, meta, b"{}", orjson.dumps(order(str(time), status, status == "New"))))
+
+    main([str(tmp_path)])
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["orders"] == 2
+    assert summary["working"] == 1
+    assert summary["statuses"] == {"new": 1, "filled": 1}
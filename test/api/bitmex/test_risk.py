@@ -0,0 +1,147 @@
+import copy
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.api.bitmex.orderbook import OrderBooks
+from app.api.bitmex.positions import PositionEngine
+from app.api.bitmex.risk import RiskChecks, subscribe_marks
+from app.api.bitmex.schemas import AmendRequest, OrderRequest
+from app.api.bitmex.store import OrderStore
+from app.main import app
+
+client = TestClient(app)
+
+LIMITS = {
+    "symbols": {"XBTUSD": {"max_qty": 1000, "max_notional": 0.5, "price_band": 0.05, "max_open_orders": 2}},
+    "accounts": {"*": {"max_exposure": 1, "max_open_orders": 3}},
+}
+
+
+def checks(limits=LIMITS):
+    positions = PositionEngine(contracts={"XBTUSD": {"inverse": True}})
+    positions.marks["XBTUSD"] = 10000
+    return RiskChecks(copy.deepcopy(limits), positions=positions, order_store=OrderStore(), order_books=OrderBooks())
+
+
+def rejected(risk, order, account="default") -> str:
+    with pytest.raises(HTTPException) as exc_info:
+        risk.check(order, account)
+    assert exc_info.value.status_code == 400
+    return exc_info.value.detail
+
+
+def test_symbol_limits():
+    risk = checks()
+    risk.check(OrderRequest(symbol="XBTUSD", orderQty=1000, price=10100), "default")
+
+    assert "quantity" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=1001, price=10000))
+    assert "reference price" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=1, price=11000))
+    risk.symbols["XBTUSD"]["max_qty"] = 10000
+    assert "value" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=6000, ordType="Market"))
+
+    # Symbols without limits of their own and without "*" only count toward the account limits
+    assert "exposure" in rejected(risk, OrderRequest(symbol="ETHUSD", orderQty=10 ** 9, price=1))
+    checks({"symbols": LIMITS["symbols"]}).check(OrderRequest(symbol="ETHUSD", orderQty=10 ** 9, price=1), "default")
+
+
+def test_orders_without_a_price_fail_closed():
+    risk = checks()
+    risk.positions.marks.clear()
+
+    # Nothing to value a market order at, or to check a limit price against
+    assert "No price" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=1, ordType="Market"))
+    assert "No reference price" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=1, price=10000))
+
+    # Without those limits the order goes through
+    risk.symbols["XBTUSD"].pop("price_band")
+    risk.check(OrderRequest(symbol="XBTUSD", orderQty=1, price=10000), "default")
+    risk.symbols["XBTUSD"].pop("max_notional")
+    assert "No price" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=1, ordType="Market"))
+    risk.accounts["*"].pop("max_exposure")
+    risk.check(OrderRequest(symbol="XBTUSD", orderQty=1, ordType="Market"), "default")
+
+
+def test_checks_price_at_stream_fed_marks():
+    risk = checks()
+    risk.positions.marks.clear()
+    risk.positions.apply_stream_event({"table": "instrument", "action": "update",
+                                       "data": [{"symbol": "XBTUSD", "markPrice": 20000}]})
+
+    # The band is taken around the streamed mark, market orders are valued at it
+    risk.check(OrderRequest(symbol="XBTUSD", orderQty=1000, price=20500), "default")
+    assert "reference price" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=1, price=10000))
+    risk.symbols["XBTUSD"].pop("max_notional")
+    risk.check(OrderRequest(symbol="XBTUSD", orderQty=1000, ordType="Market"), "default")
+    # 30000 contracts at 20000 are worth 1.5 XBT, over the account's exposure of 1
+    risk.symbols["XBTUSD"]["max_qty"] = 10 ** 6
+    assert "exposure" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=30000, ordType="Market"))
+
+
+def test_subscribes_instruments_with_limits():
+    with patch("app.api.bitmex.risk.BITMEX_RISK_LIMITS", LIMITS), \
+            patch("app.api.bitmex.risk.stream.tables_to_subscribe", []) as tables:
+        subscribe_marks()
+        subscribe_marks()
+    assert tables == ["instrument:XBTUSD"]
+
+
+def test_open_order_caps_need_a_fresh_store():
+    risk = checks()
+    order = OrderRequest(symbol="XBTUSD", orderQty=1, price=10000)
+    for order_id in ("1", "2"):
+        risk.order_store.upsert({"orderID": order_id, "symbol": "XBTUSD", "workingIndicator": True})
+    risk.check(order, "default")
+
+    risk.order_store.synced_at = time.monotonic()
+    assert "open orders" in rejected(risk, order)
+    # Not known for other accounts
+    risk.check(order, "other")
+
+    risk.symbols["XBTUSD"]["max_open_orders"] = 10
+    risk.order_store.upsert({"orderID": "3", "symbol": "ETHUSD", "workingIndicator": True})
+    assert "Account 'default'" in rejected(risk, order)
+
+
+def test_exposure_limit_lets_reducing_orders_through():
+    risk = checks({"accounts": {"default": {"max_exposure": 1}}})
+    risk.positions.fill("default", "XBTUSD", 8000, 10000)
+
+    assert "exposure" in rejected(risk, OrderRequest(symbol="XBTUSD", orderQty=3000, price=10000))
+    risk.check(OrderRequest(symbol="XBTUSD", orderQty=1900, price=10000), "default")
+    risk.check(OrderRequest(symbol="XBTUSD", side="Sell", orderQty=8000, price=10000), "default")
+    assert "exposure" in rejected(risk, OrderRequest(symbol="XBTUSD", side="Sell", orderQty=19000, price=10000))
+
+
+def test_amends_are_checked_against_the_stored_order():
+    risk = checks()
+    risk.order_store.upsert({"orderID": "1", "symbol": "XBTUSD", "orderQty": 10, "price": 10000})
+    risk.check_amend(AmendRequest(orderID="1", price=10200), "default")
+    with pytest.raises(HTTPException):
+        risk.check_amend(AmendRequest(orderID="1", price=12000), "default")
+    with pytest.raises(HTTPException):
+        risk.check_amend(AmendRequest(orderID="1", orderQty=5000), "default")
+    risk.check_amend(AmendRequest(orderID="unknown", price=1), "default")
+
+
+@patch("app.api.transport.request")
+def test_rejected_orders_are_not_sent(mock_post):
+    with patch("app.api.bitmex.main.risk", checks()):
+        response = client.post("/bitmex/orders", json={"symbol": "XBTUSD", "orderQty": 5000, "price": 10000})
+        assert response.status_code == 400
+        mock_post.assert_not_called()
+
+        mock_post.return_value = httpx.Response(200, json=[{"orderID": "1"}])
+        response = client.post("/bitmex/orders/bulk", json=[
+            {"symbol": "XBTUSD", "orderQty": 5000, "price": 10000},
+            {"symbol": "XBTUSD", "orderQty": 10, "price": 10000},
+        ])
+    assert response.status_code == 207
+    results = response.json()["results"]
+    assert results[0]["index"] == 0 and results[0]["status_code"] == 400
+    assert results[1] == {"index": 1, "status_code": 200, "order": {"orderID": "1"}}
+    assert mock_post.call_count == 1
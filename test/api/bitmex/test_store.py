@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+from app.api.bitmex.enums import OrderState
+from app.api.bitmex.store import OrderStore, RECONCILE_PAGE_SIZE
+
+
+def order(order_id, **fields):
+    row = {
+        "orderID": order_id,
+        "clOrdID": "cl-" + order_id,
+        "symbol": "XBTUSD",
+        "ordStatus": "New",
+        "workingIndicator": True,
+        "timestamp": "2025-01-01T00:00:00.000Z",
+    }
+    row.update(fields)
+    return row
+
+
+def test_upsert_indexes_orders():
+    store = OrderStore()
+    store.upsert([order("1"), order("2", symbol="ETHUSD")])
+    store.upsert({"orderID": "1", "ordStatus": "Filled", "workingIndicator": False})
+
+    assert store.get_by_clordid("cl-1")["ordStatus"] == "Filled"
+    assert [row["orderID"] for row in store.query(symbol="ETHUSD")] == ["2"]
+    assert [row["orderID"] for row in store.query(state=[OrderState.FILLED])] == ["1"]
+    assert [row["orderID"] for row in store.query(active=True)] == ["2"]
+
+
+def test_closed_orders_are_bounded():
+    store = OrderStore(max_closed=2)
+    store.upsert([order(str(i)) for i in range(4)])
+    for order_id in ("0", "1", "2"):
+        store.upsert({"orderID": order_id, "ordStatus": "Canceled", "workingIndicator": False})
+
+    # The oldest closed order is gone from every index, working orders are never evicted
+    assert set(store.orders) == {"1", "2", "3"}
+    assert store.get_by_clordid("cl-0") is None
+    assert "0" not in store.by_symbol["XBTUSD"] and "0" not in store.by_status["canceled"]
+    assert [row["orderID"] for row in store.query(active=True)] == ["3"]
+
+
+def test_upsert_ignores_rows_without_order_id():
+    store = OrderStore()
+    store.upsert({"error": "Invalid ID"})
+    assert store.orders == {}
+
+
+def test_partially_filled_state_matches_exchange_status():
+    store = OrderStore()
+    store.upsert(order("1", ordStatus="PartiallyFilled"))
+    assert len(store.query(state=[OrderState.PARTIALLY_FILLED])) == 1
+
+
+def test_can_serve_respects_staleness():
+    store = OrderStore(max_age=5)
+    store.upsert(order("1"))
+    assert not store.can_serve(order_ids=["1"])
+
+    store.synced_at = time.monotonic()
+    assert store.can_serve(order_ids=["1"])
+    assert not store.can_serve(order_ids=["1", "2"])
+    assert store.can_serve(active=True)
+    assert not store.can_serve()
+
+    store.synced_at = time.monotonic() - 10
+    assert not store.can_serve(order_ids=["1"])
+
+
+def test_reconcile_loads_open_orders_then_deltas():
+    store = OrderStore()
+    calls = []
+
+    async def fetch(params):
+        calls.append(params)
+        if len(calls) == 1:
+            return [order(str(i)) for i in range(RECONCILE_PAGE_SIZE)]
+        if len(calls) == 2:
+            return [order("last", timestamp="2025-01-02T00:00:00.000Z")]
+        return []
+
+    asyncio.run(store.reconcile(fetch))
+    assert calls[0] == {"count": RECONCILE_PAGE_SIZE, "filter": '{"open":true}', "start": 0}
+    assert calls[1]["start"] == RECONCILE_PAGE_SIZE
+    assert len(store.orders) == RECONCILE_PAGE_SIZE + 1
+    assert store.is_fresh()
+
+    asyncio.run(store.reconcile(fetch))
+    assert calls[2] == {"count": RECONCILE_PAGE_SIZE, "startTime": "2025-01-02T00:00:00.000Z", "start": 0}
+
+
+def test_write_through_does_not_move_reconcile_start():
+    store = OrderStore()
+    calls = []
+
+    async def fetch(params):
+        calls.append(params)
+        if len(calls) == 1:
+            return [order("1", timestamp="2025-01-01T00:00:00.000Z")]
+        return []
+
+    asyncio.run(store.reconcile(fetch))
+    # A response written through is newer than a change made elsewhere that no reconciliation has seen yet
+    store.upsert(order("2", timestamp="2025-01-01T00:00:10.000Z"))
+
+    asyncio.run(store.reconcile(fetch))
+    assert calls[1]["startTime"] == "2025-01-01T00:00:00.000Z"
+    assert store.last_timestamp == "2025-01-01T00:00:10.000Z"
+
+
+def test_reconcile_listeners_and_apply_sync():
+    store = OrderStore()
+    synced = []
+    store.listeners.append(synced.append)
+
+    async def fetch(params):
+        return [order("1")]
+
+    assert store.snapshot() is None
+    asyncio.run(store.reconcile(fetch))
+    assert synced == [[order("1")]]
+
+    # Another store picks the state up as fresh as it was
+    mirror = OrderStore()
+    mirror.apply_sync(store.snapshot())
+    assert mirror.get("1") == order("1")
+    assert mirror.can_serve(active=True)
+
+
+def test_apply_stream_event():
+    store = OrderStore()
+    store.apply_stream_event({"table": "order", "action": "insert", "data": [order("1")]})
+    store.apply_stream_event({"table": "order", "action": "delete", "data": [{"orderID": "1"}]})
+    store.apply_stream_event({"table": "execution", "action": "insert", "data": [order("2")]})
+    assert store.orders == {}
@@ -0,0 +1,128 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.api.bitmex.stream import BitmexStream, stream
+from app.main import app
+
+client = TestClient(app)
+
+
+def partial_message():
+    return {
+        "table": "order",
+        "action": "partial",
+        "keys": ["orderID"],
+        "data": [
+            {"orderID": "1", "ordStatus": "New", "price": 100},
+            {"orderID": "2", "ordStatus": "New", "price": 101},
+        ],
+    }
+
+
+def test_handle_message_maintains_table():
+    feed = BitmexStream(url="wss://example.com/realtime")
+    feed.handle_message(partial_message())
+    feed.handle_message({"table": "order", "action": "insert", "data": [{"orderID": "3", "ordStatus": "New"}]})
+    feed.handle_message({"table": "order", "action": "update", "data": [{"orderID": "1", "ordStatus": "Filled"}]})
+    feed.handle_message({"table": "order", "action": "delete", "data": [{"orderID": "2"}]})
+
+    assert feed.snapshot("order") == [
+        {"orderID": "1", "ordStatus": "Filled", "price": 100},
+        {"orderID": "3", "ordStatus": "New"},
+    ]
+
+
+def test_handle_message_ignores_updates_before_partial():
+    feed = BitmexStream(url="wss://example.com/realtime")
+    feed.handle_message({"table": "order", "action": "insert", "data": [{"orderID": "1"}]})
+    assert feed.snapshot("order") == []
+
+
+def test_handle_message_bounds_table_size():
+    feed = BitmexStream(url="wss://example.com/realtime", max_rows=2)
+    feed.handle_message(partial_message())
+    feed.handle_message({"table": "order", "action": "insert", "data": [{"orderID": "3"}]})
+    assert [row["orderID"] for row in feed.snapshot("order")] == ["2", "3"]
+
+
+def test_publish_fans_out_to_all_subscribers():
+    async def run():
+        feed = BitmexStream(url="wss://example.com/realtime", queue_size=1)
+        first, second = feed.subscribe(), feed.subscribe()
+        feed.handle_message(partial_message())
+        feed.handle_message({"table": "order", "action": "delete", "data": [{"orderID": "2"}]})
+
+        # Full queues keep the most recent event
+        for queue in (first, second):
+            assert queue.qsize() == 1
+            assert queue.get_nowait()["action"] == "delete"
+
+    asyncio.run(run())
+
+
+def test_unstored_tables_only_reach_listeners():
+    async def run():
+        feed = BitmexStream(url="wss://example.com/realtime")
+        queue = feed.subscribe()
+        received = []
+        feed.listeners.append(received.append)
+        feed.handle_message({"table": "orderBookL2", "action": "update", "data": [{"symbol": "XBTUSD", "id": 1}]})
+
+        assert [event["table"] for event in received] == ["orderBookL2"]
+        assert queue.empty()
+
+    asyncio.run(run())
+
+
+def test_subscribers_only_get_their_tables():
+    async def run():
+        feed = BitmexStream(url="wss://example.com/realtime")
+        queue = feed.subscribe(["order"])
+        feed.handle_message({"table": "quote", "action": "partial", "data": [{"symbol": "XBTUSD"}]})
+        feed.handle_message(partial_message())
+        assert queue.qsize() == 1
+        assert queue.get_nowait()["table"] == "order"
+
+    asyncio.run(run())
+
+
+def test_stream_endpoint_sends_snapshot():
+    stream.handle_message(partial_message())
+    try:
+        with client.websocket_connect("/bitmex/stream?tables=order") as websocket:
+            message = websocket.receive_json()
+        assert message["table"] == "order"
+        assert message["action"] == "partial"
+        assert [row["orderID"] for row in message["data"]] == ["1", "2"]
+    finally:
+        stream.tables.clear()
+
+
+def test_stream_endpoint_defaults_to_order_tables():
+    stream.handle_message(partial_message())
+    stream.tables_to_subscribe.append("quote:TESTUSD")
+    try:
+        with client.websocket_connect("/bitmex/stream") as websocket:
+            tables = [websocket.receive_json()["table"] for _ in range(2)]
+        assert tables == ["order", "execution"]
+    finally:
+        stream.tables_to_subscribe.remove("quote:TESTUSD")
+        stream.tables.clear()
+
+
+def test_stream_endpoint_strips_topic_symbols():
+    stream.handle_message(partial_message())
+    try:
+        with client.websocket_connect("/bitmex/stream?tables=order:XBTUSD") as websocket:
+            message = websocket.receive_json()
+        assert (message["table"], len(message["data"])) == ("order", 2)
+    finally:
+        stream.tables.clear()
+
+
+def test_stream_copies_the_configured_tables():
+    tables = ["order"]
+    feed = BitmexStream(url="wss://example.com/realtime", tables=tables)
+    feed.tables_to_subscribe.append("quote:XBTUSD")
+    assert tables == ["order"]
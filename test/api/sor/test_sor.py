@@ -0,0 +1,100 @@
+import httpx
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.api.sor.main import plan_routes
+from app.api.sor.quotes import quote_book
+from app.api.sor.schemas import RoutedOrderRequest
+from app.main import app
+from app.settings import BINANCE_BASE_URL
+
+client = TestClient(app)
+
+SYMBOLS = {"BTC-USD": {"bitmex": {"symbol": "XBTUSD"}, "binance": {"symbol": "BTCUSDT"}}}
+FEES = {"bitmex": 0.001, "binance": 0.0}
+
+
+def setup_function():
+    quote_book.quotes.clear()
+    quote_book.update("bitmex", "XBTUSD", 99.9, 5, 100.0, 5)
+    quote_book.update("binance", "BTCUSDT", 99.8, 3, 100.05, 3)
+
+
+def test_plan_routes_uses_fee_adjusted_price():
+    # Bitmex asks less but its fee makes Binance cheaper (100.1 vs 100.05)
+    request = RoutedOrderRequest(symbol="BTC-USD", side="Buy", orderQty=2)
+    routes = plan_routes(request, SYMBOLS["BTC-USD"], FEES, max_age=5)
+    assert [(route["venue"], route["orderQty"]) for route in routes] == [("binance", 2)]
+
+    # Without fees, selling goes to the higher Bitmex bid
+    request = RoutedOrderRequest(symbol="BTC-USD", side="Sell", orderQty=2)
+    routes = plan_routes(request, SYMBOLS["BTC-USD"], {"bitmex": 0.0, "binance": 0.0}, max_age=5)
+    assert routes[0]["venue"] == "bitmex"
+
+
+def test_plan_routes_splits_by_top_of_book_size():
+    request = RoutedOrderRequest(symbol="BTC-USD", side="Buy", orderQty=10, split=True)
+    routes = plan_routes(request, SYMBOLS["BTC-USD"], FEES, max_age=5)
+
+    # 3 at Binance (best), 5 at Bitmex, the remaining 2 go to the best venue
+    assert [(route["venue"], route["orderQty"]) for route in routes] == [("binance", 5), ("bitmex", 5)]
+
+
+def test_plan_routes_rounds_children_to_lot_sizes():
+    symbols = {"bitmex": {"symbol": "XBTUSD"}, "binance": {"symbol": "BTCUSDT", "step": 0.001}}
+    request = RoutedOrderRequest(symbol="BTC-USD", side="Buy", orderQty=7.2555, split=True)
+    routes = plan_routes(request, symbols, FEES, max_age=5)
+
+    # 3 at Binance, 4.2555 at Bitmex rounds down to 4 contracts, the 0.2555 carried back to Binance to 0.255
+    assert [(route["venue"], route["orderQty"]) for route in routes] == [("binance", 3.255), ("bitmex", 4)]
+
+    # Too small for a Bitmex contract, the order goes to the next venue
+    request = RoutedOrderRequest(symbol="BTC-USD", side="Sell", orderQty=0.5)
+    routes = plan_routes(request, symbols, FEES, max_age=5)
+    assert [(route["venue"], route["orderQty"]) for route in routes] == [("binance", 0.5)]
+
+
+def test_plan_routes_skips_venues_outside_limit_and_stale_quotes():
+    # Bitmex asks 100.0, within the limit, but pays 100.1 with its fee
+    request = RoutedOrderRequest(symbol="BTC-USD", side="Buy", orderQty=1, price=100.06)
+    routes = plan_routes(request, SYMBOLS["BTC-USD"], FEES, max_age=5)
+    assert [route["venue"] for route in routes] == ["binance"]
+
+    assert plan_routes(request, SYMBOLS["BTC-USD"], FEES, max_age=-1) == []
+
+
+@patch("app.api.sor.main.SOR_FEES", FEES)
+@patch("app.api.sor.main.SOR_SYMBOLS", SYMBOLS)
+@patch("app.api.transport.request")
+def test_route_order_places_on_best_venue(mock_request):
+    mock_request.return_value = httpx.Response(200, json={"orderId": 1, "status": "NEW"})
+
+    response = client.post("/orders", json={"symbol": "BTC-USD", "side": "Buy", "orderQty": 2})
+
+    mock_request.assert_called_once()
+    args, kwargs = mock_request.call_args
+    assert args[1].startswith(BINANCE_BASE_URL + "/api/v3/order?")
+    assert response.status_code == 200
+    assert response.json()["routes"][0]["order"] == {"orderId": 1, "status": "NEW"}
+
+
+@patch("app.api.sor.main.SOR_SYMBOLS", SYMBOLS)
+def test_route_order_without_quotes():
+    quote_book.quotes.clear()
+    response = client.post("/orders", json={"symbol": "BTC-USD", "side": "Buy", "orderQty": 2})
+    assert response.status_code == 503
+
+
+def test_route_order_unknown_symbol():
+    response = client.post("/orders", json={"symbol": "DOGE-USD", "side": "Buy", "orderQty": 2})
+    assert response.status_code == 400
+
+
+def test_quote_book_applies_stream_events():
+    quote_book.apply_bitmex_event({"table": "quote", "action": "insert", "data": [
+        {"symbol": "XBTUSD", "bidPrice": 1.0, "bidSize": 2, "askPrice": 3.0, "askSize": 4}
+    ]})
+    quote_book.apply_binance_event({"s": "BTCUSDT", "b": "5.0", "B": "6", "a": "7.0", "A": "8"})
+
+    assert quote_book.get("bitmex", "XBTUSD", max_age=5)[:4] == (1.0, 2, 3.0, 4)
+    assert quote_book.get("binance", "BTCUSDT", max_age=5)[:4] == (5.0, 6.0, 7.0, 8.0)
@@ -0,0 +1,199 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.api.adapter import ExchangeAdapter
+from app.api.cluster import LEADER, SINGLE, WORKER, Cluster
+from app.api.ratelimit import Priority, RateLimitGovernor
+
+
+class FakeAdapter:
+    name = "fake"
+    account = "default"
+
+    def __init__(self):
+        self.calls = []
+
+    async def request(self, verb, path, priority, params, data):
+        self.calls.append((verb, path, priority, params, data))
+        if path == "/missing":
+            raise HTTPException(status_code=404, detail={"error": "missing"})
+        return httpx.Response(200, content=b'[{"orderID":"1"}]', headers={"x-ratelimit-remaining": "299"})
+
+    async def send(self, verb, url, headers, query, data):
+        self.calls.append((verb, url, headers, query, data))
+        return httpx.Response(200, content=b"[]")
+
+
+async def connected(cluster: Cluster):
+    for _ in range(100):
+        if cluster.stats()["connected"]:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("worker did not connect")
+
+
+def test_single_process_runs_upstream_itself():
+    async def run():
+        cluster = Cluster(path="")
+        on_leader = AsyncMock()
+        await cluster.start(on_leader)
+        assert cluster.role == SINGLE
+        on_leader.assert_awaited_once()
+
+    asyncio.run(run())
+
+
+def test_worker_forwards_calls_to_the_leader(tmp_path):
+    async def run():
+        path = str(tmp_path / "gateway.sock")
+        leader, worker = Cluster(path), Cluster(path)
+        adapter = FakeAdapter()
+        leader.register(adapter)
+        on_leader = AsyncMock()
+
+        await leader.start(on_leader)
+        await worker.start(on_leader)
+        try:
+            assert (leader.role, worker.role) == (LEADER, WORKER)
+            on_leader.assert_awaited_once()
+            await connected(worker)
+
+            response = await worker.forward(adapter, "request", '{"symbol":"XBTUSD"}', verb="POST", path="/order",
+                                            priority=Priority.NEW, params=None)
+            assert response.status_code == 200
+            assert response.json() == [{"orderID": "1"}]
+            assert response.headers["x-ratelimit-remaining"] == "299"
+            assert adapter.calls[-1] == ("POST", "/order", Priority.NEW, None, '{"symbol":"XBTUSD"}')
+
+            await worker.forward(adapter, "send", verb="DELETE", url="https://x/order/all", headers={"a": "1"},
+                                 query=None)
+            assert adapter.calls[-1] == ("DELETE", "https://x/order/all", {"a": "1"}, None, "")
+
+            # Errors come back with the leader's status code and detail
+            with pytest.raises(HTTPException) as exc_info:
+                await worker.forward(adapter, "request", verb="GET", path="/missing", priority=Priority.READ,
+                                     params=None)
+            assert exc_info.value.status_code == 404
+            assert exc_info.value.detail == {"error": "missing"}
+        finally:
+            await worker.stop()
+            await leader.stop()
+
+    asyncio.run(run())
+
+
+def test_worker_calls_handlers_of_the_leader(tmp_path):
+    async def run():
+        path = str(tmp_path / "gateway.sock")
+        leader, worker = Cluster(path), Cluster(path)
+        adapter = FakeAdapter()
+        leader.register(adapter)
+        calls = []
+
+        async def submit(adapter, call):
+            calls.append((adapter, call))
+            return httpx.Response(200, content=b'{"orderID":"1"}')
+
+        leader.handle("submit", submit)
+        await leader.start(AsyncMock())
+        await worker.start(AsyncMock())
+        try:
+            await connected(worker)
+            response = await worker.forward(adapter, "submit", '{"clOrdID":"a"}')
+            assert response.json() == {"orderID": "1"}
+            assert calls == [(adapter, {"data": '{"clOrdID":"a"}'})]
+
+            with pytest.raises(HTTPException) as exc_info:
+                await worker.forward(adapter, "amend", "{}")
+            assert exc_info.value.status_code == 400
+        finally:
+            await worker.stop()
+            await leader.stop()
+
+    asyncio.run(run())
+
+
+def test_workers_get_snapshots_then_events(tmp_path):
+    async def run():
+        path = str(tmp_path / "gateway.sock")
+        leader, worker = Cluster(path), Cluster(path)
+        leader.snapshots.append(lambda: [("bitmex", {"table": "order", "action": "partial", "data": []})])
+        received = []
+        worker.subscribe("bitmex", received.append)
+
+        await leader.start(AsyncMock())
+        await worker.start(AsyncMock())
+        try:
+            await connected(worker)
+            for _ in range(100):
+                if leader.workers:
+                    break
+                await asyncio.sleep(0.01)
+
+            leader.publish("bitmex", {"table": "order", "action": "insert", "data": [{"orderID": "1"}]})
+            leader.publish("binance", {"s": "BTCUSDT"})
+            for _ in range(100):
+                if len(received) == 2:
+                    break
+                await asyncio.sleep(0.01)
+
+            assert received == [
+                {"table": "order", "action": "partial", "data": []},
+                {"table": "order", "action": "insert", "data": [{"orderID": "1"}]},
+            ]
+        finally:
+            await worker.stop()
+            await leader.stop()
+
+    asyncio.run(run())
+
+
+def test_worker_takes_over_when_the_leader_stops(tmp_path):
+    async def run():
+        path = str(tmp_path / "gateway.sock")
+        leader, worker = Cluster(path), Cluster(path)
+        on_promote = AsyncMock()
+
+        await leader.start(AsyncMock())
+        await worker.start(on_promote)
+        try:
+            await connected(worker)
+            await leader.stop()
+
+            for _ in range(300):
+                if worker.role == LEADER:
+                    break
+                await asyncio.sleep(0.01)
+            assert worker.role == LEADER
+            on_promote.assert_awaited_once()
+
+            # Forwarded calls now run in the new leader
+            adapter = FakeAdapter()
+            response = await worker.forward(adapter, "request", verb="GET", path="/order", priority=Priority.READ,
+                                            params=None)
+            assert response.status_code == 200
+        finally:
+            await worker.stop()
+
+    asyncio.run(run())
+
+
+def test_adapter_forwards_in_worker_processes():
+    class Adapter(ExchangeAdapter):
+        def sign(self, verb, url, params, data):
+            raise AssertionError("workers do not sign")
+
+    adapter = Adapter("https://example.com", "key", RateLimitGovernor(1, 1), timeout=1)
+    response = httpx.Response(200, content=b"[]")
+    with patch("app.api.adapter.cluster") as cluster:
+        cluster.is_worker.return_value = True
+        cluster.forward = AsyncMock(return_value=response)
+        assert asyncio.run(adapter.request("GET", "/order", params={"count": 1})) is response
+
+    cluster.forward.assert_awaited_once_with(
+        adapter, "request", "", verb="GET", path="/order", priority=Priority.READ, params={"count": 1}
+    )
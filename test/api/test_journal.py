@@ -0,0 +1,43 @@
+import os
+
+from app.api.journal import Journal, encode, journal_files, read, read_all
+
+
+def test_records_round_trip_through_the_writer(tmp_path):
+    journal = Journal("test", directory=str(tmp_path), fsync_interval=0)
+    journal.record({"verb": "POST"}, b'{"symbol":"XBTUSD"}', 200, b'{"orderID":"1"}')
+    journal.start()
+    for i in range(1000):
+        journal.record({"verb": "GET", "i": i}, b"", 200, b"[]")
+    journal.record({"verb": "DELETE"}, b"{}", 504, b'"timeout"')
+    journal.stop()
+
+    # Nothing is kept before the journal is started
+    records = list(read(journal.path))
+    assert len(records) == 1001
+    assert records[0].meta == {"verb": "GET", "i": 0}
+    assert (records[-1].status, records[-1].request, records[-1].response) == (504, b"{}", b'"timeout"')
+    assert journal_files(str(tmp_path), "test") == [journal.path]
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    journal = Journal("test", directory=str(tmp_path), queue_size=2)
+    journal._thread = object()
+    for _ in range(5):
+        journal.record({}, b"", 200, b"")
+    assert len(journal._pending) == 2
+
+
+def test_torn_tail_ends_the_file_and_files_merge_by_time(tmp_path):
+    first, second = str(tmp_path / "a.journal"), str(tmp_path / "b.journal")
+    with open(first, "wb") as file:
+        file.write(encode(1.0, 200, {"n": 1}, b"", b""))
+        file.write(encode(3.0, 200, {"n": 3}, b"", b""))
+        # Crash in the middle of a record
+        file.write(encode(4.0, 200, {"n": 4}, b"", b"x" * 100)[:-10])
+    with open(second, "wb") as file:
+        file.write(encode(2.0, 200, {"n": 2}, b"", b""))
+
+    assert [record.meta["n"] for record in read(first)] == [1, 3]
+    assert [record.meta["n"] for record in read_all([first, second])] == [1, 2, 3]
+    assert os.path.getsize(second) > 0
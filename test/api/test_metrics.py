@@ -0,0 +1,53 @@
+import httpx
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.api.metrics import Histogram, Registry
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_histogram_render():
+    histogram = Histogram("latency_seconds", "Latency.", ("endpoint",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/orders")
+    histogram.observe(0.1, "/orders")
+    histogram.observe(5, "/orders")
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{endpoint="/orders",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="/orders",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="/orders",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{endpoint="/orders"} 3' in lines
+
+
+def test_counter_render():
+    registry = Registry()
+    counter = registry.counter("calls_total", "Calls.", ("status",))
+    counter.inc(200)
+    counter.inc(200)
+    assert 'calls_total{status="200"} 2' in registry.render()
+
+
+def test_gauge_render():
+    registry = Registry()
+    gauge = registry.gauge("startup_seconds", "Startup.", ("phase",))
+    gauge.set(0.5, "import")
+    gauge.set(0.25, "import")
+    body = registry.render()
+    assert "# TYPE startup_seconds gauge" in body
+    assert 'startup_seconds{phase="import"} 0.25' in body
+
+
+@patch("app.api.transport.request")
+def test_metrics_endpoint_reports_stages(mock_post):
+    mock_post.return_value = httpx.Response(200, json={"orderID": "metrics-1"})
+    client.post("/bitmex/orders", json={"symbol": "XBTUSD", "price": 50000, "orderQty": 1})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    for stage in ("validate", "serialize", "queue", "sign", "upstream", "encode"):
+        assert f'gateway_stage_seconds_count{{endpoint="/bitmex/orders",stage="{stage}"}}' in body
+    assert 'gateway_upstream_requests_total{venue="bitmex",method="POST",status="200"}' in body
+    assert 'gateway_request_seconds_count{method="POST",endpoint="/bitmex/orders",status="200"}' in body
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from app.api.ratelimit import Priority, RateLimitGovernor
+
+
+def test_acquire_within_budget_does_not_wait():
+    async def run():
+        governor = RateLimitGovernor(limit=60, burst=3)
+        for _ in range(3):
+            await governor.acquire(Priority.NEW)
+        assert governor.stats()["waits"] == 0
+
+    asyncio.run(run())
+
+
+def test_queued_calls_are_served_by_priority():
+    async def run():
+        # 600 per minute refills one token every 100ms
+        governor = RateLimitGovernor(limit=600, burst=1)
+        await governor.acquire(Priority.READ)
+
+        served = []
+
+        async def call(priority):
+            await governor.acquire(priority)
+            served.append(priority)
+
+        tasks = [asyncio.create_task(call(priority)) for priority in
+                 (Priority.READ, Priority.NEW, Priority.AMEND, Priority.CANCEL)]
+        await asyncio.sleep(0)
+        assert governor.stats()["queue_depth"] == {"CANCEL": 1, "AMEND": 1, "NEW": 1, "READ": 1}
+
+        await asyncio.gather(*tasks)
+        assert served == [Priority.CANCEL, Priority.AMEND, Priority.NEW, Priority.READ]
+        assert governor.stats()["waits"] == 4
+
+    asyncio.run(run())
+
+
+def test_update_tracks_exchange_budget():
+    governor = RateLimitGovernor(limit=120, burst=120)
+    governor.update(remaining=5, reset_at=time.time() + 10)
+    assert governor.stats()["tokens"] < 6
+
+    # An exhausted budget blocks until the reported reset
+    governor.update(remaining=0, reset_at=time.time() + 10)
+    assert governor.stats()["blocked_for"] > 9
+
+
+def test_update_blocks_on_too_many_requests():
+    governor = RateLimitGovernor(limit=120, burst=120)
+    governor.update(rejected=True, retry_after=3)
+    assert governor.stats()["tokens"] < 1
+    assert 2 < governor.stats()["blocked_for"] <= 3
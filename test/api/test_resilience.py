@@ -0,0 +1,142 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.api.adapter import ExchangeAdapter
+from app.api.ratelimit import Priority, RateLimitGovernor
+from app.api.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, hedged
+
+
+class Adapter(ExchangeAdapter):
+    order_id_fields = ("orderID",)
+
+    def sign(self, verb, url, params, data):
+        return url, {}, params
+
+
+def create_adapter():
+    adapter = Adapter("https://example.com", "key", RateLimitGovernor(6000, 100), timeout=1)
+    adapter.breaker = CircuitBreaker("test", threshold=3, open_seconds=60)
+    return adapter
+
+
+def test_breaker_opens_then_probes():
+    breaker = CircuitBreaker("test", threshold=2, open_seconds=60)
+    breaker.failure()
+    breaker.check()
+    breaker.failure()
+    assert breaker.state == OPEN
+
+    with pytest.raises(HTTPException) as exc_info:
+        breaker.check()
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == "60"
+
+    # Once the window is over one call probes, its failure opens the circuit again at once
+    breaker.retry_at = 0
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+    breaker.failure()
+    assert breaker.state == OPEN
+
+    breaker.retry_at = 0
+    breaker.check()
+    breaker.success()
+    assert breaker.state == CLOSED
+    breaker.check()
+
+
+@patch("app.api.adapter.backoff", return_value=0)
+@patch("app.api.transport.request")
+def test_reads_are_retried_after_overload(mock_request, _):
+    mock_request.side_effect = [
+        httpx.Response(503, json={"error": {"message": "The system is currently overloaded."}}),
+        HTTPException(status_code=504, detail="Upstream request timed out."),
+        httpx.Response(200, json=[]),
+    ]
+    adapter = create_adapter()
+    response = asyncio.run(adapter.request("GET", "/order"))
+    assert response.status_code == 200
+    assert mock_request.call_count == 3
+    assert adapter.breaker.failures == 0
+
+
+@patch("app.api.adapter.backoff", return_value=0)
+@patch("app.api.transport.request")
+def test_only_idempotent_calls_are_retried(mock_request, _):
+    mock_request.return_value = httpx.Response(503, json={})
+    adapter = create_adapter()
+
+    # A new order may have reached the exchange, it is not sent twice
+    assert asyncio.run(adapter.request("POST", "/order", Priority.NEW, data='{"symbol":"XBTUSD"}')).status_code == 503
+    assert mock_request.call_count == 1
+    asyncio.run(adapter.request("DELETE", "/order/all", Priority.CANCEL, data='{"symbol":"XBTUSD"}'))
+    assert mock_request.call_count == 2
+
+    adapter.breaker.success()
+    asyncio.run(adapter.request("DELETE", "/order", Priority.CANCEL, data='{"orderID":"1"}'))
+    assert mock_request.call_count == 5
+
+
+@patch("app.api.adapter.backoff", return_value=0)
+@patch("app.api.transport.request")
+def test_open_circuit_fails_fast_except_cancels(mock_request, _):
+    mock_request.return_value = httpx.Response(503, json={})
+    adapter = create_adapter()
+    asyncio.run(adapter.request("GET", "/order"))
+    assert adapter.breaker.state == OPEN
+    assert mock_request.call_count == 3
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(adapter.request("GET", "/order"))
+    assert exc_info.value.status_code == 503
+    assert mock_request.call_count == 3
+
+    asyncio.run(adapter.request("DELETE", "/order/all", Priority.CANCEL, data="{}"))
+    assert mock_request.call_count == 4
+
+
+def test_hedged_read_takes_the_first_answer():
+    async def run():
+        calls = []
+
+        async def call():
+            calls.append(None)
+            # The first call hangs, the hedge answers
+            await asyncio.sleep(10 if len(calls) == 1 else 0)
+            return len(calls)
+
+        assert await asyncio.wait_for(hedged(call, 0.01, "test"), 1) == 2
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+def test_hedged_read_waits_for_the_other_call_after_a_failure():
+    async def run():
+        calls = []
+
+        async def call():
+            calls.append(None)
+            if len(calls) == 1:
+                await asyncio.sleep(0.05)
+                raise HTTPException(status_code=504, detail="Upstream request timed out.")
+            await asyncio.sleep(0.1)
+            return "hedge"
+
+        assert await hedged(call, 0.01, "test") == "hedge"
+
+        # Fast answers never send a second call
+        calls.clear()
+
+        async def fast():
+            calls.append(None)
+            return "first"
+
+        assert await hedged(fast, 0.01, "test") == "first"
+        assert len(calls) == 1
+
+    asyncio.run(run())
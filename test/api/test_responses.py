@@ -0,0 +1,31 @@
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.api.adapter import ExchangeAdapter
+from app.api.responses import JSONResponse, RawJSONResponse
+
+
+def test_json_response_encodes_compactly():
+    response = JSONResponse({"price": 1.5, "side": "Buy", 1: None})
+
+    assert response.body == b'{"price":1.5,"side":"Buy","1":null}'
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_raw_response_forwards_bytes_unchanged():
+    body = b'[ {"orderID": "1", "price": 1.50} ]'
+    response = RawJSONResponse(status_code=200, content=body)
+
+    assert response.body == body
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["content-length"] == str(len(body))
+
+
+def test_adapter_body_raises_upstream_errors():
+    assert ExchangeAdapter.body(httpx.Response(200, content=b'{"a":1}')) == b'{"a":1}'
+
+    with pytest.raises(HTTPException) as e:
+        ExchangeAdapter.body(httpx.Response(400, json={"error": "Invalid"}))
+    assert e.value.status_code == 400
+    assert e.value.detail == {"error": "Invalid"}
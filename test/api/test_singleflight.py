@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.api.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    async def run():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return ["order"]
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert flight.stats() == {"leaders": 1, "joins": 4, "inflight": 0}
+
+    asyncio.run(run())
+
+
+def test_different_keys_and_later_calls_are_not_coalesced():
+    async def run():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0)
+            return len(calls)
+
+        await asyncio.gather(flight.do("a", fetch), flight.do("b", fetch))
+        await flight.do("a", fetch)
+
+        assert len(calls) == 3
+        assert flight.stats()["joins"] == 0
+
+    asyncio.run(run())
+
+
+def test_errors_are_shared_with_joined_calls():
+    async def run():
+        flight = SingleFlight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        results = await asyncio.gather(flight.do("key", fetch), flight.do("key", fetch), return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.stats()["inflight"] == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_joiner_does_not_cancel_leader():
+    async def run():
+        flight = SingleFlight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        joiner.cancel()
+
+        assert await leader == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await joiner
+
+    asyncio.run(run())
@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import settings
+from app.api.startup import ROUTERS, LazyRouters, startup_seconds
+
+
+def lazy_app(routers=None):
+    app = FastAPI()
+    app.add_middleware(LazyRouters, routers=routers or {"binance": ROUTERS["binance"]})
+
+    @app.get("/")
+    async def root():
+        return {}
+
+    return app
+
+
+@patch("app.api.transport.request")
+def test_routers_load_on_their_first_request(mock_get):
+    mock_get.return_value = httpx.Response(200, json={"orderId": 1})
+    app = lazy_app()
+    client = TestClient(app)
+
+    # Other paths leave the router unloaded
+    assert client.get("/").status_code == 200
+    assert not any(getattr(route, "path", "").startswith("/binance") for route in app.routes)
+
+    response = client.get("/binance/orders", params={"symbol": "BTCUSDT", "orderId": 1})
+    assert response.status_code == 200
+    assert any(route.path == "/binance/orders" for route in app.routes)
+    assert startup_seconds.series[("router:binance",)] > 0
+
+    # Loaded once
+    routes = len(app.routes)
+    client.get("/binance/orders", params={"symbol": "BTCUSDT", "orderId": 1})
+    assert len(app.routes) == routes
+
+
+def test_root_mounted_routers_load_on_their_paths():
+    # Smart order routing has no prefix of its own
+    client = TestClient(lazy_app({"sor": ROUTERS["sor"]}))
+    response = client.post("/orders", json={"symbol": "DOGE-USD", "side": "Buy", "orderQty": 2})
+    assert response.status_code == 400
+    assert client.get("/quotes").status_code == 200
+
+
+def test_schema_loads_every_router():
+    app = lazy_app()
+    client = TestClient(app)
+    assert "/binance/orders" in client.get("/openapi.json").json()["paths"]
+
+
+def test_validate_reports_every_error():
+    with patch.multiple(settings, BITMEX_BACKEND="dry", BITMEX_RATE_LIMIT=0, BITMEX_DEADMAN_TIMEOUT=10,
+                        BITMEX_DEADMAN_INTERVAL=15, BITMEX_ACCOUNTS={"hedge": {"api_key": "k"}}):
+        errors = settings.validate()
+    assert len(errors) == 4
+    assert "BITMEX_BACKEND must be 'live' or 'paper', not 'dry'." in errors
+    assert "BITMEX_RATE_LIMIT must be positive, not 0." in errors
+    assert "BITMEX_ACCOUNTS['hedge'] needs an api_key and a secret_key." in errors
+
+
+@patch.dict("os.environ", {"BITMEX_RATE_LIMIT": "fast", "BITMEX_ACCOUNTS": "[]", "SOR_FEES": "{"})
+def test_unparsable_values_are_reported_by_validate():
+    with patch.object(settings, "_parse_errors", []):
+        assert settings._int("BITMEX_RATE_LIMIT", "120") == 120
+        assert settings._json("BITMEX_ACCOUNTS", "{}") == {}
+        assert settings._json("SOR_FEES", '{"bitmex": 0.00075}') == {"bitmex": 0.00075}
+        errors = settings.validate()
+    assert errors == ["BITMEX_RATE_LIMIT must be an integer, not 'fast'.",
+                      "BITMEX_ACCOUNTS must be a JSON object, not '[]'.",
+                      "SOR_FEES must be valid JSON, not '{'."]
+
+
+def test_validate_accepts_the_defaults():
+    assert settings.validate() == []
@@ -0,0 +1,26 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.api import transport
+
+
+def test_get_client_is_reused():
+    client = transport.get_client()
+    assert transport.get_client() is client
+    asyncio.run(transport.close_client())
+
+
+def test_request_timeout_maps_to_gateway_timeout():
+    def handler(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    transport._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(transport.request("GET", "https://example.com/order", timeout=1))
+        assert exc_info.value.status_code == 504
+    finally:
+        asyncio.run(transport.close_client())